@@ -10,5 +10,10 @@ docker-compose exec auth-service alembic upgrade head
 
 echo "Running Movie Service migrations..."
 docker-compose exec movie-service alembic upgrade head
+# Поисковый вектор, pg_trgm и индексы поиска (идемпотентно; то же выполняется при старте сервиса)
+docker-compose exec movie-service python -m app.core.schema
+
+echo "Running Streaming Service schema upgrade..."
+docker-compose exec streaming-service python -m app.core.schema
 
 echo "Migrations completed!"
\ No newline at end of file
@@ -1,15 +1,85 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, cast, literal, or_, select, text, tuple_
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from typing import List, Optional
+from datetime import datetime
+import asyncio
+import base64
+import json
 from ..core.database import get_db
 from ..models.movie import Movie
 from ..models.genre import Genre
-from ..schemas.movie import MovieCreate, MovieUpdate, Movie as MovieSchema, MovieList
+from ..schemas.movie import MovieCreate, MovieUpdate, Movie as MovieSchema, MovieList, MovieSuggestion
 from ..utils.auth import get_current_user, get_current_user_optional
+from ..utils.cache import suggest_cache, movie_count_cache, normalize_query
+from ..utils.search_index import movie_search_index
+from ..core.config import settings
 
 router = APIRouter(prefix="/movies", tags=["Movies"])
 
+# Ключи сортировки списка фильмов: столбец и направление (id сортируется так же)
+MOVIE_SORT_KEYS = {
+    'id': (Movie.id, False),
+    'created_at': (Movie.created_at, True),
+    'release_year': (Movie.release_year, True),
+    'title': (Movie.title, False),
+}
+
+
+def _encode_movie_cursor(sort: str, movie: Movie) -> str:
+    """Курсор постраничного вывода: ключ сортировки и id последнего фильма страницы"""
+    value = getattr(movie, sort)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, movie.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _decode_movie_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, value, movie_id = json.loads(raw)
+        if cursor_sort != sort:
+            raise ValueError("Cursor was issued for another sort order")
+        if sort == 'created_at':
+            value = datetime.fromisoformat(value)
+        return value, int(movie_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def _search_tsquery(search: str):
+    """Поисковый запрос пользователя в синтаксисе веб-поиска (websearch_to_tsquery)"""
+    return func.websearch_to_tsquery(cast(settings.search_text_config, REGCONFIG), search)
+
+
+def _estimate_count(db: Session, query, filtered: bool) -> Optional[int]:
+    """Оценка числа строк: статистика таблицы или оценка планировщика для запроса с фильтрами"""
+    if not filtered:
+        estimate = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {'table': Movie.__tablename__}
+        ).scalar()
+    else:
+        # Значения фильтров (в том числе поисковый запрос) передаются параметрами, а не в тексте запроса
+        compiled = query.statement.compile(dialect=db.get_bind().dialect)
+        parameters = compiled.params
+        if compiled.positional:
+            parameters = tuple(parameters[name] for name in compiled.positiontup)
+        plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimate = plan[0]['Plan']['Plan Rows']
+    
+    # Таблица еще не анализировалась - оценки нет
+    if estimate is None or estimate < 0:
+        return None
+    return int(estimate)
+
 
 @router.get("/", response_model=MovieList)
 async def get_movies(
@@ -17,43 +87,151 @@ async def get_movies(
     per_page: int = Query(10, ge=1, le=100),
     search: Optional[str] = Query(None),
     genre_id: Optional[int] = Query(None),
+    sort: str = Query("id", pattern="^(id|created_at|release_year|title)$"),
+    cursor: Optional[str] = Query(None, description="next_cursor предыдущей страницы (вместо page)"),
+    total_mode: str = Query("exact", pattern="^(exact|cached|estimate|none)$"),
     db: Session = Depends(get_db)
 ):
-    """Получить список фильмов с пагинацией и фильтрацией"""
-    query = db.query(Movie).filter(Movie.is_available == True)
+    """
+    Получить список фильмов с пагинацией и фильтрацией
     
-    # Поиск по названию и описанию
-    if search:
-        query = query.filter(
-            or_(
-                Movie.title.ilike(f"%{search}%"),
-                Movie.description.ilike(f"%{search}%"),
-                Movie.director.ilike(f"%{search}%")
-            )
+    Страницы выбираются по номеру (page) или по курсору (cursor): курсор не требует
+    пропуска предыдущих строк, поэтому глубокие страницы загружаются так же быстро.
+    total_mode: exact - точный подсчет, cached - подсчет с кэшированием,
+    estimate - оценка по статистике Postgres, none - без подсчета.
+    """
+    if cursor and search:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor pagination is not supported for search results"
         )
     
+    # Поиск по индексу в памяти - без обращения к базе данных (в потоке, чтобы не блокировать цикл событий)
+    if search and settings.search_backend == "memory" and movie_search_index.ready:
+        total, movies = await asyncio.to_thread(
+            movie_search_index.search, search, genre_id, (page - 1) * per_page, per_page
+        )
+        return MovieList(
+            movies=movies, total=total if total_mode != "none" else None, page=page, per_page=per_page
+        )
+    
+    # Жанры загружаются одним дополнительным запросом на страницу, а не запросом на каждый фильм
+    query = db.query(Movie).options(selectinload(Movie.genres)).filter(Movie.is_available == True)
+    
+    # Полнотекстовый поиск по названию, режиссеру и описанию (GIN-индекс по search_vector)
+    ts_query = None
+    if search:
+        ts_query = _search_tsquery(search)
+        query = query.filter(Movie.search_vector.op('@@')(ts_query))
+    
     # Фильтр по жанру
     if genre_id:
         query = query.join(Movie.genres).filter(Genre.id == genre_id)
     
     # Подсчет общего количества
-    total = query.count()
+    total = None
+    total_estimated = False
+    if total_mode == "estimate":
+        total = _estimate_count(db, query, bool(search or genre_id))
+        total_estimated = total is not None
+    if total_mode == "cached" or (total_mode == "estimate" and total is None):
+        count_key = (normalize_query(search) if search else None, genre_id)
+        total = movie_count_cache.get(count_key)
+        if total is None:
+            total = query.count()
+            movie_count_cache.set(count_key, total)
+    elif total_mode == "exact":
+        total = query.count()
+    
+    # Результаты поиска - по релевантности
+    if ts_query is not None:
+        query = query.order_by(func.ts_rank(Movie.search_vector, ts_query).desc(), Movie.id)
+        movies = query.offset((page - 1) * per_page).limit(per_page).all()
+        return MovieList(
+            movies=movies, total=total, page=page, per_page=per_page, total_estimated=total_estimated
+        )
+    
+    # Сортировка по ключу и id: по курсору продолжаем сразу после последнего фильма страницы
+    sort_column, descending = MOVIE_SORT_KEYS[sort]
+    order = [sort_column] if sort == 'id' else [sort_column, Movie.id]
+    query = query.order_by(*[column.desc() if descending else column for column in order])
     
-    # Пагинация
-    movies = query.offset((page - 1) * per_page).limit(per_page).all()
+    if cursor:
+        cursor_value, cursor_id = _decode_movie_cursor(cursor, sort)
+        position = tuple_(sort_column, Movie.id) if sort != 'id' else Movie.id
+        bound = tuple_(cursor_value, cursor_id) if sort != 'id' else cursor_id
+        query = query.filter(position < bound if descending else position > bound)
+    else:
+        query = query.offset((page - 1) * per_page)
+    
+    movies = query.limit(per_page + 1).all()
+    next_cursor = None
+    if len(movies) > per_page:
+        movies = movies[:per_page]
+        next_cursor = _encode_movie_cursor(sort, movies[-1])
     
     return MovieList(
         movies=movies,
         total=total,
         page=page,
-        per_page=per_page
+        per_page=per_page,
+        total_estimated=total_estimated,
+        next_cursor=next_cursor
     )
 
 
+@router.get("/suggest", response_model=List[MovieSuggestion])
+async def suggest_movies(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=20),
+    db: Session = Depends(get_db)
+):
+    """Подсказки при вводе: фильмы, похожие на запрос по названию или режиссеру (с опечатками)"""
+    query_text = normalize_query(q)
+    if not query_text:
+        return []
+    
+    cached = suggest_cache.get((query_text, limit))
+    if cached is not None:
+        return cached
+    
+    # Похожесть по словам (word_similarity): запрос сравнивается с лучшим фрагментом названия,
+    # поэтому частично введенное и написанное с ошибкой название тоже находится
+    db.execute(
+        select(func.set_config('pg_trgm.word_similarity_threshold', str(settings.suggest_similarity_threshold), True))
+    )
+    term = literal(query_text)
+    score = func.greatest(
+        func.word_similarity(term, Movie.title),
+        func.coalesce(func.word_similarity(term, Movie.director), 0)
+    ).label('score')
+    
+    rows = db.query(
+        Movie.id, Movie.title, Movie.director, Movie.release_year, Movie.poster_url, score
+    ).filter(
+        Movie.is_available == True,
+        or_(term.op('<%')(Movie.title), term.op('<%')(Movie.director))
+    ).order_by(score.desc(), Movie.id).limit(limit).all()
+    
+    suggestions = [
+        MovieSuggestion(
+            id=row.id,
+            title=row.title,
+            director=row.director,
+            release_year=row.release_year,
+            poster_url=row.poster_url,
+            score=round(float(row.score), 3)
+        )
+        for row in rows
+    ]
+    suggest_cache.set((query_text, limit), suggestions)
+    return suggestions
+
+
 @router.get("/{movie_id}", response_model=MovieSchema)
 async def get_movie(movie_id: int, db: Session = Depends(get_db)):
     """Получить фильм по ID"""
-    movie = db.query(Movie).filter(Movie.id == movie_id).first()
+    movie = db.query(Movie).options(selectinload(Movie.genres)).filter(Movie.id == movie_id).first()
     if not movie:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -91,6 +269,10 @@ async def create_movie(
     db.add(db_movie)
     db.commit()
     db.refresh(db_movie)
+    suggest_cache.clear()
+    movie_count_cache.clear()
+    if settings.search_backend == "memory":
+        movie_search_index.upsert(MovieSchema.model_validate(db_movie))
     return db_movie
 
 
@@ -102,7 +284,7 @@ async def update_movie(
     current_user: dict = Depends(get_current_user)
 ):
     """Обновить фильм (только для авторизованных пользователей)"""
-    db_movie = db.query(Movie).filter(Movie.id == movie_id).first()
+    db_movie = db.query(Movie).options(selectinload(Movie.genres)).filter(Movie.id == movie_id).first()
     if not db_movie:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -125,6 +307,10 @@ async def update_movie(
     
     db.commit()
     db.refresh(db_movie)
+    suggest_cache.clear()
+    movie_count_cache.clear()
+    if settings.search_backend == "memory":
+        movie_search_index.upsert(MovieSchema.model_validate(db_movie))
     return db_movie
 
 
@@ -144,4 +330,7 @@ async def delete_movie(
     
     db.delete(db_movie)
     db.commit()
+    suggest_cache.clear()
+    movie_count_cache.clear()
+    movie_search_index.remove(movie_id)
     return {"message": "Movie deleted successfully"}
\ No newline at end of file
@@ -13,6 +13,24 @@ class Settings(BaseSettings):
     jwt_secret_key: str
     jwt_algorithm: str = "HS256"
     
+    # Конфигурация полнотекстового поиска Postgres (russian, english, simple)
+    search_text_config: str = "russian"
+    
+    # Поиск: postgres (полнотекстовый индекс) или memory (инвертированный индекс в памяти процесса)
+    # memory не выделяет основу слова (в отличие от search_text_config в Postgres): словоформы
+    # находятся только по префиксу ("матриц" найдет "матрица" и "матрицу", "матрицу" не найдет "матрица")
+    search_backend: str = "postgres"
+    search_index_refresh_seconds: int = 300  # Полная перестройка индекса в памяти (0 - только при старте)
+    
+    # Подсказки при вводе (pg_trgm): порог похожести и кэш популярных запросов
+    suggest_similarity_threshold: float = 0.4
+    suggest_cache_size: int = 1024
+    suggest_cache_ttl_seconds: int = 300
+    
+    # Кэш общего числа фильмов в списке (total_mode=cached)
+    movie_count_cache_size: int = 256
+    movie_count_cache_ttl_seconds: int = 60
+    
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
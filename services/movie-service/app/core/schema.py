@@ -0,0 +1,43 @@
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+from .database import engine
+from ..models.movie import Movie, SEARCH_VECTOR_EXPRESSION
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock: схему обновляет только один процесс (несколько воркеров стартуют одновременно)
+SCHEMA_LOCK_KEY = 462001
+
+
+def upgrade_schema():
+    """
+    Приводит существующую таблицу фильмов к модели (идемпотентно)
+    Добавляет расширение pg_trgm, вычисляемую колонку search_vector и индексы
+    полнотекстового поиска, подсказок и постраничного вывода по курсору,
+    которых нет в базах, созданных раньше них. Повторный запуск ничего не меняет.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+
+    table = Movie.__table__
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        if not inspect(connection).has_table(table.name):
+            logger.warning(f"Table {table.name} does not exist, schema upgrade skipped")
+            return
+
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(
+            f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+            f"GENERATED ALWAYS AS ({SEARCH_VECTOR_EXPRESSION}) STORED"
+        ))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+    logger.info(f"Schema of table {table.name} is up to date")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    upgrade_schema()
@@ -1,8 +1,14 @@
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .api.movies import router as movies_router
 from .api.genres import router as genres_router
+from .utils.search_index import movie_search_index
 from .core.config import settings
+from .core.schema import upgrade_schema
+
+logger = logging.getLogger(__name__)
 
 # Создаем приложение FastAPI
 app = FastAPI(
@@ -25,6 +31,21 @@ app.include_router(movies_router)
 app.include_router(genres_router)
 
 
+@app.on_event("startup")
+async def startup():
+    """Обновление схемы базы и построение индекса поиска в памяти (search_backend = memory)"""
+    try:
+        await asyncio.to_thread(upgrade_schema)
+    except Exception as e:
+        logger.error(f"Failed to upgrade database schema: {str(e)}")
+    movie_search_index.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await movie_search_index.stop()
+
+
 @app.get("/")
 async def root():
     """Корневой эндпоинт"""
@@ -1,7 +1,9 @@
-from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, Table, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Float, Boolean, DateTime, Table, ForeignKey, Computed, Index, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from ..core.database import Base
+from ..core.config import settings
 
 # Промежуточная таблица для many-to-many фильмов и жанров
 movie_genres = Table(
@@ -12,6 +14,19 @@ movie_genres = Table(
 )
 
 
+
+def _weighted_vector(column: str, weight: str) -> str:
+    return f"setweight(to_tsvector('{settings.search_text_config}'::regconfig, coalesce({column}, '')), '{weight}')"
+
+
+# Поисковый вектор: название важнее режиссера, режиссер важнее описания
+SEARCH_VECTOR_EXPRESSION = " || ".join([
+    _weighted_vector('title', 'A'),
+    _weighted_vector('director', 'B'),
+    _weighted_vector('description', 'C'),
+])
+
+
 class Movie(Base):
     __tablename__ = "movies"
 
@@ -39,5 +54,28 @@ class Movie(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Полнотекстовый поиск (вычисляется Postgres при вставке и обновлении);
+    # используется только в условиях запросов, поэтому по умолчанию не загружается
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_EXPRESSION, persisted=True)))
+    
     # Связи
-    genres = relationship("Genre", secondary=movie_genres, back_populates="movies")
\ No newline at end of file
+    genres = relationship("Genre", secondary=movie_genres, back_populates="movies")
+    
+    __table_args__ = (
+        Index('ix_movies_search_vector', 'search_vector', postgresql_using='gin'),
+        # Триграммные индексы для подсказок с опечатками
+        Index('ix_movies_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+        Index('ix_movies_director_trgm', 'director', postgresql_using='gin', postgresql_ops={'director': 'gin_trgm_ops'}),
+        # Постраничный вывод по курсору (keyset по ключу сортировки и id)
+        Index('ix_movies_created_at_id', 'created_at', 'id'),
+        Index('ix_movies_release_year_id', 'release_year', 'id'),
+        Index('ix_movies_title_id', 'title', 'id'),
+    )
+
+
+# Расширение pg_trgm нужно до создания триграммных индексов
+event.listen(
+    Movie.__table__,
+    'before_create',
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect='postgresql')
+)
\ No newline at end of file
@@ -62,8 +62,19 @@ class Movie(MovieBase):
         from_attributes = True
 
 
+class MovieSuggestion(BaseModel):
+    id: int
+    title: str
+    director: Optional[str] = None
+    release_year: int
+    poster_url: Optional[str] = None
+    score: float  # Похожесть на запрос (0.0 - 1.0)
+
+
 class MovieList(BaseModel):
     movies: List[Movie]
-    total: int
+    total: Optional[int]  # None при total_mode=none
     page: int
-    per_page: int
\ No newline at end of file
+    per_page: int
+    total_estimated: bool = False  # total - оценка планировщика, а не точное значение
+    next_cursor: Optional[str] = None  # Курсор следующей страницы (None - страница последняя)
\ No newline at end of file
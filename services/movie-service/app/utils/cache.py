@@ -0,0 +1,61 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+from ..core.config import settings
+
+
+def normalize_query(query: str) -> str:
+    """Приводит поисковый запрос к виду ключа кэша: нижний регистр, одиночные пробелы"""
+    return " ".join(query.lower().split())
+
+
+class TTLCache:
+    """LRU-кэш с ограниченным временем жизни записей"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Возвращает значение из кэша или None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, cached_at = entry
+            if time.monotonic() - cached_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Сохраняет значение в кэш"""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Сбрасывает кэш (при изменении каталога)"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Глобальные экземпляры
+# Подсказки: (запрос, лимит) -> список фильмов
+suggest_cache = TTLCache(
+    max_entries=settings.suggest_cache_size,
+    ttl_seconds=settings.suggest_cache_ttl_seconds
+)
+# Общее число фильмов в списке: (поиск, жанр) -> количество
+movie_count_cache = TTLCache(
+    max_entries=settings.movie_count_cache_size,
+    ttl_seconds=settings.movie_count_cache_ttl_seconds
+)
@@ -0,0 +1,305 @@
+import re
+import math
+import bisect
+import asyncio
+import threading
+import logging
+from array import array
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from sqlalchemy.orm import selectinload
+from ..core.config import settings
+from ..models.movie import Movie
+from ..schemas.movie import Movie as MovieSchema
+
+logger = logging.getLogger(__name__)
+
+# Веса полей: совпадение в названии важнее совпадения в описании
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'director': 2.0,
+    'cast': 2.0,
+    'description': 1.0,
+}
+
+# Параметры BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Расширение по префиксу: минимальная длина, число терминов и вес относительно точного совпадения
+PREFIX_MIN_LENGTH = 2
+PREFIX_MAX_EXPANSIONS = 32
+PREFIX_WEIGHT = 0.7
+
+# Доля удаленных документов, после которой индекс перестраивается
+COMPACTION_RATIO = 0.25
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Разбивает текст на термины: нижний регистр, ё -> е (без выделения основы слова)"""
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.lower().replace('ё', 'е'))
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс фильмов
+    Документы нумеруются подряд; списки вхождений термина хранятся в массивах
+    (номера документов по возрастанию и взвешенные частоты). Удаленные документы
+    помечаются в массиве флагов и вычищаются при перестройке.
+    """
+
+    def __init__(self):
+        self.documents: List[Optional[MovieSchema]] = []
+        self.doc_lengths = array('f')
+        self.docno_by_movie: Dict[int, int] = {}
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.genre_docnos: Dict[int, Set[int]] = {}
+        self.live = bytearray()  # 1 - документ жив, 0 - удален
+        self.live_count = 0
+        self.total_length = 0.0
+        self._sorted_terms: Optional[List[str]] = None
+
+    def add(self, movie: MovieSchema):
+        """Добавляет фильм (предыдущая версия документа должна быть удалена)"""
+        docno = len(self.documents)
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(getattr(movie, field)):
+                frequencies[term] = frequencies.get(term, 0.0) + weight
+                length += weight
+
+        for term, frequency in frequencies.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array('I'), array('f'))
+                self._sorted_terms = None
+            posting[0].append(docno)
+            posting[1].append(frequency)
+
+        for genre in movie.genres:
+            self.genre_docnos.setdefault(genre.id, set()).add(docno)
+
+        self.documents.append(movie)
+        self.doc_lengths.append(length)
+        self.docno_by_movie[movie.id] = docno
+        self.live.append(1)
+        self.live_count += 1
+        self.total_length += length
+
+    def remove(self, movie_id: int) -> bool:
+        docno = self.docno_by_movie.pop(movie_id, None)
+        if docno is None:
+            return False
+        self.live[docno] = 0
+        self.live_count -= 1
+        self.total_length -= self.doc_lengths[docno]
+        self.documents[docno] = None
+        return True
+
+    @property
+    def needs_compaction(self) -> bool:
+        dead = len(self.documents) - self.live_count
+        return dead > 0 and dead > COMPACTION_RATIO * len(self.documents)
+
+    def compacted(self) -> "InvertedIndex":
+        """Новый индекс только из живых документов"""
+        index = InvertedIndex()
+        for movie in self.documents:
+            if movie is not None:
+                index.add(movie)
+        return index
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Термины для слова запроса: точное совпадение и (для незаконченного слова) префиксы"""
+        expansions = []
+        if token in self.postings:
+            expansions.append((token, 1.0))
+
+        if len(token) >= PREFIX_MIN_LENGTH:
+            if self._sorted_terms is None:
+                self._sorted_terms = sorted(self.postings)
+            terms = self._sorted_terms
+            prefixed = []
+            position = bisect.bisect_right(terms, token)
+            while position < len(terms) and terms[position].startswith(token):
+                prefixed.append(terms[position])
+                position += 1
+            # Самые частые продолжения
+            prefixed.sort(key=lambda term: len(self.postings[term][0]), reverse=True)
+            expansions.extend((term, PREFIX_WEIGHT) for term in prefixed[:PREFIX_MAX_EXPANSIONS])
+        return expansions
+
+    def _score_token(self, token: str) -> Dict[int, float]:
+        """BM25 документов, содержащих слово запроса (лучший из его терминов)"""
+        total_docs = max(1, self.live_count)
+        average_length = self.total_length / total_docs if self.live_count else 1.0
+        scores: Dict[int, float] = {}
+        live = self.live
+
+        for term, weight in self._expand(token):
+            docnos, frequencies = self.postings[term]
+            # df включает удаленные документы до перестройки индекса; без ограничения
+            # сверху idf термина из всех документов после удаления стал бы отрицательным
+            document_frequency = min(len(docnos), total_docs)
+            idf = math.log(1.0 + (total_docs - document_frequency + 0.5) / (document_frequency + 0.5))
+            for docno, frequency in zip(docnos, frequencies):
+                if not live[docno]:
+                    continue
+                normalization = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_lengths[docno] / average_length)
+                score = weight * idf * frequency * (BM25_K1 + 1.0) / (frequency + normalization)
+                if docno not in scores or score > scores[docno]:
+                    scores[docno] = score
+        return scores
+
+    def search(self, query: str, genre_id: Optional[int] = None) -> List[int]:
+        """Номера документов, содержащих все слова запроса, по убыванию релевантности"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+
+        token_scores = sorted((self._score_token(token) for token in tokens), key=len)
+        candidates = set(token_scores[0])
+        for scores in token_scores[1:]:
+            candidates.intersection_update(scores)
+
+        if genre_id is not None:
+            candidates.intersection_update(self.genre_docnos.get(genre_id, ()))
+
+        ranked = [
+            (sum(scores[docno] for scores in token_scores), docno)
+            for docno in candidates
+        ]
+        ranked.sort(key=lambda item: (-item[0], self.documents[item[1]].id))
+        return [docno for _, docno in ranked]
+
+
+class MovieSearchIndex:
+    """
+    Поиск по каталогу в памяти процесса (search_backend = memory)
+    Индекс строится из базы при старте, обновляется при изменении фильмов
+    и периодически перестраивается, чтобы учесть изменения из других процессов.
+    """
+
+    def __init__(self):
+        self._index = InvertedIndex()
+        self._lock = threading.Lock()
+        # Полная перестройка и вычищение удаленных документов не выполняются одновременно
+        self._build_lock = threading.Lock()
+        self._ready = False
+        self._replay: Optional[List[Callable[[InvertedIndex], None]]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def _apply(self, operation: Callable[[InvertedIndex], None]):
+        with self._lock:
+            operation(self._index)
+            # Изменения во время перестройки применяются и к новому индексу
+            if self._replay is not None:
+                self._replay.append(operation)
+            needs_compaction = self._index.needs_compaction
+
+        # Перестройка занимает время, поэтому выполняется в отдельном потоке, а не в запросе
+        if needs_compaction and not self._build_lock.locked():
+            threading.Thread(target=self.compact, name="movie-search-compaction", daemon=True).start()
+
+    def _swap(self, index: InvertedIndex):
+        """Применяет к новому индексу изменения, сделанные во время его построения, и подменяет текущий"""
+        with self._lock:
+            for operation in self._replay:
+                operation(index)
+            self._replay = None
+            self._index = index
+
+    def upsert(self, movie: MovieSchema):
+        """Добавляет или обновляет фильм (недоступные фильмы из индекса удаляются)"""
+        def operation(index: InvertedIndex):
+            index.remove(movie.id)
+            if movie.is_available:
+                index.add(movie)
+        self._apply(operation)
+
+    def remove(self, movie_id: int):
+        self._apply(lambda index: index.remove(movie_id))
+
+    def search(self, query: str, genre_id: Optional[int] = None,
+               offset: int = 0, limit: int = 10) -> Tuple[int, List[MovieSchema]]:
+        """Возвращает общее число найденных фильмов и страницу результатов"""
+        with self._lock:
+            index = self._index
+            docnos = index.search(query, genre_id)
+            return len(docnos), [index.documents[docno] for docno in docnos[offset:offset + limit]]
+
+    def compact(self):
+        """Вычищает удаленные документы: строит индекс из живых документов без блокировки поиска"""
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            with self._lock:
+                if not self._index.needs_compaction:
+                    return
+                self._replay = []
+                documents = [movie for movie in self._index.documents if movie is not None]
+
+            index = InvertedIndex()
+            for movie in documents:
+                index.add(movie)
+            self._swap(index)
+        finally:
+            self._build_lock.release()
+
+    def rebuild(self):
+        """Строит индекс заново из базы данных"""
+        from ..core.database import SessionLocal
+
+        with self._build_lock:
+            with self._lock:
+                self._replay = []
+
+            db = SessionLocal()
+            try:
+                movies = db.query(Movie).options(selectinload(Movie.genres)).filter(Movie.is_available == True).all()
+                index = InvertedIndex()
+                for movie in movies:
+                    index.add(MovieSchema.model_validate(movie))
+            except Exception:
+                with self._lock:
+                    self._replay = None
+                raise
+            finally:
+                db.close()
+
+            self._swap(index)
+            self._ready = True
+        logger.info(f"Movie search index built: {index.live_count} movies, {len(index.postings)} terms")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.rebuild)
+            except Exception as e:
+                logger.error(f"Failed to build movie search index: {str(e)}")
+            if settings.search_index_refresh_seconds <= 0:
+                return
+            await asyncio.sleep(settings.search_index_refresh_seconds)
+
+    def start(self):
+        """Запускает построение индекса (на старте приложения)"""
+        if settings.search_backend == "memory" and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+# Глобальный экземпляр
+movie_search_index = MovieSearchIndex()
@@ -0,0 +1,18 @@
+import os
+from sqlalchemy import Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.compiler import compiles
+
+# Настройки сервиса читаются при импорте модулей приложения
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+
+
+# Тесты работают на SQLite: поисковый вектор хранится как текст и не вычисляется
+@compiles(TSVECTOR, "sqlite")
+def _compile_tsvector_sqlite(type_, compiler, **kw):
+    return "TEXT"
+
+
+@compiles(Computed, "sqlite")
+def _compile_computed_sqlite(element, compiler, **kw):
+    return ""
@@ -0,0 +1,55 @@
+import json
+from sqlalchemy.dialects.postgresql import psycopg2
+from sqlalchemy.orm import Session
+from app.api.movies import _estimate_count, _search_tsquery
+from app.models.movie import Movie
+
+
+class _Result:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class _Connection:
+    """Соединение Postgres: запоминает запросы и возвращает план с оценкой числа строк"""
+
+    def __init__(self):
+        self.executed = []
+
+    def exec_driver_sql(self, statement, parameters):
+        self.executed.append((statement, parameters))
+        return _Result(json.dumps([{"Plan": {"Plan Rows": 42}}]))
+
+
+class _Bind:
+    dialect = psycopg2.dialect()
+
+
+class _Session:
+    def __init__(self):
+        self.connection_ = _Connection()
+
+    def get_bind(self):
+        return _Bind()
+
+    def connection(self):
+        return self.connection_
+
+
+def test_estimate_with_search_filter_binds_search_text():
+    search = "матрица :title_1 %(x)s'"
+    query = Session().query(Movie).filter(Movie.is_available == True)
+    query = query.filter(Movie.search_vector.op('@@')(_search_tsquery(search)))
+    db = _Session()
+
+    assert _estimate_count(db, query, filtered=True) == 42
+
+    (statement, parameters), = db.connection_.executed
+    assert statement.startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert "AS REGCONFIG" in statement
+    # Текст запроса пользователя передается только параметром
+    assert "матрица" not in statement
+    assert search in parameters.values()
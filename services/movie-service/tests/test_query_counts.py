@@ -0,0 +1,119 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app.core import database
+from app.core.config import settings
+from app.core.database import Base, get_db
+from app.models.genre import Genre
+from app.models.movie import Movie
+from app.utils.search_index import movie_search_index
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def _seed(session_factory, movie_count: int):
+    db = session_factory()
+    genres = [Genre(name=name) for name in ("Драма", "Комедия", "Фантастика")]
+    db.add_all(genres)
+    for number in range(movie_count):
+        db.add(Movie(
+            title=f"Фильм {number}", description="Описание", release_year=2000 + number,
+            duration_minutes=90, director="Режиссер", cast="Актер",
+            genres=[genres[number % len(genres)], genres[(number + 1) % len(genres)]]
+        ))
+    db.commit()
+    db.close()
+
+
+@pytest.fixture
+def statements(engine):
+    """Список выполненных SQL-запросов"""
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def client(session_factory):
+    def override_get_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("movie_count", [3, 30])
+def test_movie_list_query_count_does_not_grow_with_page(client, session_factory, statements, movie_count):
+    _seed(session_factory, movie_count)
+    statements.clear()
+
+    response = client.get("/movies/", params={"per_page": 30})
+    assert response.status_code == 200
+    assert len(response.json()['movies']) == movie_count
+    assert all(movie['genres'] for movie in response.json()['movies'])
+    # Подсчет, страница фильмов и жанры всей страницы одним запросом
+    assert len(statements) == 3
+    # Поисковый вектор не загружается (подзапрос подсчета Postgres не материализует)
+    assert not any("search_vector" in statement for statement in statements if "count(*)" not in statement)
+
+
+def test_movie_list_by_cursor_without_total(client, session_factory, statements):
+    _seed(session_factory, 12)
+    first = client.get("/movies/", params={"per_page": 5, "sort": "release_year", "total_mode": "none"}).json()
+    statements.clear()
+
+    response = client.get("/movies/", params={
+        "per_page": 5, "sort": "release_year", "total_mode": "none", "cursor": first['next_cursor']
+    })
+    assert response.status_code == 200
+    assert [movie['release_year'] for movie in response.json()['movies']] == [2006, 2005, 2004, 2003, 2002]
+    # Страница фильмов и жанры, без подсчета
+    assert len(statements) == 2
+
+
+def test_movie_detail_query_count(client, session_factory, statements):
+    _seed(session_factory, 3)
+    statements.clear()
+
+    response = client.get("/movies/2")
+    assert response.status_code == 200
+    assert len(response.json()['genres']) == 2
+    assert len(statements) == 2
+    assert not any("search_vector" in statement for statement in statements)
+
+
+def test_memory_search_does_not_query_database(client, session_factory, statements, monkeypatch):
+    _seed(session_factory, 12)
+    monkeypatch.setattr(settings, "search_backend", "memory")
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    movie_search_index.rebuild()
+    statements.clear()
+
+    response = client.get("/movies/", params={"search": "фильм 7"})
+    assert response.status_code == 200
+    assert [movie['title'] for movie in response.json()['movies']] == ["Фильм 7"]
+    assert statements == []
@@ -0,0 +1,84 @@
+import threading
+from datetime import datetime, timezone
+from app.schemas.genre import Genre
+from app.schemas.movie import Movie
+from app.utils.search_index import InvertedIndex, MovieSearchIndex, tokenize
+
+DRAMA = Genre(id=1, name="Драма")
+SCI_FI = Genre(id=2, name="Фантастика")
+
+
+def _movie(movie_id: int, title: str, description: str = None, director: str = None, genres=()) -> Movie:
+    return Movie(
+        id=movie_id, title=title, description=description, director=director,
+        release_year=2000, duration_minutes=120, our_rating=0.0, is_available=True,
+        created_at=datetime(2024, 1, 1, tzinfo=timezone.utc), updated_at=None, genres=list(genres)
+    )
+
+
+def _search(index: InvertedIndex, query: str, genre_id: int = None):
+    return [index.documents[docno].id for docno in index.search(query, genre_id)]
+
+
+def test_tokenize_normalizes_case_and_yo():
+    assert tokenize("Ёлки, ПАЛКИ!") == ["елки", "палки"]
+    assert tokenize(None) == []
+
+
+def test_title_match_ranks_above_description_match():
+    index = InvertedIndex()
+    index.add(_movie(1, "Сталкер", description="Фильм о матрице"))
+    index.add(_movie(2, "Матрица", description="Фильм о хакере"))
+    index.add(_movie(3, "Солярис", description="Фильм о станции"))
+
+    assert _search(index, "матрица") == [2]
+    assert _search(index, "матриц") == [2, 1]
+    # Все слова запроса должны найтись
+    assert _search(index, "фильм хакере") == [2]
+    assert _search(index, "фильм космос") == []
+
+
+def test_genre_filter():
+    index = InvertedIndex()
+    index.add(_movie(1, "Солярис", genres=[DRAMA, SCI_FI]))
+    index.add(_movie(2, "Солярис", genres=[DRAMA]))
+
+    assert _search(index, "солярис") == [1, 2]
+    assert _search(index, "солярис", SCI_FI.id) == [1]
+    assert _search(index, "солярис", 99) == []
+
+
+def test_removed_movies_are_not_found_and_compaction_drops_them():
+    index = InvertedIndex()
+    for movie_id in range(1, 5):
+        index.add(_movie(movie_id, f"Брат {movie_id}", genres=[DRAMA]))
+
+    assert index.remove(2)
+    assert not index.remove(2)
+    assert _search(index, "брат") == [1, 3, 4]
+    assert not index.needs_compaction
+
+    index.remove(3)
+    assert index.needs_compaction
+    compacted = index.compacted()
+    assert len(compacted.documents) == 2
+    assert compacted.live_count == 2
+    assert _search(compacted, "брат") == [1, 4]
+    assert _search(compacted, "брат", DRAMA.id) == [1, 4]
+
+
+def test_search_index_compacts_outside_of_request():
+    movie_index = MovieSearchIndex()
+    for movie_id in range(1, 5):
+        movie_index.upsert(_movie(movie_id, f"Брат {movie_id}", genres=[DRAMA]))
+
+    movie_index.remove(2)
+    movie_index.remove(3)
+    for thread in threading.enumerate():
+        if thread.name == "movie-search-compaction":
+            thread.join()
+
+    assert len(movie_index._index.documents) == 2
+    total, movies = movie_index.search("брат", DRAMA.id)
+    assert total == 2
+    assert [movie.id for movie in movies] == [1, 4]
@@ -0,0 +1,69 @@
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from fastapi.responses import FileResponse
+import os
+import re
+
+from ..utils.image_cache import image_variant_cache, IMAGE_SAVE_OPTIONS
+from ..core.config import settings
+
+router = APIRouter(prefix="/files/img", tags=["Images"])
+
+SIZE_PATTERN = re.compile(r'^(\d+)x(\d+)$')
+
+IMAGE_MEDIA_TYPES = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+
+
+@router.get("/{size}/{path:path}")
+async def get_resized_image(size: str, path: str, request: Request):
+    """
+    Уменьшенная копия изображения из хранилища (не больше {w}x{h}, с сохранением пропорций)
+    Создается при первом запросе и кэшируется на диске. URL не меняется при замене исходника,
+    поэтому клиенты кэшируют ненадолго и перепроверяют копию по ETag
+    """
+    size_match = SIZE_PATTERN.match(size)
+    if not size_match:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Size must be in WIDTHxHEIGHT format"
+        )
+    
+    width, height = int(size_match.group(1)), int(size_match.group(2))
+    if not (0 < width <= settings.image_resize_max_dimension and 0 < height <= settings.image_resize_max_dimension):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Image dimensions must be between 1 and {settings.image_resize_max_dimension}"
+        )
+    
+    # Путь относительно хранилища, без выхода за его пределы
+    source_path = os.path.normpath(path)
+    if os.path.isabs(source_path) or source_path.startswith('..'):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    extension = os.path.splitext(source_path)[1].lower().lstrip('.')
+    if extension not in IMAGE_SAVE_OPTIONS or extension not in settings.allowed_image_formats_list:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unsupported image format"
+        )
+    
+    variant = await image_variant_cache.get_variant(source_path, width, height)
+    if variant is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    
+    variant_path, _ = variant
+    # Имя копии зависит от исходника: после его замены меняется и ETag
+    etag = f'"{os.path.splitext(os.path.basename(variant_path))[0]}"'
+    headers = {
+        'Cache-Control': f'public, max-age={settings.image_cache_max_age_seconds}',
+        'ETag': etag
+    }
+    if etag in [value.strip() for value in request.headers.get('if-none-match', '').split(',')]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    return FileResponse(variant_path, media_type=IMAGE_MEDIA_TYPES[extension], headers=headers)
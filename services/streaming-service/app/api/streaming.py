@@ -1,29 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from fastapi.responses import StreamingResponse, FileResponse, RedirectResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 import os
 import re
+import asyncio
+import time
 from datetime import datetime
+from urllib.parse import urlencode
 
 from ..core.database import get_db
 from ..models.video import VideoFile, VideoQuality
 from ..models.watch_session import WatchSession, WatchHistory, StreamingStats
 from ..schemas.streaming import (
     WatchSessionCreate, WatchSessionUpdate, WatchSession as WatchSessionSchema,
-    StreamingInfo, StreamingSessionInfo, UserWatchStats, MovieStreamingStats
+    StreamingInfo, StreamingSessionInfo, UserWatchStats, MovieStreamingStats, SeekInfo
 )
 from ..utils.auth import get_current_user, get_current_user_optional, get_client_info
 from ..utils.file_handler import file_handler
+from ..utils.url_signer import url_signer
+from ..utils.path_cache import CachedPath, video_path_cache
+from ..utils.keyframe_index import KeyframeIndex, keyframe_index_cache
+from ..utils.storage_layout import DEFAULT_CODEC, rendition_name, parse_rendition
+from ..utils.rendition_access import rendition_access_tracker
+from ..utils.http_ranges import parse_range_header, RangeNotSatisfiable, MultipartByteranges
+from ..utils.hls_packager import (
+    HLS_RENDITION, plan_segments, build_media_playlist, build_master_playlist, hls_segment_cache
+)
+from .upload import schedule_rendition
 from ..core.config import settings
 
 router = APIRouter(prefix="/stream", tags=["Video Streaming"])
 
+# Файлы trickplay: WebVTT-индекс и спрайты
+TRICKPLAY_FILE_PATTERN = re.compile(r'^(trickplay\.vtt|sprite_\d{3,}\.(jpg|webp))$')
+TRICKPLAY_MEDIA_TYPES = {'.vtt': 'text/vtt', '.jpg': 'image/jpeg', '.webp': 'image/webp'}
+
+# Форматы превью в порядке предпочтения (по размеру) и их MIME-типы
+PREVIEW_MEDIA_TYPES = {'mp4': 'video/mp4', 'webp': 'image/webp', 'gif': 'image/gif'}
+
+HLS_PLAYLIST_MEDIA_TYPE = 'application/vnd.apple.mpegurl'
+
+# Кодеки в порядке убывания эффективности сжатия
+CODEC_PREFERENCE = ('av1', 'hevc', DEFAULT_CODEC)
+
+
+def _quality_height(quality: str) -> int:
+    """Высота кадра по названию качества (720p -> 720)"""
+    try:
+        return int(quality.rstrip('p'))
+    except ValueError:
+        return 0
+
+
+def _client_codecs(request: Request, codecs: Optional[str]) -> set:
+    """Кодеки, которые поддерживает клиент (параметр codecs или заголовок X-Supported-Codecs)"""
+    declared = codecs or request.headers.get('x-supported-codecs') or ''
+    supported = {codec.strip().lower() for codec in declared.split(',') if codec.strip()}
+    # H.264 поддерживается всеми клиентами
+    supported.add(DEFAULT_CODEC)
+    return supported
+
 
 @router.get("/info/{movie_id}", response_model=StreamingInfo)
 async def get_streaming_info(
     movie_id: int,
+    request: Request,
+    codecs: Optional[str] = Query(None, description="Поддерживаемые клиентом кодеки: av1,hevc,h264"),
     current_user: dict = Depends(get_current_user_optional),
     db: Session = Depends(get_db)
 ):
@@ -44,13 +88,57 @@ async def get_streaming_info(
             detail="No available video found for this movie"
         )
     
-    # Определяем доступные качества
-    available_qualities = settings.supported_qualities_list
+    # Готовые версии видео по кодекам
+    codec_qualities: Dict[str, set] = {}
+    quality_heights: Dict[str, int] = {}
+    renditions = db.query(VideoQuality.quality, VideoQuality.codec, VideoQuality.resolution_height).filter(
+        and_(
+            VideoQuality.original_video_id == video.id,
+            VideoQuality.is_ready == True
+        )
+    ).all()
+    for rendition in renditions:
+        codec_qualities.setdefault(rendition.codec, set()).add(rendition.quality)
+        if rendition.codec == DEFAULT_CODEC:
+            quality_heights[rendition.quality] = rendition.resolution_height
     
-    # Создаем URLs для разных качеств
+    # Доступные качества - версии, которые есть у видео (в режиме jit - вся его лестница,
+    # недостающие ступени создаются при первом запросе). Без версий отдается оригинал
+    if settings.rendition_mode == 'jit':
+        for quality, quality_settings in ((video.video_metadata or {}).get('encoding_ladder') or {}).items():
+            quality_heights.setdefault(quality, quality_settings['height'])
+    available_qualities = sorted(quality_heights, key=quality_heights.get) or [settings.default_video_quality]
+    codec_qualities.pop(DEFAULT_CODEC, None)
+    
+    # Создаем подписанные URLs для разных качеств и кодеков
+    signed_user = current_user['email'] if current_user and settings.stream_url_bind_user else None
+    codec_urls = {DEFAULT_CODEC: {}}
+    for quality in available_qualities:
+        codec_urls[DEFAULT_CODEC][quality] = url_signer.signed_url(
+            f"/api/stream/video/{video.id}", video.id, quality, signed_user
+        )
+    for codec, qualities in codec_qualities.items():
+        codec_urls[codec] = {
+            quality: url_signer.signed_url(
+                f"/api/stream/video/{video.id}", video.id, rendition_name(quality, codec), signed_user
+            )
+            for quality in available_qualities if quality in qualities
+        }
+    
+    # Выбираем самый эффективный кодек, который поддерживает клиент
+    client_codecs = _client_codecs(request, codecs)
+    selected_codec = next(
+        codec for codec in CODEC_PREFERENCE
+        if codec in client_codecs and codec_urls.get(codec)
+    )
+    
+    # Качества без версии в выбранном кодеке отдаются в H.264
     stream_urls = {}
+    stream_codecs = {}
     for quality in available_qualities:
-        stream_urls[quality] = f"/api/stream/video/{video.id}?quality={quality}"
+        codec = selected_codec if quality in codec_urls[selected_codec] else DEFAULT_CODEC
+        stream_urls[quality] = codec_urls[codec][quality]
+        stream_codecs[quality] = codec
     
     # Получаем текущую позицию для авторизованного пользователя
     current_position = 0.0
@@ -78,30 +166,43 @@ async def get_streaming_info(
         if last_session and last_session.quality:
             recommended_quality = last_session.quality
     
+    if recommended_quality not in available_qualities:
+        target_height = _quality_height(recommended_quality)
+        recommended_quality = min(
+            available_qualities,
+            key=lambda quality: (abs(_quality_height(quality) - target_height), _quality_height(quality))
+        )
+    
     return StreamingInfo(
         video_id=video.id,
         movie_id=movie_id,
         stream_urls=stream_urls,
+        codec=selected_codec,
+        stream_codecs=stream_codecs,
+        codec_urls=codec_urls,
         thumbnail_url=file_handler.get_file_url(video.thumbnail_path) if video.thumbnail_path else None,
+        thumbnail_urls={
+            size: file_handler.get_file_url(path)
+            for size, path in (video.video_metadata or {}).get('thumbnails', {}).items()
+        },
         duration=video.duration_seconds,
         current_position=current_position,
         available_qualities=available_qualities,
         recommended_quality=recommended_quality,
         subtitles_available=False,  # TODO: Implement subtitles
-        subtitles_urls={}
+        subtitles_urls={},
+        trickplay_url=(
+            f"/api/stream/trickplay/{video.id}/trickplay.vtt"
+            if (video.video_metadata or {}).get('trickplay') else None
+        ),
+        preview_url=f"/api/stream/preview/{video.id}" if video.preview_path else None,
+        hls_url=url_signer.signed_url(
+            f"/api/stream/hls/{video.id}/master.m3u8", video.id, HLS_RENDITION, signed_user
+        ) if settings.hls_enabled and settings.keyframe_index_enabled else None
     )
 
 
-@router.get("/video/{video_id}")
-async def stream_video(
-    video_id: int,
-    request: Request,
-    quality: str = "720p",
-    db: Session = Depends(get_db)
-):
-    """Стримить видеофайл с поддержкой range requests"""
-    
-    # Получаем видеофайл
+def _load_available_video(video_id: int, db: Session) -> VideoFile:
     video = db.query(VideoFile).filter(
         and_(
             VideoFile.id == video_id,
@@ -115,79 +216,506 @@ async def stream_video(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Video not found or not available"
         )
+    return video
+
+
+def _nearest_rendition(video: VideoFile, quality: str, db: Session) -> Optional[VideoQuality]:
+    """Ближайшая по высоте готовая версия H.264 (при равенстве - меньшая)"""
+    ladder = (video.video_metadata or {}).get('encoding_ladder') or {}
+    target_height = ladder[quality]['height'] if quality in ladder else _quality_height(quality)
+    if not target_height:
+        return None
+    
+    ready = db.query(VideoQuality).filter(
+        and_(
+            VideoQuality.original_video_id == video.id,
+            VideoQuality.codec == DEFAULT_CODEC,
+            VideoQuality.is_ready == True
+        )
+    ).all()
+    ready = [rendition for rendition in ready if file_handler.file_exists(rendition.file_path)]
+    if not ready:
+        return None
+    return min(
+        ready,
+        key=lambda rendition: (abs(rendition.resolution_height - target_height), rendition.resolution_height)
+    )
+
+
+def _resolve_video_path(video_id: int, quality: str, db: Session, video: Optional[VideoFile] = None,
+                        codec: str = DEFAULT_CODEC) -> Tuple[CachedPath, bool]:
+    """
+    Определяет файл нужного качества и кодека (с кэшированием)
+    Если такой версии нет, отдается ближайшая по высоте готовая версия H.264; оригинал -
+    только если готовых версий у видео нет совсем.
+    Возвращает отдаваемый файл (путь, фактическая версия, тип содержимого) и признак того,
+    что запрошенной версии нет и ее нужно создать (режим jit).
+    """
+    
+    rendition = rendition_name(quality, codec)
+    cached = video_path_cache.get(video_id, rendition)
+    if cached and file_handler.file_exists(cached.path):
+        return cached, False
+    
+    # Сначала пытаемся найти конвертированное качество (в запрошенном кодеке, затем в H.264)
+    candidate_codecs = [codec] if codec == DEFAULT_CODEC else [codec, DEFAULT_CODEC]
+    for candidate_codec in candidate_codecs:
+        quality_video_path = file_handler.get_relative_path(
+            file_handler.get_rendition_path(video_id, quality, candidate_codec)
+        )
+        if file_handler.file_exists(quality_video_path):
+            resolved = CachedPath(quality_video_path, rendition_name(quality, candidate_codec), 'video/mp4')
+            video_path_cache.set(video_id, rendition, resolved)
+            return resolved, False
+    
+    if video is None:
+        video = _load_available_video(video_id, db)
+    
+    # Ступени нет в лестнице видео (или она еще создается) - отдаем ближайшую готовую
+    nearest = _nearest_rendition(video, quality, db)
+    if nearest is not None:
+        resolved = CachedPath(nearest.file_path, nearest.quality, 'video/mp4')
+        if settings.rendition_mode == 'jit':
+            # Пока версия создается, замена кэшируется ненадолго, чтобы вскоре отдавать созданную;
+            # кодирование ставится в очередь только при промахе кэша
+            video_path_cache.set(video_id, rendition, resolved, settings.stream_fallback_cache_ttl_seconds)
+            ladder = (video.video_metadata or {}).get('encoding_ladder') or {}
+            return resolved, quality in ladder
+        
+        video_path_cache.set(video_id, rendition, resolved)
+        return resolved, False
+    
+    # Готовых версий нет, используем оригинал (в формате загрузки)
+    video_path = file_handler.get_relative_path(video.file_path)
+    if not file_handler.file_exists(video_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Video file not found on disk"
+        )
+    
+    resolved = CachedPath(video_path, None, video.mime_type or 'video/mp4')
+    video_path_cache.set(video_id, rendition, resolved)
+    return resolved, False
+
+
+def _load_keyframe_index(video_id: int, quality: str, codec: str = DEFAULT_CODEC) -> Optional[KeyframeIndex]:
+    """Загружает индекс ключевых кадров версии видео (с кэшированием)"""
+    
+    rendition = rendition_name(quality, codec)
+    index = keyframe_index_cache.get(video_id, rendition)
+    if index is not None:
+        return index
+    
+    index_path = file_handler.get_relative_path(file_handler.get_keyframe_index_path(video_id, quality, codec))
+    if not file_handler.file_exists(index_path):
+        return None
+    
+    with open(file_handler.fetch_file(index_path), 'rb') as f:
+        index = KeyframeIndex.from_bytes(f.read())
+    
+    keyframe_index_cache.set(video_id, rendition, index)
+    return index
+
+
+@router.get("/seek/{video_id}", response_model=SeekInfo)
+async def seek_video(
+    video_id: int,
+    t: float = Query(..., ge=0),
+    quality: str = "720p",
+    codec: str = DEFAULT_CODEC
+):
+    """Найти ближайший ключевой кадр (не позже t) и его смещение в файле"""
+    
+    index = await asyncio.to_thread(_load_keyframe_index, video_id, quality, codec)
+    if index is None or not len(index):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Keyframe index not found"
+        )
+    
+    keyframe_time, byte_offset = index.lookup(t)
+    
+    return SeekInfo(
+        video_id=video_id,
+        quality=quality,
+        requested_time=t,
+        keyframe_time=keyframe_time,
+        byte_offset=byte_offset
+    )
+
+
+@router.get("/trickplay/{video_id}/{filename}")
+async def get_trickplay_file(video_id: int, filename: str):
+    """
+    Файлы превью для перемотки: trickplay.vtt и спрайты, на которые он ссылается
+    Плеер загружает несколько небольших изображений вместо запросов к видеофайлу
+    """
+    if not TRICKPLAY_FILE_PATTERN.match(filename):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trickplay file not found"
+        )
+    
+    file_path = file_handler.get_relative_path(
+        file_handler.get_thumbnail_path(video_id, f"video_{video_id}_{filename}")
+    )
+    backend = file_handler.backend
+    if not await asyncio.to_thread(backend.exists, file_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Trickplay file not found"
+        )
+    
+    headers = {'Cache-Control': 'public, max-age=86400'}
+    media_type = TRICKPLAY_MEDIA_TYPES[os.path.splitext(filename)[1]]
+    
+    if backend.is_remote:
+        if settings.stream_redirect_to_presigned:
+            presigned_url = backend.presigned_url(file_path, settings.stream_url_ttl_seconds)
+            return RedirectResponse(presigned_url, status_code=status.HTTP_302_FOUND)
+        
+        file_size = await asyncio.to_thread(backend.size, file_path)
+        headers['Content-Length'] = str(file_size)
+        return StreamingResponse(
+            backend.iter_range(file_path, 0, file_size - 1), media_type=media_type, headers=headers
+        )
     
-    # Определяем путь к файлу нужного качества
-    video_path = None
+    return FileResponse(backend.local_path(file_path), media_type=media_type, headers=headers)
+
+
+def _preview_candidates(accept: str, preview_format: Optional[str]) -> list:
+    """Форматы превью, подходящие клиенту, в порядке предпочтения (GIF - запасной вариант)"""
+    if preview_format:
+        return [preview_format]
+    
+    accepted = {part.split(';')[0].strip().lower() for part in accept.split(',')}
+    candidates = [
+        fmt for fmt, media_type in PREVIEW_MEDIA_TYPES.items()
+        if fmt != 'gif' and media_type in accepted
+    ]
+    return candidates + ['gif']
+
+
+@router.get("/preview/{video_id}")
+async def get_preview(
+    video_id: int,
+    request: Request,
+    preview_format: Optional[str] = Query(None, alias="format", pattern="^(mp4|webp|gif)$")
+):
+    """
+    Анимированное превью видео в наиболее компактном формате, который принимает клиент
+    Формат выбирается по заголовку Accept (video/mp4, image/webp) или параметру format
+    """
+    backend = file_handler.backend
+    
+    for candidate in _preview_candidates(request.headers.get('accept', ''), preview_format):
+        file_path = file_handler.get_relative_path(
+            file_handler.get_thumbnail_path(video_id, f"video_{video_id}_preview.{candidate}")
+        )
+        if not await asyncio.to_thread(backend.exists, file_path):
+            continue
+        
+        media_type = PREVIEW_MEDIA_TYPES[candidate]
+        headers = {'Cache-Control': 'public, max-age=86400', 'Vary': 'Accept'}
+        
+        if backend.is_remote:
+            file_size = await asyncio.to_thread(backend.size, file_path)
+            headers['Content-Length'] = str(file_size)
+            return StreamingResponse(
+                backend.iter_range(file_path, 0, file_size - 1), media_type=media_type, headers=headers
+            )
+        
+        return FileResponse(backend.local_path(file_path), media_type=media_type, headers=headers)
     
-    # Сначала пытаемся найти конвертированное качество
-    quality_video_path = os.path.join(
-        settings.storage_path, 'videos', f"video_{video_id}_{quality}.mp4"
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Preview not found"
     )
+
+
+def _check_url_user(u: Optional[str], current_user: Optional[dict]):
+    """URL, привязанный к пользователю, не может использовать другой авторизованный пользователь"""
+    if not url_signer.matches_user(u, current_user['email'] if current_user else None):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Stream URL was issued to another user"
+        )
+
+
+def _hls_access(video_id: int, expires: Optional[int], sig: Optional[str], u: Optional[str],
+                current_user: Optional[dict] = None) -> Tuple[str, str]:
+    """
+    Проверяет доступ к HLS видео (одна подпись на все плейлисты и сегменты)
+    Возвращает query-строку для вложенных ссылок и заголовок Cache-Control
+    """
+    if not settings.hls_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="HLS is disabled"
+        )
+    
+    if sig is None:
+        if settings.require_signed_stream_urls:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Signed stream URL required"
+            )
+        return "", "public, max-age=86400"
+    
+    if expires is None or not url_signer.verify(video_id, HLS_RENDITION, expires, sig, u):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired stream URL"
+        )
+    _check_url_user(u, current_user)
+    
+    params = {'expires': expires}
+    if u:
+        params['u'] = u
+    params['sig'] = sig
+    max_age = max(0, expires - int(time.time()))
+    return f"?{urlencode(params)}", f"{'private' if u else 'public'}, max-age={max_age}"
+
+
+@router.get("/hls/{video_id}/master.m3u8")
+async def get_hls_master_playlist(
+    video_id: int,
+    expires: Optional[int] = None,
+    sig: Optional[str] = None,
+    u: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_optional),
+    db: Session = Depends(get_db)
+):
+    """Мастер-плейлист HLS: готовые версии видео в H.264"""
+    query, cache_control = _hls_access(video_id, expires, sig, u, current_user)
+    video = _load_available_video(video_id, db)
+    
+    renditions = db.query(VideoQuality).filter(
+        and_(
+            VideoQuality.original_video_id == video.id,
+            VideoQuality.codec == DEFAULT_CODEC,
+            VideoQuality.is_ready == True
+        )
+    ).all()
+    if not renditions:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No renditions available for HLS"
+        )
+    
+    playlist = build_master_playlist([
+        {
+            'quality': rendition.quality,
+            'bitrate': rendition.bitrate,
+            'width': rendition.resolution_width,
+            'height': rendition.resolution_height
+        }
+        for rendition in renditions
+    ], query)
+    return Response(playlist, media_type=HLS_PLAYLIST_MEDIA_TYPE, headers={'Cache-Control': cache_control})
+
+
+@router.get("/hls/{video_id}/{quality}/index.m3u8")
+async def get_hls_media_playlist(
+    video_id: int,
+    quality: str,
+    expires: Optional[int] = None,
+    sig: Optional[str] = None,
+    u: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_optional),
+    db: Session = Depends(get_db)
+):
+    """Плейлист версии видео: сегменты по ключевым кадрам из индекса"""
+    query, cache_control = _hls_access(video_id, expires, sig, u, current_user)
+    video = _load_available_video(video_id, db)
+    
+    index = await asyncio.to_thread(_load_keyframe_index, video_id, quality)
+    if index is None or not len(index):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Rendition not available for HLS"
+        )
+    
+    segments = plan_segments(index, settings.hls_segment_seconds)
+    playlist = build_media_playlist(segments, video.duration_seconds or 0.0, query)
+    return Response(playlist, media_type=HLS_PLAYLIST_MEDIA_TYPE, headers={'Cache-Control': cache_control})
+
+
+@router.get("/hls/{video_id}/{quality}/segment_{number}.ts")
+async def get_hls_segment(
+    video_id: int,
+    quality: str,
+    number: int,
+    expires: Optional[int] = None,
+    sig: Optional[str] = None,
+    u: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_optional)
+):
+    """
+    Сегмент HLS (MPEG-TS), вырезанный из MP4-версии без перекодирования
+    Созданные сегменты хранятся в дисковом кэше с вытеснением по LRU
+    """
+    _, cache_control = _hls_access(video_id, expires, sig, u, current_user)
+    
+    index = await asyncio.to_thread(_load_keyframe_index, video_id, quality)
+    segments = plan_segments(index, settings.hls_segment_seconds) if index is not None else []
+    source_path = file_handler.get_relative_path(file_handler.get_rendition_path(video_id, quality))
+    if not 0 <= number < len(segments) or not await asyncio.to_thread(file_handler.file_exists, source_path):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Segment not found"
+        )
     
-    if os.path.exists(quality_video_path):
-        video_path = quality_video_path
+    start, end = segments[number]
+    try:
+        segment_path, _ = await hls_segment_cache.get_segment(video_id, quality, number, source_path, start, end)
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+    
+    rendition_access_tracker.record(video_id, source_path)
+    return FileResponse(segment_path, media_type='video/mp2t', headers={'Cache-Control': cache_control})
+
+
+@router.get("/video/{video_id}")
+async def stream_video(
+    video_id: int,
+    request: Request,
+    quality: str = settings.default_video_quality,
+    codec: Optional[str] = None,
+    t: Optional[float] = Query(None, ge=0),
+    expires: Optional[int] = None,
+    sig: Optional[str] = None,
+    u: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_optional),
+    db: Session = Depends(get_db)
+):
+    """
+    Стримить видеофайл с поддержкой range requests
+    
+    Подписанные URL (expires + sig) проверяются без обращения к базе данных,
+    путь к файлу берется из кэша.
+    Параметр t (секунды) начинает ответ с ближайшего ключевого кадра.
+    Кодек задается параметром codec или суффиксом качества (720p_hevc).
+    """
+    
+    if codec is None:
+        quality, codec = parse_rendition(quality)
+    rendition = rendition_name(quality, codec)
+    
+    cache_control = None
+    video = None
+    
+    if sig is not None:
+        # Проверяем подпись URL
+        if expires is None or not url_signer.verify(video_id, rendition, expires, sig, u):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invalid or expired stream URL"
+            )
+        _check_url_user(u, current_user)
+        
+        # Подписанный URL можно кэшировать до истечения срока действия
+        max_age = max(0, expires - int(time.time()))
+        cache_control = f"{'private' if u else 'public'}, max-age={max_age}"
     else:
-        # Если нет нужного качества, используем оригинал
-        original_path = file_handler.get_full_path(video.file_path)
-        if os.path.exists(original_path):
-            video_path = original_path
-        else:
+        if settings.require_signed_stream_urls:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Video file not found on disk"
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Signed stream URL required"
             )
+        
+        # Получаем видеофайл
+        video = _load_available_video(video_id, db)
+    
+    # Проверка наличия файла может требовать запроса к удаленному хранилищу
+    resolved, missing = await asyncio.to_thread(
+        _resolve_video_path, video_id, quality, db, video, codec
+    )
+    if missing:
+        await schedule_rendition(db, video_id, quality)
+    video_path, served_rendition, media_type = resolved
+    rendition_access_tracker.record(video_id, video_path)
+    backend = file_handler.backend
+    
+    # Удаленное хранилище может отдавать файл напрямую
+    if backend.is_remote and settings.stream_redirect_to_presigned:
+        presigned_url = backend.presigned_url(video_path, settings.stream_url_ttl_seconds)
+        return RedirectResponse(presigned_url, status_code=status.HTTP_302_FOUND)
     
     # Получаем размер файла
-    file_size = os.path.getsize(video_path)
+    file_size = await asyncio.to_thread(backend.size, video_path)
     
     # Обрабатываем Range header для HTTP Range Requests
     range_header = request.headers.get('range')
     
+    # Перемотка по времени: начинаем с ближайшего ключевого кадра (в индексе отдаваемой версии)
+    if t is not None and not range_header and served_rendition:
+        index = await asyncio.to_thread(_load_keyframe_index, video_id, *parse_rendition(served_rendition))
+        if index is not None and len(index):
+            _, byte_offset = index.lookup(t)
+            range_header = f"bytes={byte_offset}-"
+    
     if range_header:
-        # Парсим Range header
-        range_match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-        if range_match:
-            start = int(range_match.group(1))
-            end = int(range_match.group(2)) if range_match.group(2) else file_size - 1
-            
-            # Ограничиваем диапазон
-            start = max(0, start)
-            end = min(file_size - 1, end)
-            content_length = end - start + 1
-            
-            def iter_file_range():
-                with open(video_path, 'rb') as f:
-                    f.seek(start)
-                    remaining = content_length
-                    while remaining:
-                        chunk_size = min(8192, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-            
+        # Парсим Range header (RFC 7233): несколько диапазонов, суффиксы, объединение соседних
+        try:
+            ranges = parse_range_header(range_header, file_size)
+        except RangeNotSatisfiable:
+            raise HTTPException(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                detail="Requested range not satisfiable",
+                headers={'Content-Range': f'bytes */{file_size}', 'Accept-Ranges': 'bytes'}
+            )
+        
+        if ranges and len(ranges) == 1:
+            start, end = ranges[0]
             headers = {
                 'Content-Range': f'bytes {start}-{end}/{file_size}',
                 'Accept-Ranges': 'bytes',
-                'Content-Length': str(content_length),
-                'Content-Type': 'video/mp4'
+                'Content-Length': str(end - start + 1),
+                'Content-Type': media_type
             }
+            if cache_control:
+                headers['Cache-Control'] = cache_control
             
             return StreamingResponse(
-                iter_file_range(),
+                backend.iter_range(video_path, start, end),
                 status_code=206,
                 headers=headers
             )
+        
+        if ranges:
+            # Несколько диапазонов (например, начало файла и moov в конце) - одним ответом
+            body = MultipartByteranges(ranges, file_size, media_type)
+            headers = {
+                'Accept-Ranges': 'bytes',
+                'Content-Length': str(body.content_length)
+            }
+            if cache_control:
+                headers['Cache-Control'] = cache_control
+            
+            return StreamingResponse(
+                body.iter_body(lambda start, end: backend.iter_range(video_path, start, end)),
+                status_code=206,
+                media_type=body.media_type,
+                headers=headers
+            )
     
     # Если нет Range header, отдаем весь файл
     headers = {
         'Accept-Ranges': 'bytes',
         'Content-Length': str(file_size),
-        'Content-Type': 'video/mp4'
+        'Content-Type': media_type
     }
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    
+    if backend.is_remote:
+        return StreamingResponse(backend.iter_range(video_path, 0, file_size - 1), headers=headers)
     
-    return FileResponse(video_path, headers=headers)
+    return FileResponse(backend.local_path(video_path), headers=headers)
 
 
 @router.post("/session", response_model=WatchSessionSchema)
@@ -1,22 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import Optional
+from sqlalchemy import and_, tuple_
+from typing import Optional, List, Dict
+from datetime import datetime
+import os
 import asyncio
+import base64
+import logging
 import httpx
+from urllib.parse import urlencode
 
 from ..core.database import get_db
-from ..models.video import VideoFile
-from ..schemas.video import VideoUploadResponse, VideoProcessingStatus, VideoFile as VideoFileSchema
-from ..utils.auth import get_current_user
+from ..models.video import VideoFile, VideoQuality
+from ..schemas.video import (
+    VideoUploadResponse, VideoProcessingStatus, VideoFileSummary, VideoStatusBatchRequest,
+    StorageReconcileReport, MovieStorageUsage, ProgressEventsLink
+)
+from ..utils.auth import get_current_user, get_current_user_optional
+from ..utils.url_signer import url_signer
 from ..utils.file_handler import file_handler
 from ..utils.video_processor import video_processor
+from ..utils.path_cache import video_path_cache
+from ..utils.keyframe_index import keyframe_index_cache
+from ..utils.storage_gc import storage_reconciler
+from ..utils.storage_layout import DEFAULT_CODEC
+from ..utils.media_probe import probe_cache, probe_cache_key, VIDEO_INFO_FIELDS
+from ..utils.progress_events import progress_event_bus, format_sse, TERMINAL_STATUSES
+from ..utils.transcode_scheduler import transcode_scheduler
 from ..core.config import settings
 
 router = APIRouter(prefix="/upload", tags=["Video Upload"])
 
+logger = logging.getLogger(__name__)
+
 # Словарь для отслеживания процессов обработки видео
 processing_tasks = {}
 
+# Версии, поставленные в очередь по запросу зрителей: (video_id, quality)
+pending_renditions = set()
+
 
 async def update_video_processing_status(video_id: int, status: str, progress: float, db_session=None):
     """Callback для обновления статуса обработки видео"""
@@ -30,10 +53,192 @@ async def update_video_processing_status(video_id: int, status: str, progress: f
             elif status == 'failed':
                 video.is_processed = False
             db_session.commit()
+            _notify_status(db_session, video)
+
+
+def _notify_status(db, video: VideoFile):
+    """Публикует текущий статус обработки видео подписчикам событий"""
+    progress_event_bus.publish(
+        db, video.id, video.processing_status, video.processing_progress,
+        uploaded_by=video.uploaded_by, error=video.processing_error
+    )
+
+
+def _record_renditions(db, video_id: int, qualities_created: list):
+    """Сохраняет созданные версии видео в таблицу VideoQuality"""
+    existing = {
+        (rendition.quality, rendition.codec): rendition
+        for rendition in db.query(VideoQuality).filter(VideoQuality.original_video_id == video_id).all()
+    }
+    
+    for created in qualities_created:
+        codec = created.get('codec', DEFAULT_CODEC)
+        rendition = existing.get((created['quality'], codec))
+        if rendition is None:
+            rendition = VideoQuality(original_video_id=video_id, quality=created['quality'], codec=codec)
+            db.add(rendition)
+        
+        rendition.resolution_width = created['width']
+        rendition.resolution_height = created['height']
+        rendition.bitrate = created['bitrate']
+        rendition.file_path = file_handler.get_relative_path(created['path'])
+        rendition.file_size = created['file_size']
+        rendition.is_ready = True
+
+
+def _load_checkpoint(db, video: VideoFile) -> dict:
+    """Результаты прошлой попытки обработки: лестница качеств и готовые версии видео"""
+    metadata = video.video_metadata or {}
+    renditions = {}
+    
+    ready = db.query(VideoQuality).filter(
+        VideoQuality.original_video_id == video.id,
+        VideoQuality.codec == DEFAULT_CODEC,
+        VideoQuality.is_ready == True
+    ).all()
+    for rendition in ready:
+        if not file_handler.file_exists(rendition.file_path):
+            continue
+        
+        completed = {
+            'quality': rendition.quality,
+            'path': file_handler.get_full_path(rendition.file_path),
+            'file_size': rendition.file_size,
+            'width': rendition.resolution_width,
+            'height': rendition.resolution_height,
+            'bitrate': rendition.bitrate,
+            'published': True
+        }
+        index_path = file_handler.get_keyframe_index_path(video.id, rendition.quality)
+        if file_handler.file_exists(file_handler.get_relative_path(index_path)):
+            completed['keyframe_index_path'] = index_path
+        renditions[rendition.quality] = completed
+    
+    return {
+        'encoding_ladder': metadata.get('encoding_ladder'),
+        'complexity_probe_kbps': metadata.get('complexity_probe_kbps'),
+        'renditions': renditions
+    }
+
+
+async def _publish_outputs(result: dict):
+    """Публикует созданные при обработке файлы в хранилище"""
+    paths = []
+    for created in result.get('qualities_created', []):
+        # Версии, сохраненные по ходу обработки, уже опубликованы
+        if created.get('published'):
+            continue
+        paths.append(created['path'])
+        if created.get('keyframe_index_path'):
+            paths.append(created['keyframe_index_path'])
+    paths.extend(result.get('thumbnails', {}).values())
+    paths.extend(result.get('preview_variants', {}).values())
+    if result.get('trickplay'):
+        # Индекс публикуется последним, когда все спрайты уже доступны
+        paths.extend(result['trickplay']['sprite_paths'])
+        paths.append(result['trickplay']['vtt_path'])
+    
+    for path in paths:
+        await asyncio.to_thread(file_handler.publish_file, path)
 
 
-async def process_uploaded_video(video_id: int, file_path: str):
-    """Фоновая задача для обработки загруженного видео"""
+async def encode_extra_codecs(video_id: int, file_path: str, ladder: dict, low_priority: bool = True):
+    """Фоновая задача: версии видео в дополнительных кодеках (HEVC, AV1)"""
+    from ..core.database import SessionLocal
+    
+    file_path = await asyncio.to_thread(file_handler.fetch_file, file_path)
+    db = SessionLocal()
+    try:
+        result = await video_processor.encode_extra_codecs(video_id, file_path, ladder, low_priority)
+        if result['errors']:
+            logger.warning(f"Extra codec encoding for video {video_id}: {'; '.join(result['errors'])}")
+        
+        await _publish_outputs(result)
+        
+        # Видео могло быть удалено, пока шло кодирование
+        if db.query(VideoFile.id).filter(VideoFile.id == video_id).first():
+            _record_renditions(db, video_id, result['qualities_created'])
+            db.commit()
+    except Exception as e:
+        logger.error(f"Extra codec encoding failed for video {video_id}: {str(e)}")
+    finally:
+        db.close()
+        file_handler.release_local_copy(file_path)
+
+
+async def schedule_extra_codecs(db, video: VideoFile, file_path: str, ladder: dict):
+    """Ставит кодирование в дополнительные кодеки в очередь планировщика (фоновая задача)"""
+    if not settings.extra_codecs_list or not ladder:
+        return
+    
+    video_id = video.id
+    await transcode_scheduler.submit(
+        'extra_codecs', video_id,
+        lambda low_priority: encode_extra_codecs(video_id, file_path, ladder, low_priority),
+        db, movie_id=video.movie_id
+    )
+
+
+async def encode_rendition_on_demand(video_id: int, quality: str, low_priority: bool = False):
+    """Фоновая задача: версия видео, запрошенная зрителем (режим jit)"""
+    from ..core.database import SessionLocal
+    
+    db = SessionLocal()
+    file_path = None
+    try:
+        video = db.query(VideoFile).filter(VideoFile.id == video_id).first()
+        ladder = ((video.video_metadata or {}).get('encoding_ladder') or {}) if video else {}
+        if quality not in ladder:
+            return
+        
+        file_path = await asyncio.to_thread(file_handler.fetch_file, video.file_path)
+        created = await video_processor.encode_rendition(
+            video_id, file_path, quality, ladder[quality],
+            low_priority=low_priority, duration=video.duration_seconds
+        )
+        if not created:
+            logger.warning(f"On-demand encoding of {quality} failed for video {video_id}")
+            return
+        
+        await _publish_outputs({'qualities_created': [created]})
+        
+        # Видео могло быть удалено, пока шло кодирование
+        if db.query(VideoFile.id).filter(VideoFile.id == video_id).first():
+            _record_renditions(db, video_id, [created])
+            db.commit()
+        video_path_cache.invalidate(video_id)
+    except Exception as e:
+        logger.error(f"On-demand encoding of {quality} failed for video {video_id}: {str(e)}")
+    finally:
+        db.close()
+        if file_path:
+            file_handler.release_local_copy(file_path)
+        pending_renditions.discard((video_id, quality))
+
+
+async def schedule_rendition(db, video_id: int, quality: str):
+    """Ставит в очередь кодирование отсутствующей версии (один раз, пока она не создана)"""
+    if (video_id, quality) in pending_renditions:
+        return
+    
+    video = db.query(VideoFile.movie_id, VideoFile.video_metadata).filter(VideoFile.id == video_id).first()
+    if not video or quality not in ((video.video_metadata or {}).get('encoding_ladder') or {}):
+        return
+    
+    pending_renditions.add((video_id, quality))
+    await transcode_scheduler.submit(
+        'rendition', video_id,
+        lambda low_priority: encode_rendition_on_demand(video_id, quality, low_priority),
+        db, movie_id=video.movie_id
+    )
+
+
+async def process_uploaded_video(video_id: int, file_path: str, video_info: Optional[dict] = None,
+                                 low_priority: bool = False):
+    """
+    Фоновая задача для обработки загруженного видео (запускается планировщиком)
+    video_info - результат ffprobe, полученный при загрузке (если проверялся весь файл)
+    """
     from ..core.database import SessionLocal
     
     db = SessionLocal()
@@ -41,30 +246,69 @@ async def process_uploaded_video(video_id: int, file_path: str):
         # Обновляем статус на "processing"
         await update_video_processing_status(video_id, 'processing', 0.0, db)
         
-        # Получаем информацию о видео
-        video_info = await video_processor.get_video_info(file_path)
+        # Получаем локальную копию исходного файла (для удаленного хранилища)
+        source_key = file_handler.get_relative_path(file_path)
+        file_path = await asyncio.to_thread(file_handler.fetch_file, file_path)
         
-        # Обновляем метаданные видео в базе
         video = db.query(VideoFile).filter(VideoFile.id == video_id).first()
+        content_hash = video.content_hash if video else None
+        
+        # Получаем информацию о видео (один раз на всю обработку).
+        # При повторной обработке используем сохраненный в video_metadata результат
+        if video_info is None and video and content_hash:
+            metadata = video.video_metadata or {}
+            if metadata.get('probe_key') == probe_cache_key(file_path, content_hash):
+                video_info = {key: metadata.get(key) for key in VIDEO_INFO_FIELDS}
+        if video_info is None:
+            video_info = await video_processor.get_video_info(file_path, content_hash)
+        
+        # Обновляем метаданные видео в базе
+        checkpoint = None
         if video:
+            checkpoint = _load_checkpoint(db, video)
             video.duration_seconds = video_info.get('duration')
             video.resolution_width = video_info.get('width')
             video.resolution_height = video_info.get('height')
             video.bitrate = video_info.get('bitrate')
             video.fps = video_info.get('fps')
             video.codec = video_info.get('codec')
-            video.video_metadata = video_info
+            video.video_metadata = {
+                **video_info,
+                'complexity_probe_kbps': checkpoint['complexity_probe_kbps'],
+                'encoding_ladder': checkpoint['encoding_ladder']
+            }
             db.commit()
         
         # Создаем callback для обновления прогресса
         async def progress_callback(vid_id: int, stat: str, prog: float):
+            # Итоговый статус сохраняется ниже, после публикации созданных файлов
+            if stat in TERMINAL_STATUSES:
+                return
             await update_video_processing_status(vid_id, stat, prog, db)
         
+        # Сохраняем результаты по ходу обработки, чтобы повторная попытка их пропустила
+        async def output_callback(kind: str, data: dict):
+            if not video:
+                return
+            if kind == 'ladder':
+                video.video_metadata = {**(video.video_metadata or {}), **data}
+            elif kind == 'rendition':
+                await _publish_outputs({'qualities_created': [data]})
+                data['published'] = True
+                _record_renditions(db, video_id, [data])
+            db.commit()
+        
         # Запускаем обработку видео
-        result = await video_processor.process_video_async(video_id, file_path, progress_callback)
+        result = await video_processor.process_video_async(
+            video_id, file_path, progress_callback,
+            checkpoint=checkpoint, output_callback=output_callback, video_info=video_info,
+            low_priority=low_priority
+        )
         
         # Обновляем финальный статус
         if result['status'] == 'completed':
+            await _publish_outputs(result)
+            
             if video:
                 video.processing_status = 'completed'
                 video.processing_progress = 1.0
@@ -72,27 +316,57 @@ async def process_uploaded_video(video_id: int, file_path: str):
                 
                 # Сохраняем пути к созданным файлам
                 if result.get('thumbnail_created'):
-                    video.thumbnail_path = result.get('thumbnail_path')
+                    video.thumbnail_path = file_handler.get_relative_path(result.get('thumbnail_path'))
                 if result.get('preview_created'):
-                    video.preview_path = result.get('preview_path')
+                    video.preview_path = file_handler.get_relative_path(result.get('preview_path'))
+                
+                # Сохраняем выбранную для видео лестницу качеств и параметры trickplay
+                video.video_metadata = {
+                    **(video.video_metadata or {}),
+                    'complexity_probe_kbps': result.get('complexity_probe_kbps'),
+                    'encoding_ladder': result.get('encoding_ladder'),
+                    'trickplay': result['trickplay']['metadata'] if result.get('trickplay') else None,
+                    'preview_formats': sorted(result.get('preview_variants', {})),
+                    'thumbnails': {
+                        size: file_handler.get_relative_path(path)
+                        for size, path in result.get('thumbnails', {}).items()
+                    }
+                }
                 
+                _record_renditions(db, video_id, result['qualities_created'])
                 db.commit()
+                _notify_status(db, video)
+                
+                # Дополнительные кодеки - только для созданных ступеней (в режиме jit - базовой)
+                ladder = result.get('encoding_ladder') or {}
+                await schedule_extra_codecs(db, video, source_key, {
+                    created['quality']: ladder[created['quality']]
+                    for created in result['qualities_created'] if created['quality'] in ladder
+                })
         else:
             if video:
                 video.processing_status = 'failed'
+                video.processing_progress = 1.0
+                video.is_processed = False
                 video.processing_error = '; '.join(result.get('errors', []))
                 db.commit()
+                _notify_status(db, video)
     
     except Exception as e:
         # В случае ошибки обновляем статус
-        await update_video_processing_status(video_id, 'failed', 1.0, db)
+        db.rollback()
         video = db.query(VideoFile).filter(VideoFile.id == video_id).first()
         if video:
+            video.processing_status = 'failed'
+            video.processing_progress = 1.0
+            video.is_processed = False
             video.processing_error = str(e)
             db.commit()
+            _notify_status(db, video)
     
     finally:
         db.close()
+        file_handler.release_local_copy(file_path)
         # Удаляем задачу из отслеживания
         if video_id in processing_tasks:
             del processing_tasks[video_id]
@@ -100,7 +374,6 @@ async def process_uploaded_video(video_id: int, file_path: str):
 
 @router.post("/video", response_model=VideoUploadResponse)
 async def upload_video(
-    background_tasks: BackgroundTasks,
     movie_id: int = Form(...),
     file: UploadFile = File(...),
     quality: Optional[str] = Form(None),
@@ -127,8 +400,16 @@ async def upload_video(
     
     # Сохраняем файл
     try:
-        full_path, relative_path, file_info = await file_handler.save_video_file(file)
+        temp_path, file_info = await file_handler.save_video_file(file)
+        
+        # Помещаем файл в хранилище и учитываем ссылку на него (одинаковые загрузки хранятся один раз)
+        full_path, relative_path = await asyncio.to_thread(
+            file_handler.store_object, db, temp_path, file_info['content_hash'], file_info['file_size']
+        )
+    except HTTPException:
+        raise
     except Exception as e:
+        db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error saving file: {str(e)}"
@@ -137,11 +418,12 @@ async def upload_video(
     # Создаем запись в базе данных
     video_file = VideoFile(
         movie_id=movie_id,
-        filename=file_info['filename'],
+        filename=os.path.basename(relative_path),
         original_filename=file_info['original_filename'],
         file_path=relative_path,
         file_size=file_info['file_size'],
         mime_type=file_info['mime_type'],
+        content_hash=file_info['content_hash'],
         quality=quality,
         is_primary=is_primary,
         uploaded_by=current_user['email'],
@@ -154,7 +436,22 @@ async def upload_video(
     
     # Запускаем обработку видео в фоне
     processing_tasks[video_file.id] = True
-    background_tasks.add_task(process_uploaded_video, video_file.id, full_path)
+    
+    # Результат проверки по части файла неполон (длительность, битрейт), его не переиспользуем
+    upload_probe = file_info.get('video_info')
+    if upload_probe and not upload_probe.get('probe_complete'):
+        upload_probe = None
+    if upload_probe:
+        upload_probe['probe_key'] = probe_cache_key(full_path, file_info['content_hash'])
+        probe_cache.set(upload_probe['probe_key'], upload_probe)
+    
+    # Ставим обработку в очередь планировщика (приоритет по популярности фильма)
+    video_id = video_file.id
+    await transcode_scheduler.submit(
+        'upload', video_id,
+        lambda low_priority: process_uploaded_video(video_id, full_path, upload_probe, low_priority),
+        db, movie_id=movie_id
+    )
     
     return VideoUploadResponse(
         video_id=video_file.id,
@@ -164,6 +461,47 @@ async def upload_video(
     )
 
 
+def _load_processing_statuses(db: Session, video_ids: List[int]) -> Dict[int, VideoProcessingStatus]:
+    """Статусы обработки видео и готовые версии одним запросом (LEFT JOIN с VideoQuality)"""
+    rows = db.query(
+        VideoFile.id,
+        VideoFile.processing_status,
+        VideoFile.processing_progress,
+        VideoFile.processing_error,
+        VideoFile.thumbnail_path,
+        VideoQuality.quality,
+        VideoQuality.resolution_height
+    ).outerjoin(
+        VideoQuality,
+        and_(
+            VideoQuality.original_video_id == VideoFile.id,
+            VideoQuality.codec == DEFAULT_CODEC,
+            VideoQuality.is_ready == True
+        )
+    ).filter(VideoFile.id.in_(video_ids)).all()
+    
+    statuses: Dict[int, VideoProcessingStatus] = {}
+    rendition_heights: Dict[int, Dict[str, int]] = {}
+    for row in rows:
+        if row.id not in statuses:
+            statuses[row.id] = VideoProcessingStatus(
+                video_id=row.id,
+                status=row.processing_status,
+                progress=row.processing_progress,
+                error_message=row.processing_error,
+                thumbnail_url=file_handler.get_file_url(row.thumbnail_path) if row.thumbnail_path else None
+            )
+            rendition_heights[row.id] = {}
+        if row.quality:
+            rendition_heights[row.id][row.quality] = row.resolution_height
+    
+    # Доступные качества - фактически созданные версии, от меньшего к большему
+    for video_id, heights in rendition_heights.items():
+        statuses[video_id].available_qualities = sorted(heights, key=heights.get)
+    
+    return statuses
+
+
 @router.get("/status/{video_id}", response_model=VideoProcessingStatus)
 async def get_processing_status(
     video_id: int,
@@ -171,44 +509,250 @@ async def get_processing_status(
 ):
     """Получить статус обработки видео"""
     
-    video = db.query(VideoFile).filter(VideoFile.id == video_id).first()
-    if not video:
+    statuses = _load_processing_statuses(db, [video_id])
+    if video_id not in statuses:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Video not found"
         )
     
-    # Определяем доступные качества
-    available_qualities = []
-    if video.is_processed and video.processing_status == 'completed':
-        # Получаем список созданных качеств (это может быть реализовано через VideoQuality модель)
-        available_qualities = settings.supported_qualities_list
-    
-    return VideoProcessingStatus(
-        video_id=video.id,
-        status=video.processing_status,
-        progress=video.processing_progress,
-        error_message=video.processing_error,
-        available_qualities=available_qualities,
-        thumbnail_url=file_handler.get_file_url(video.thumbnail_path) if video.thumbnail_path else None
+    return statuses[video_id]
+
+
+@router.post("/status/batch", response_model=list[VideoProcessingStatus])
+async def get_processing_status_batch(
+    request: VideoStatusBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """Получить статусы обработки нескольких видео (несуществующие ID пропускаются)"""
+    
+    video_ids = list(dict.fromkeys(request.video_ids))
+    statuses = _load_processing_statuses(db, video_ids)
+    return [statuses[video_id] for video_id in video_ids if video_id in statuses]
+
+
+def _parse_video_ids(video_ids: str) -> set:
+    """Разбирает список ID видео через запятую"""
+    try:
+        requested_ids = {int(video_id) for video_id in video_ids.split(',') if video_id.strip()}
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="video_ids must be a comma-separated list of integers"
+        )
+    if len(requested_ids) > settings.progress_events_max_videos:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.progress_events_max_videos} videos per subscription"
+        )
+    return requested_ids
+
+
+def _events_scope(video_ids: set) -> str:
+    """Область подписи потока событий: отсортированный список видео"""
+    return "events:" + ",".join(str(video_id) for video_id in sorted(video_ids))
+
+
+@router.post("/events/link", response_model=ProgressEventsLink)
+async def create_processing_events_link(
+    video_ids: Optional[str] = Query(None, description="ID видео через запятую; по умолчанию видео пользователя в обработке"),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Подписанная ссылка на поток событий обработки для браузерного EventSource,
+    который не может передать заголовок Authorization.
+    Ссылка действует progress_events_token_ttl_seconds и только для видео пользователя.
+    """
+    query = db.query(VideoFile.id).filter(VideoFile.uploaded_by == current_user['email'])
+    if video_ids:
+        query = query.filter(VideoFile.id.in_(_parse_video_ids(video_ids)))
+    else:
+        query = query.filter(VideoFile.processing_status.notin_(TERMINAL_STATUSES))
+    owned_ids = {row.id for row in query.limit(settings.progress_events_max_videos).all()}
+    if not owned_ids:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No videos to subscribe to"
+        )
+    
+    params = url_signer.sign_scope(
+        _events_scope(owned_ids), current_user['email'], settings.progress_events_token_ttl_seconds
+    )
+    params['video_ids'] = ",".join(str(video_id) for video_id in sorted(owned_ids))
+    return ProgressEventsLink(
+        events_url=f"/api/upload/events?{urlencode(params)}",
+        video_ids=sorted(owned_ids),
+        expires=int(params['expires'])
     )
 
 
-@router.get("/videos", response_model=list[VideoFileSchema])
+@router.get("/events")
+async def stream_processing_events(
+    request: Request,
+    video_ids: Optional[str] = Query(None, description="ID видео через запятую; по умолчанию все видео пользователя"),
+    expires: Optional[int] = None,
+    sig: Optional[str] = None,
+    u: Optional[str] = None,
+    current_user: Optional[dict] = Depends(get_current_user_optional),
+    db: Session = Depends(get_db)
+):
+    """
+    Поток событий о статусе и прогрессе обработки видео (Server-Sent Events)
+    Сначала отправляется текущий статус каждого видео, затем изменения по мере обработки.
+    Для явного списка видео поток завершается, когда обработка всех видео закончена.
+    Доступ - по заголовку Authorization или по подписанной ссылке из POST /upload/events/link.
+    """
+    requested_ids = _parse_video_ids(video_ids) if video_ids else None
+    
+    signed = sig is not None and expires is not None and bool(requested_ids)
+    if signed:
+        if not url_signer.verify_scope(_events_scope(requested_ids), expires, sig, u):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Invalid or expired events link"
+            )
+        if not url_signer.matches_user(u, current_user['email'] if current_user else None):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Events link was issued to another user"
+            )
+    elif current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # По подписанной ссылке владелец видео проверен при ее выдаче
+    uploaded_by = None if signed else current_user['email']
+    
+    # Подписываемся до чтения текущего состояния, чтобы не пропустить изменения между ними
+    subscription = progress_event_bus.subscribe(requested_ids, uploaded_by)
+    
+    # Текущее состояние - одним запросом
+    query = db.query(
+        VideoFile.id, VideoFile.processing_status, VideoFile.processing_progress, VideoFile.processing_error
+    )
+    if uploaded_by is not None:
+        query = query.filter(VideoFile.uploaded_by == uploaded_by)
+    if requested_ids is not None:
+        query = query.filter(VideoFile.id.in_(requested_ids))
+    snapshot = query.all()
+    db.close()
+    
+    if requested_ids is not None:
+        # Чужие и несуществующие видео не отслеживаем
+        subscription.video_ids = {row.id for row in snapshot}
+    
+    async def event_stream():
+        pending = set(subscription.video_ids) if subscription.video_ids is not None else None
+        try:
+            for row in snapshot:
+                yield format_sse({
+                    'video_id': row.id,
+                    'status': row.processing_status,
+                    'progress': row.processing_progress,
+                    'error_message': row.processing_error
+                })
+                if pending is not None and row.processing_status in TERMINAL_STATUSES:
+                    pending.discard(row.id)
+            
+            while pending is None or pending:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), settings.progress_events_keepalive_seconds
+                    )
+                except asyncio.TimeoutError:
+                    # Комментарий поддерживает соединение через прокси
+                    yield ": keepalive\n\n"
+                    continue
+                
+                # Событие могло попасть в очередь до уточнения списка видео
+                if not subscription.matches(event):
+                    continue
+                
+                yield format_sse(event)
+                if pending is not None and event['status'] in TERMINAL_STATUSES:
+                    pending.discard(event['video_id'])
+            
+            if pending is not None:
+                yield "event: done\ndata: {}\n\n"
+        finally:
+            progress_event_bus.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _encode_video_cursor(created_at: datetime, video_id: int) -> str:
+    """Курсор постраничного вывода: позиция последнего видео страницы"""
+    raw = f"{created_at.isoformat()}|{video_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _decode_video_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, video_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(video_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+@router.get("/videos", response_model=list[VideoFileSummary])
 async def get_uploaded_videos(
+    response: Response,
     movie_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Значение заголовка X-Next-Cursor предыдущей страницы"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Получить список загруженных видео"""
+    """
+    Получить список загруженных видео (от новых к старым)
+    Постраничный вывод по курсору: следующая страница запрашивается с cursor из заголовка X-Next-Cursor
+    """
     
-    query = db.query(VideoFile).filter(VideoFile.uploaded_by == current_user['email'])
+    query = db.query(
+        VideoFile.id,
+        VideoFile.movie_id,
+        VideoFile.original_filename,
+        VideoFile.file_size,
+        VideoFile.quality,
+        VideoFile.is_primary,
+        VideoFile.duration_seconds,
+        VideoFile.thumbnail_path,
+        VideoFile.processing_status,
+        VideoFile.processing_progress,
+        VideoFile.is_available,
+        VideoFile.created_at
+    ).filter(VideoFile.uploaded_by == current_user['email'])
     
     if movie_id:
         query = query.filter(VideoFile.movie_id == movie_id)
     
-    videos = query.order_by(VideoFile.created_at.desc()).all()
-    return videos
+    if cursor:
+        cursor_created_at, cursor_id = _decode_video_cursor(cursor)
+        query = query.filter(
+            tuple_(VideoFile.created_at, VideoFile.id) < tuple_(cursor_created_at, cursor_id)
+        )
+    
+    rows = query.order_by(VideoFile.created_at.desc(), VideoFile.id.desc()).limit(limit + 1).all()
+    
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers['X-Next-Cursor'] = _encode_video_cursor(rows[-1].created_at, rows[-1].id)
+    
+    return [VideoFileSummary.model_validate(row) for row in rows]
 
 
 @router.delete("/video/{video_id}")
@@ -234,15 +778,46 @@ async def delete_video(
         )
     
     # Удаляем файлы
-    files_to_delete = [video.file_path]
+    files_to_delete = []
+    if video.content_hash:
+        # Оригинал удаляется только когда на него не осталось ссылок
+        file_handler.release_object(db, video.content_hash)
+    else:
+        files_to_delete.append(video.file_path)
     if video.thumbnail_path:
         files_to_delete.append(video.thumbnail_path)
     if video.preview_path:
         files_to_delete.append(video.preview_path)
+    files_to_delete.extend((video.video_metadata or {}).get('thumbnails', {}).values())
+    for preview_format in (video.video_metadata or {}).get('preview_formats', []):
+        files_to_delete.append(file_handler.get_relative_path(
+            file_handler.get_thumbnail_path(video_id, f"video_{video_id}_preview.{preview_format}")
+        ))
+    trickplay = (video.video_metadata or {}).get('trickplay')
+    if trickplay:
+        for filename in trickplay['sprites'] + ['trickplay.vtt']:
+            files_to_delete.append(file_handler.get_relative_path(
+                file_handler.get_thumbnail_path(video_id, f"video_{video_id}_{filename}")
+            ))
+    
+    # Удаляем версии видео разного качества
+    renditions = db.query(VideoQuality).filter(VideoQuality.original_video_id == video_id).all()
+    rendition_paths = {rendition.file_path for rendition in renditions}
+    for quality in settings.supported_qualities_list:
+        for codec in [DEFAULT_CODEC] + settings.extra_codecs_list:
+            rendition_paths.add(file_handler.get_relative_path(file_handler.get_rendition_path(video_id, quality, codec)))
+            rendition_paths.add(file_handler.get_relative_path(file_handler.get_keyframe_index_path(video_id, quality, codec)))
+    files_to_delete.extend(path for path in rendition_paths if file_handler.file_exists(path))
+    
+    for rendition in renditions:
+        db.delete(rendition)
     
     for file_path in files_to_delete:
         file_handler.delete_file(file_path)
     
+    video_path_cache.invalidate(video_id)
+    keyframe_index_cache.invalidate(video_id)
+    
     # Удаляем запись из базы
     db.delete(video)
     db.commit()
@@ -253,7 +828,6 @@ async def delete_video(
 @router.post("/retry-processing/{video_id}")
 async def retry_video_processing(
     video_id: int,
-    background_tasks: BackgroundTasks,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -273,11 +847,13 @@ async def retry_video_processing(
             detail="You can only retry processing for your own videos"
         )
     
-    # Проверяем, что видео в состоянии failed
-    if video.processing_status not in ['failed', 'pending']:
+    # Проверяем, что видео в состоянии failed (или обработка прервана перезапуском сервиса)
+    interrupted = video.processing_status == 'processing' and video.id not in processing_tasks \
+        and not transcode_scheduler.is_scheduled(video.id)
+    if video.processing_status not in ['failed', 'pending'] and not interrupted:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Video processing can only be retried for failed or pending videos"
+            detail="Video processing can only be retried for failed, pending or interrupted videos"
         )
     
     # Сбрасываем статус
@@ -287,18 +863,88 @@ async def retry_video_processing(
     video.is_processed = False
     db.commit()
     
-    # Запускаем обработку заново
+    # Запускаем обработку заново (готовые версии видео будут пропущены)
     full_path = file_handler.get_full_path(video.file_path)
     processing_tasks[video.id] = True
-    background_tasks.add_task(process_uploaded_video, video.id, full_path)
+    await transcode_scheduler.submit(
+        'reprocess', video.id,
+        lambda low_priority: process_uploaded_video(video_id, full_path, low_priority=low_priority),
+        db, movie_id=video.movie_id
+    )
     
     return {"message": "Video processing restarted"}
 
 
+@router.get("/queue")
+async def get_processing_queue(
+    current_user: dict = Depends(get_current_user)
+):
+    """Состояние очереди обработки видео"""
+    return transcode_scheduler.snapshot()
+
+
 @router.get("/cleanup-temp")
 async def cleanup_temp_files(
     current_user: dict = Depends(get_current_user)
 ):
     """Очистка временных файлов (только для авторизованных пользователей)"""
     await file_handler.cleanup_temp_files()
-    return {"message": "Temporary files cleaned up"}
\ No newline at end of file
+    return {"message": "Temporary files cleaned up"}
+
+
+def _run_reconciliation(dry_run: bool, min_age_seconds: int, max_files: Optional[int], cursor: Optional[str]) -> dict:
+    """Сверка хранилища в отдельной сессии (выполняется в пуле потоков)"""
+    from ..core.database import SessionLocal
+    
+    db = SessionLocal()
+    try:
+        return storage_reconciler.reconcile(
+            db,
+            dry_run=dry_run,
+            min_age_seconds=min_age_seconds,
+            max_files=max_files,
+            start_after=cursor
+        )
+    finally:
+        db.close()
+
+
+@router.post("/storage/reconcile", response_model=StorageReconcileReport)
+async def reconcile_storage(
+    dry_run: bool = Query(True),
+    min_age_hours: int = Query(24, ge=0),
+    max_files: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Сверка хранилища с базой и удаление файлов без ссылок
+    По умолчанию только отчет; удаление возможно, если включено storage_gc_allow_delete
+    """
+    if not dry_run and not settings.storage_gc_allow_delete:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Storage garbage collection is disabled (storage_gc_allow_delete)"
+        )
+    
+    report = await asyncio.to_thread(
+        _run_reconciliation, dry_run, min_age_hours * 3600, max_files, cursor
+    )
+    return report
+
+
+@router.get("/storage/usage", response_model=list[MovieStorageUsage])
+async def get_storage_usage(
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Объем хранилища по фильмам"""
+    usage = storage_reconciler.usage_by_movie(db)
+    return [
+        MovieStorageUsage(
+            movie_id=movie_id,
+            total_bytes=entry['original_bytes'] + entry['rendition_bytes'],
+            **entry
+        )
+        for movie_id, entry in sorted(usage.items(), key=lambda item: item[0])
+    ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Tuple
 
 
 class Settings(BaseSettings):
@@ -24,7 +24,108 @@ class Settings(BaseSettings):
     supported_qualities: str = "480p,720p,1080p"
     thumbnail_width: int = 320
     thumbnail_height: int = 180
-    
+    thumbnail_format: str = "jpg"  # jpg или webp
+    thumbnail_extra_sizes: str = "640x360,1280x720"  # Дополнительные размеры (карточка, страница фильма, TV)
+
+    # Уменьшенные копии изображений по запросу (/files/img/{w}x{h}/{path})
+    image_cache_max_mb: int = 512
+    image_resize_max_dimension: int = 2048
+    image_cache_max_age_seconds: int = 300  # Кэширование клиентом (затем перепроверка по ETag)
+
+    # Подписанные URL для стриминга
+    stream_url_secret: str = ""  # Если пусто, используется jwt_secret_key
+    stream_url_ttl_seconds: int = 3600
+    require_signed_stream_urls: bool = False
+    stream_url_bind_user: bool = False  # Привязывать подпись к пользователю (в URL непрозрачный идентификатор, не email)
+    stream_path_cache_size: int = 10000
+    stream_path_cache_ttl_seconds: int = 300
+    stream_fallback_cache_ttl_seconds: int = 10  # Замена версии, которая еще создается (режим jit)
+
+    # Раскладка файлов в хранилище: flat или sharded
+    storage_layout: str = "flat"
+    storage_shard_depth: int = 2
+    storage_shard_width: int = 2
+    storage_gc_allow_delete: bool = False  # Разрешить удаление файлов через /upload/storage/reconcile (иначе только отчет)
+    upload_chunk_size: int = 1024 * 1024
+    upload_probe_bytes: int = 4 * 1024 * 1024  # Объем начала загрузки для проверки содержимого
+    upload_probe_timeout_seconds: int = 10
+    probe_cache_size: int = 1024
+
+    # События о ходе обработки (SSE): memory - в пределах процесса, postgres - через LISTEN/NOTIFY
+    progress_events_backend: str = "memory"
+    progress_events_keepalive_seconds: int = 15
+    progress_events_max_videos: int = 1000
+    progress_events_token_ttl_seconds: int = 300  # Срок действия подписанной ссылки на поток событий
+
+    # Хранилище файлов: local или s3 (S3-совместимое, например MinIO)
+    # Загрузка в s3 не потоковая: файл сначала целиком принимается на локальный диск
+    # (ключ объекта - хэш содержимого, а обработке нужна локальная копия), затем
+    # публикуется частями по s3_multipart_part_size_mb. Нужно место под самый большой файл
+    storage_backend: str = "local"
+    s3_endpoint_url: str = ""
+    s3_bucket: str = "streaming"
+    s3_prefix: str = ""
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
+    s3_region: str = "us-east-1"
+    s3_multipart_part_size_mb: int = 16
+    s3_keep_local_copies: bool = False  # Оставлять локальные копии после публикации
+    stream_redirect_to_presigned: bool = False  # Перенаправлять стриминг на presigned URL
+
+    # Индекс ключевых кадров для перемотки по времени
+    keyframe_index_enabled: bool = True
+    keyframe_index_cache_size: int = 256
+
+    # HLS на лету из MP4-версий (сегменты по ключевым кадрам, кэш на диске)
+    hls_enabled: bool = True
+    hls_segment_seconds: int = 6
+    hls_cache_max_mb: int = 2048
+
+    # Лестница качеств с учетом сложности контента (per-title encoding)
+    per_title_encoding: bool = True
+    complexity_sample_count: int = 3
+    complexity_sample_seconds: int = 4
+    complexity_probe_height: int = 360
+    complexity_probe_crf: int = 23
+    ladder_max_bitrate_gap: float = 4.0  # Максимальный разрыв битрейта между соседними ступенями
+
+    # Дополнительные кодеки (hevc, av1), кодируются после H.264 с низким приоритетом
+    extra_codecs: str = ""
+    extra_codec_min_height: int = 720
+    low_priority_niceness: int = 10
+
+    # Планировщик обработки: число одновременных кодирований (0 - по ядрам и памяти)
+    transcode_max_concurrent: int = 0
+    transcode_threads_per_job: int = 0  # Потоки ffmpeg на кодирование (0 - автоматически)
+    transcode_memory_per_job_mb: int = 1536
+    transcode_reserved_slots: int = 1  # Слоты, недоступные фоновым задачам (если зарезервированы все, они не выполняются)
+    transcode_aging_seconds: int = 600  # За это время ожидания приоритет задачи растет на 10
+
+    # Версии видео: eager - вся лестница при загрузке, jit - базовая ступень при загрузке,
+    # остальные кодируются при первом запросе и удаляются, если их долго не смотрят
+    rendition_mode: str = "eager"
+    jit_base_quality: str = ""  # Пусто - самая низкая ступень лестницы
+    rendition_eviction_days: int = 30  # 0 - не удалять
+    rendition_access_flush_seconds: int = 60
+    rendition_eviction_interval_seconds: int = 3600
+
+    # Параллельное кодирование по сегментам (0 - кодировать файл целиком)
+    segment_duration_seconds: int = 0
+    segment_parallelism: int = 2
+
+    # Спрайты превью для перемотки (trickplay) и WebVTT-индекс к ним
+    trickplay_enabled: bool = True
+    trickplay_interval_seconds: int = 10
+    trickplay_tile_width: int = 160
+    trickplay_tile_height: int = 90
+    trickplay_columns: int = 10
+    trickplay_rows: int = 10
+    trickplay_format: str = "jpg"  # jpg или webp
+
+    # Форматы анимированного превью (gif создается всегда как запасной вариант)
+    preview_formats: str = "webp,mp4"
+    preview_duration_seconds: int = 3
+
     @property
     def allowed_video_formats_list(self) -> List[str]:
         return [fmt.strip().lower() for fmt in self.allowed_video_formats.split(',')]
@@ -37,6 +138,26 @@ class Settings(BaseSettings):
     def supported_qualities_list(self) -> List[str]:
         return [q.strip() for q in self.supported_qualities.split(',')]
     
+    @property
+    def extra_codecs_list(self) -> List[str]:
+        return [codec.strip().lower() for codec in self.extra_codecs.split(',') if codec.strip()]
+    
+    @property
+    def thumbnail_sizes_list(self) -> List[Tuple[int, int]]:
+        """Размеры миниатюр: основной (thumbnail_width x thumbnail_height) и дополнительные"""
+        sizes = [(self.thumbnail_width, self.thumbnail_height)]
+        for size in self.thumbnail_extra_sizes.split(','):
+            if not size.strip():
+                continue
+            width, height = (int(value) for value in size.strip().lower().split('x'))
+            if (width, height) not in sizes:
+                sizes.append((width, height))
+        return sizes
+    
+    @property
+    def preview_formats_list(self) -> List[str]:
+        return [fmt.strip().lower() for fmt in self.preview_formats.split(',') if fmt.strip()]
+    
     @property
     def max_file_size_bytes(self) -> int:
         return self.max_file_size_mb * 1024 * 1024
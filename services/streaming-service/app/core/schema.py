@@ -0,0 +1,64 @@
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from .database import engine
+from ..models.video import StoredObject, VideoFile, VideoQuality
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory lock: схему обновляет только один процесс (несколько воркеров стартуют одновременно)
+SCHEMA_LOCK_KEY = 462002
+
+# Столбцы, добавленные в существующие таблицы (у NOT NULL столбцов есть server_default для старых строк)
+ADDED_COLUMNS = [
+    VideoFile.__table__.c.content_hash,
+    VideoQuality.__table__.c.codec,
+    VideoQuality.__table__.c.access_count,
+    VideoQuality.__table__.c.last_accessed_at,
+]
+
+# Индексы по добавленным столбцам и для постраничных списков
+ADDED_INDEXES = [
+    index for index in VideoFile.__table__.indexes
+    if index.name in ('ix_video_files_content_hash', 'ix_video_files_uploader_created')
+]
+
+# Таблицы, появившиеся после первых версий сервиса (создаются вместе с индексами)
+ADDED_TABLES = [
+    StoredObject.__table__,
+]
+
+
+def upgrade_schema():
+    """
+    Приводит существующие таблицы к моделям (идемпотентно)
+    Создает новые таблицы и добавляет столбцы и индексы, которых нет в базах, созданных раньше них.
+    Повторный запуск ничего не меняет.
+    """
+    if engine.dialect.name != 'postgresql':
+        return
+
+    with engine.begin() as connection:
+        connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        existing_tables = set(inspect(connection).get_table_names())
+
+        for table in ADDED_TABLES:
+            table.create(connection, checkfirst=True)
+
+        for column in ADDED_COLUMNS:
+            if column.table.name not in existing_tables:
+                logger.warning(f"Table {column.table.name} does not exist, column {column.name} skipped")
+                continue
+            definition = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.execute(text(f"ALTER TABLE {column.table.name} ADD COLUMN IF NOT EXISTS {definition}"))
+
+        for index in ADDED_INDEXES:
+            if index.table.name in existing_tables:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+    logger.info("Streaming schema is up to date")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    upgrade_schema()
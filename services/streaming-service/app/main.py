@@ -1,11 +1,20 @@
+import asyncio
+import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from .api.streaming import router as streaming_router
 from .api.upload import router as upload_router
+from .api.images import router as images_router
+from .utils.progress_events import progress_event_bus
+from .utils.transcode_scheduler import transcode_scheduler
+from .utils.rendition_access import rendition_access_tracker
 from .core.config import settings
+from .core.schema import upgrade_schema
 import os
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(
     title=settings.service_name,
     description="Video Streaming and Upload microservice",
@@ -23,6 +32,8 @@ app.add_middleware(
 # Подключаем роуты
 app.include_router(streaming_router)
 app.include_router(upload_router)
+# Роуты /files/img должны быть зарегистрированы до монтирования /files
+app.include_router(images_router)
 
 # Статические файлы для доступа к видео и изображениям
 if os.path.exists(settings.storage_path):
@@ -33,6 +44,26 @@ if os.path.exists(settings.storage_path):
     )
 
 
+@app.on_event("startup")
+async def startup():
+    """Обновление схемы базы и запуск фоновых компонентов"""
+    try:
+        await asyncio.to_thread(upgrade_schema)
+    except Exception as e:
+        logger.error(f"Failed to upgrade database schema: {str(e)}")
+    progress_event_bus.start()
+    transcode_scheduler.start()
+    rendition_access_tracker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Остановка фоновых компонентов"""
+    progress_event_bus.stop()
+    await transcode_scheduler.stop()
+    await rendition_access_tracker.stop()
+
+
 @app.get("/")
 async def root():
     """Корневой эндпоинт"""
@@ -43,10 +74,14 @@ async def root():
         "features": [
             "Video upload and processing",
             "Multi-quality video streaming",
+            "On-demand rendition encoding",
+            "On-the-fly HLS packaging",
             "Watch session tracking",
             "Streaming statistics",
             "Thumbnail generation",
+            "On-demand image resizing",
             "Progress tracking",
+            "Processing progress events (SSE)",
             "User watch history"
         ],
         "supported_formats": settings.allowed_video_formats_list,
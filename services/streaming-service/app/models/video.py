@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, BigInteger, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, BigInteger, JSON, Index
 from sqlalchemy.sql import func
 from ..core.database import Base
 
@@ -17,6 +17,7 @@ class VideoFile(Base):
     file_path = Column(String, nullable=False)  # Путь к файлу на диске
     file_size = Column(BigInteger, nullable=False)  # Размер в байтах
     mime_type = Column(String, nullable=False)
+    content_hash = Column(String, nullable=True, index=True)  # SHA-256 содержимого
     
     # Технические характеристики видео
     duration_seconds = Column(Float, nullable=True)  # Длительность в секундах
@@ -52,6 +53,11 @@ class VideoFile(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     processed_at = Column(DateTime(timezone=True), nullable=True)
 
+    __table_args__ = (
+        # Постраничный список загрузок пользователя (keyset по created_at, id)
+        Index('ix_video_files_uploader_created', 'uploaded_by', 'created_at', 'id'),
+    )
+
 
 class VideoQuality(Base):
     __tablename__ = "video_qualities"
@@ -63,6 +69,7 @@ class VideoQuality(Base):
     
     # Информация о качестве
     quality = Column(String, nullable=False)  # 480p, 720p, 1080p
+    codec = Column(String, nullable=False, default="h264", server_default="h264")  # h264, hevc, av1
     resolution_width = Column(Integer, nullable=False)
     resolution_height = Column(Integer, nullable=False)
     bitrate = Column(Integer, nullable=False)  # Битрейт в kbps
@@ -74,6 +81,28 @@ class VideoQuality(Base):
     # Статус
     is_ready = Column(Boolean, default=False)
     
+    # Статистика просмотров (для удаления невостребованных версий)
+    access_count = Column(Integer, default=0, server_default="0", nullable=False)
+    last_accessed_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Временные метки
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class StoredObject(Base):
+    __tablename__ = "stored_objects"
+
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # Адресация по содержимому: одинаковые загрузки хранятся в одном файле
+    content_hash = Column(String, nullable=False, unique=True, index=True)
+    file_path = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False)
+    
+    # Количество видеофайлов, ссылающихся на объект
+    ref_count = Column(Integer, default=0, nullable=False)
+    
     # Временные метки
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
\ No newline at end of file
@@ -100,14 +100,21 @@ class StreamingInfo(BaseModel):
     """Информация для стриминга"""
     video_id: int
     movie_id: int
-    stream_urls: Dict[str, str]  # quality -> url
+    stream_urls: Dict[str, str]  # quality -> url (в выбранном кодеке, если версия есть)
+    codec: str = "h264"  # Наиболее эффективный кодек, поддерживаемый клиентом
+    stream_codecs: Dict[str, str] = {}  # quality -> кодек URL из stream_urls
+    codec_urls: Dict[str, Dict[str, str]] = {}  # codec -> quality -> url
     thumbnail_url: Optional[str]
+    thumbnail_urls: Dict[str, str] = {}  # WxH -> url (миниатюры разных размеров)
     duration: Optional[float]
     current_position: float = 0.0
     available_qualities: List[str]
     recommended_quality: str
     subtitles_available: bool = False
     subtitles_urls: Dict[str, str] = {}  # language -> url
+    trickplay_url: Optional[str] = None  # WebVTT со спрайтами превью для перемотки
+    preview_url: Optional[str] = None  # Анимированное превью (формат по заголовку Accept)
+    hls_url: Optional[str] = None  # Мастер-плейлист HLS для адаптивного стриминга
 
 
 class StreamingSessionInfo(BaseModel):
@@ -145,4 +152,12 @@ class MovieStreamingStats(BaseModel):
     average_rating: Optional[float]
     popular_qualities: List[Dict[str, Any]]  # [{"quality": "1080p", "percentage": 45.2}]
     peak_concurrent_viewers: int
-    total_hours_watched: float
\ No newline at end of file
+    total_hours_watched: float
+
+class SeekInfo(BaseModel):
+    """Результат поиска ключевого кадра для перемотки"""
+    video_id: int
+    quality: str
+    requested_time: float
+    keyframe_time: float
+    byte_offset: int
@@ -26,6 +26,7 @@ class VideoFile(VideoFileBase):
     original_filename: str
     file_size: int
     mime_type: str
+    content_hash: Optional[str] = None
     duration_seconds: Optional[float]
     resolution_width: Optional[int]
     resolution_height: Optional[int]
@@ -49,8 +50,28 @@ class VideoFile(VideoFileBase):
         from_attributes = True
 
 
+class VideoFileSummary(BaseModel):
+    """Краткая информация о видеофайле для списков"""
+    id: int
+    movie_id: int
+    original_filename: str
+    file_size: int
+    quality: Optional[str]
+    is_primary: bool
+    duration_seconds: Optional[float]
+    thumbnail_path: Optional[str]
+    processing_status: str
+    processing_progress: float
+    is_available: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
 class VideoQualityBase(BaseModel):
     quality: str
+    codec: str = "h264"
     resolution_width: int
     resolution_height: int
     bitrate: int
@@ -85,6 +106,18 @@ class VideoProcessingStatus(BaseModel):
     thumbnail_url: Optional[str] = None
 
 
+class VideoStatusBatchRequest(BaseModel):
+    """Запрос статусов обработки нескольких видео"""
+    video_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+class ProgressEventsLink(BaseModel):
+    """Подписанная ссылка на поток событий обработки (для EventSource без заголовка Authorization)"""
+    events_url: str
+    video_ids: List[int]
+    expires: int
+
+
 class VideoListResponse(BaseModel):
     """Список видеофайлов"""
     videos: List[VideoFile]
@@ -103,4 +136,32 @@ class VideoMetadata(BaseModel):
     codec: Optional[str]
     audio_codec: Optional[str]
     file_format: Optional[str]
-    creation_time: Optional[str]
\ No newline at end of file
+    creation_time: Optional[str]
+
+class StorageOrphan(BaseModel):
+    """Файл хранилища без ссылок в базе"""
+    path: str
+    size: int
+
+
+class StorageReconcileReport(BaseModel):
+    """Результат сверки хранилища с базой данных"""
+    dry_run: bool
+    scanned_files: int
+    scanned_bytes: int
+    orphan_files: int
+    orphan_bytes: int
+    deleted_files: int
+    orphans: List[StorageOrphan] = []
+    usage_by_movie: Dict[int, Dict[str, int]] = {}
+    next_cursor: Optional[str] = None
+
+
+class MovieStorageUsage(BaseModel):
+    """Объем хранилища, занимаемый фильмом"""
+    movie_id: int
+    videos: int
+    renditions: int
+    original_bytes: int
+    rendition_bytes: int
+    total_bytes: int
@@ -0,0 +1,220 @@
+"""
+Миграция файлов хранилища в текущую раскладку (settings.storage_layout)
+
+Перемещает версии видео и превью, затем переносит загруженные оригиналы
+(с расчетом хэша содержимого и дедупликацией) и обновляет в базе данных file_path,
+thumbnail_path, preview_path и пути миниатюр в метаданных. Каждая запись сохраняется
+отдельной транзакцией.
+
+Запуск: python -m app.scripts.migrate_storage [--dry-run] [--batch-size 100]
+"""
+import os
+import re
+import shutil
+import hashlib
+import argparse
+import logging
+from typing import Dict, Iterator, Tuple
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.video import VideoFile, VideoQuality
+from ..utils.file_handler import file_handler
+from ..utils.storage_layout import storage_layout, partial_path
+
+logger = logging.getLogger(__name__)
+
+# Производные файлы видео: video_{id}_{suffix}
+VIDEO_ASSET_PATTERN = re.compile(r'^video_(\d+)_.+$')
+
+
+def compute_content_hash(file_path: str) -> str:
+    """Считает SHA-256 файла, читая его частями"""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(settings.upload_chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _walk_files(directory: str) -> Iterator[os.DirEntry]:
+    """Рекурсивно обходит директорию с помощью os.scandir"""
+    if not os.path.isdir(directory):
+        return
+
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+def _move_file(source_path: str, target_relative: str, dry_run: bool) -> bool:
+    """Перемещает файл на новое место в хранилище"""
+    target_path = file_handler.get_full_path(target_relative)
+    if os.path.abspath(source_path) == os.path.abspath(target_path):
+        return False
+
+    if dry_run:
+        logger.info(f"[dry-run] {source_path} -> {target_path}")
+        return True
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    os.replace(source_path, target_path)
+    logger.info(f"Moved {source_path} -> {target_path}")
+    return True
+
+
+def migrate_video_assets(dry_run: bool = False) -> int:
+    """Перемещает версии видео и превью (video_{id}_*) в соответствии с раскладкой"""
+    moved = 0
+    for category in ('videos', 'thumbnails'):
+        for entry in _walk_files(os.path.join(settings.storage_path, category)):
+            match = VIDEO_ASSET_PATTERN.match(entry.name)
+            if not match:
+                continue
+
+            target_relative = storage_layout.video_asset_path(category, int(match.group(1)), entry.name)
+            if _move_file(entry.path, target_relative, dry_run):
+                moved += 1
+    return moved
+
+
+def _copy_file(source_path: str, target_path: str):
+    """Копирует файл атомарно (через временный файл); существующий файл назначения считается идентичным"""
+    if os.path.exists(target_path):
+        logger.info(f"Deduplicated {source_path} (same as {target_path})")
+        return
+
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = partial_path(target_path)
+    shutil.copyfile(source_path, temp_path)
+    os.replace(temp_path, target_path)
+    logger.info(f"Copied {source_path} -> {target_path}")
+
+
+def migrate_video_record(db, video: VideoFile, dry_run: bool = False) -> Tuple[bool, int]:
+    """
+    Переносит оригинал видео и обновляет пути в записи VideoFile и ее версиях
+    Оригинал сначала копируется, затем запись сохраняется в базе, и только после этого
+    удаляется старый файл: при сбое на любом шаге запись указывает на существующий файл,
+    а повторный запуск продолжает перенос.
+    Возвращает: (перенесен ли оригинал, число обновленных версий)
+    """
+    old_source_path = None
+
+    source_path = video.file_path if os.path.isabs(video.file_path) else file_handler.get_full_path(video.file_path)
+    if os.path.exists(source_path):
+        content_hash = video.content_hash or compute_content_hash(source_path)
+        target_relative = storage_layout.object_path(content_hash)
+        target_path = file_handler.get_full_path(target_relative)
+
+        if os.path.abspath(source_path) != os.path.abspath(target_path):
+            if dry_run:
+                logger.info(f"[dry-run] {source_path} -> {target_path}")
+            else:
+                _copy_file(source_path, target_path)
+            old_source_path = source_path
+
+        if not dry_run:
+            if video.content_hash is None:
+                file_handler.acquire_object(db, content_hash, target_relative, os.path.getsize(target_path))
+                video.content_hash = content_hash
+            video.file_path = target_relative
+            video.filename = os.path.basename(target_relative)
+    else:
+        logger.warning(f"Original file for video {video.id} not found: {source_path}")
+
+    # Файлы уже перемещены в migrate_video_assets, обновляем только пути
+    renditions_updated = 0
+    renditions = db.query(VideoQuality).filter(VideoQuality.original_video_id == video.id).all()
+    for rendition in renditions:
+        target_relative = storage_layout.video_asset_path(
+            'videos', video.id, os.path.basename(rendition.file_path)
+        )
+        if rendition.file_path != target_relative:
+            if not dry_run:
+                rendition.file_path = target_relative
+            renditions_updated += 1
+
+    if dry_run:
+        return old_source_path is not None, renditions_updated
+
+    if video.thumbnail_path:
+        video.thumbnail_path = storage_layout.thumbnail_path(video.id, os.path.basename(video.thumbnail_path))
+    if video.preview_path:
+        video.preview_path = storage_layout.thumbnail_path(video.id, os.path.basename(video.preview_path))
+    # Миниатюры остальных размеров перемещены в migrate_video_assets вместе с основной
+    thumbnails = (video.video_metadata or {}).get('thumbnails')
+    if thumbnails:
+        video.video_metadata = {
+            **video.video_metadata,
+            'thumbnails': {
+                size: storage_layout.thumbnail_path(video.id, os.path.basename(path))
+                for size, path in thumbnails.items()
+            }
+        }
+
+    # Новые пути сохраняются до удаления старого файла
+    db.commit()
+
+    if old_source_path is not None:
+        os.remove(old_source_path)
+        logger.info(f"Removed {old_source_path}")
+
+    return old_source_path is not None, renditions_updated
+
+
+def migrate_storage(dry_run: bool = False, batch_size: int = 100) -> Dict[str, int]:
+    """Переносит хранилище в текущую раскладку (каждая запись сохраняется отдельно)"""
+    stats = {'assets_moved': 0, 'videos_processed': 0, 'originals_moved': 0, 'renditions_updated': 0}
+
+    stats['assets_moved'] = migrate_video_assets(dry_run)
+
+    db = SessionLocal()
+    try:
+        last_id = 0
+        while True:
+            # Обрабатываем записи пачками по возрастанию id
+            videos = db.query(VideoFile).filter(
+                VideoFile.id > last_id
+            ).order_by(VideoFile.id).limit(batch_size).all()
+
+            if not videos:
+                break
+
+            for video in videos:
+                original_moved, renditions_updated = migrate_video_record(db, video, dry_run)
+                if original_moved:
+                    stats['originals_moved'] += 1
+                stats['renditions_updated'] += renditions_updated
+                stats['videos_processed'] += 1
+
+            last_id = videos[-1].id
+            if dry_run:
+                db.rollback()
+    finally:
+        db.close()
+
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate storage files to the configured layout")
+    parser.add_argument('--dry-run', action='store_true', help="Only report planned moves")
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    logger.info(f"Migrating storage to '{storage_layout.name}' layout")
+
+    stats = migrate_storage(dry_run=args.dry_run, batch_size=args.batch_size)
+    logger.info(f"Migration finished: {stats}")
+
+
+if __name__ == "__main__":
+    main()
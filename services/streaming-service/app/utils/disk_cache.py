@@ -0,0 +1,122 @@
+import os
+import time
+import asyncio
+import tempfile
+import threading
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Tuple
+from .storage_layout import is_partial_path, PARTIAL_MARKER
+
+logger = logging.getLogger(__name__)
+
+# Файлы, выданные за это время, не вытесняются: их еще может отдавать FileResponse
+EVICTION_GRACE_SECONDS = 60
+
+
+class DiskLRUCache:
+    """
+    Дисковый кэш производных файлов с вытеснением по LRU
+    Файл создается при первом запросе; одновременные запросы одного файла ждут
+    единственного создания. Когда общий объем превышает max_bytes, удаляются
+    давно не использованные файлы (кроме только что выданных).
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # имя файла -> размер
+        self._handed_out: Dict[str, float] = {}  # имя файла -> время последней выдачи
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._pending: Dict[str, asyncio.Lock] = {}
+        self._loaded = False
+
+    def _load(self):
+        """Восстанавливает индекс кэша с диска (от давно использованных к недавним)"""
+        with self._lock:
+            if self._loaded:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            entries = []
+            with os.scandir(self.cache_dir) as iterator:
+                for entry in iterator:
+                    if entry.is_file() and not is_partial_path(entry.name):
+                        stat = entry.stat()
+                        entries.append((stat.st_atime, entry.name, stat.st_size))
+            for _, name, size in sorted(entries):
+                self._entries[name] = size
+                self._total_bytes += size
+            self._loaded = True
+
+    def _touch(self, name: str) -> bool:
+        with self._lock:
+            if name not in self._entries:
+                return False
+            self._entries.move_to_end(name)
+            self._handed_out[name] = time.monotonic()
+            return True
+
+    def _add(self, name: str, size: int):
+        """Добавляет файл в индекс и вытесняет самые старые при превышении объема"""
+        evicted = []
+        with self._lock:
+            now = time.monotonic()
+            self._total_bytes += size - self._entries.pop(name, 0)
+            self._entries[name] = size
+            self._handed_out[name] = now
+            for old_name in list(self._entries):
+                if self._total_bytes <= self.max_bytes:
+                    break
+                if now - self._handed_out.get(old_name, 0.0) < EVICTION_GRACE_SECONDS:
+                    continue
+                self._total_bytes -= self._entries.pop(old_name)
+                self._handed_out.pop(old_name, None)
+                evicted.append(old_name)
+
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.cache_dir, old_name))
+            except FileNotFoundError:
+                pass
+
+    async def get_or_create(self, name: str, create: Callable[[str], Awaitable[None]]) -> Tuple[str, int]:
+        """
+        Возвращает путь к файлу кэша и его размер
+        create(temp_path) вызывается, если файла еще нет, и записывает файл по временному пути
+        (у каждой попытки свой); готовый файл переименовывается в файл кэша
+        """
+        if not self._loaded:
+            await asyncio.to_thread(self._load)
+
+        target_path = os.path.join(self.cache_dir, name)
+        if self._touch(name) and os.path.exists(target_path):
+            return target_path, self._entries.get(name, 0)
+
+        lock = self._pending.setdefault(name, asyncio.Lock())
+        try:
+            async with lock:
+                if not os.path.exists(target_path):
+                    await self._create(name, target_path, create)
+                size = os.path.getsize(target_path)
+                self._add(name, size)
+        finally:
+            if self._pending.get(name) is lock:
+                del self._pending[name]
+
+        logger.debug(f"Cached {name} in {self.cache_dir}")
+        return target_path, size
+
+    async def _create(self, name: str, target_path: str, create: Callable[[str], Awaitable[None]]):
+        """Создает файл кэша через уникальный временный файл (расширение сохраняется для FFmpeg)"""
+        root, extension = os.path.splitext(name)
+        fd, temp_path = tempfile.mkstemp(
+            dir=self.cache_dir, prefix=f"{root}.", suffix=f"{PARTIAL_MARKER}{extension}"
+        )
+        os.close(fd)
+        try:
+            await create(temp_path)
+            os.replace(temp_path, target_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -1,9 +1,18 @@
 import os
 import uuid
+import shutil
+import hashlib
+import asyncio
 import aiofiles
-from typing import Optional, BinaryIO
+from typing import Optional, BinaryIO, Callable, Awaitable
 from fastapi import UploadFile, HTTPException, status
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from ..core.config import settings
+from ..models.video import StoredObject
+from .storage_layout import storage_layout, rendition_name, DEFAULT_CODEC
+from .storage_backend import get_storage_backend
+from .media_probe import validate_video_upload, SNIFF_BYTES
 import logging
 
 logger = logging.getLogger(__name__)
@@ -17,6 +26,7 @@ class FileHandler:
         self.max_file_size = settings.max_file_size_bytes
         self.allowed_video_formats = settings.allowed_video_formats_list
         self.allowed_image_formats = settings.allowed_image_formats_list
+        self.backend = get_storage_backend(settings.storage_backend, self.storage_path)
         
         # Создаем необходимые директории
         self._ensure_directories()
@@ -98,38 +108,72 @@ class FileHandler:
         else:
             return f"{unique_id}.{file_extension}"
     
-    async def save_upload_file(self, file: UploadFile, subdirectory: str = "uploads") -> tuple[str, str]:
+    async def save_upload_file(
+        self,
+        file: UploadFile,
+        head_validator: Optional[Callable[[str, bytes, bool], Awaitable[bool]]] = None
+    ) -> tuple[str, dict]:
         """
-        Сохраняет загруженный файл
-        Возвращает: (full_path, relative_path)
+        Сохраняет загруженный файл во временную директорию
+        Файл читается частями, SHA-256 считается во время записи.
+        head_validator(temp_path, head, complete) проверяет первые upload_probe_bytes файла
+        до окончания загрузки; если проверка по части файла невозможна (вернул False),
+        она повторяется по всему файлу.
+        В хранилище файл помещает store_object.
+        Возвращает: (temp_path, {'content_hash', 'file_size'})
         """
-        # Генерируем уникальное имя файла
-        unique_filename = self.generate_unique_filename(file.filename)
+        temp_path = os.path.join(
+            self.storage_path, 'temp', self.generate_unique_filename(file.filename, prefix="upload")
+        )
         
-        # Создаем полный путь
-        save_directory = os.path.join(self.storage_path, subdirectory)
-        os.makedirs(save_directory, exist_ok=True)
-        
-        full_path = os.path.join(save_directory, unique_filename)
-        relative_path = os.path.join(subdirectory, unique_filename)
+        hasher = hashlib.sha256()
+        file_size = 0
+        head = b''
+        head_checked = head_validator is None
         
         try:
-            # Сохраняем файл
-            async with aiofiles.open(full_path, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
+            # Сохраняем файл частями, не загружая его целиком в память
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while True:
+                    chunk = await file.read(settings.upload_chunk_size)
+                    if not chunk:
+                        break
+                    
+                    file_size += len(chunk)
+                    if file_size > self.max_file_size:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"File size exceeds maximum allowed size of {settings.max_file_size_mb}MB"
+                        )
+                    
+                    if len(head) < SNIFF_BYTES:
+                        head += chunk[:SNIFF_BYTES - len(head)]
+                    
+                    hasher.update(chunk)
+                    await f.write(chunk)
+                    
+                    # Проверяем начало файла, не дожидаясь окончания загрузки
+                    if not head_checked and file_size >= settings.upload_probe_bytes:
+                        await f.flush()
+                        head_checked = await head_validator(temp_path, head, False)
             
-            # Получаем размер файла
-            file_size = os.path.getsize(full_path)
+            if not head_checked:
+                await head_validator(temp_path, head, True)
             
-            logger.info(f"File saved: {full_path} ({file_size} bytes)")
+            return temp_path, {
+                'content_hash': hasher.hexdigest(),
+                'file_size': file_size
+            }
             
-            return full_path, relative_path
+        except HTTPException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
             
         except Exception as e:
             # Удаляем файл если произошла ошибка
-            if os.path.exists(full_path):
-                os.remove(full_path)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
             
             logger.error(f"Error saving file {file.filename}: {str(e)}")
             raise HTTPException(
@@ -137,42 +181,138 @@ class FileHandler:
                 detail="Error saving file"
             )
     
-    async def save_video_file(self, file: UploadFile) -> tuple[str, str, dict]:
+    async def save_video_file(self, file: UploadFile) -> tuple[str, dict]:
         """
-        Сохраняет видеофайл с валидацией
-        Возвращает: (full_path, relative_path, file_info)
+        Сохраняет видеофайл с валидацией во временную директорию
+        Возвращает: (temp_path, file_info)
         """
         # Валидируем файл
         self.validate_video_file(file)
+        extension = file.filename.split('.')[-1].lower()
+        
+        # Проверяем содержимое по мере загрузки: сигнатура контейнера и ffprobe по началу файла
+        probe = {}
         
-        # Сохраняем в папку uploads
-        full_path, relative_path = await self.save_upload_file(file, "uploads")
+        async def check_head(temp_path: str, head: bytes, complete: bool) -> bool:
+            video_info = await validate_video_upload(temp_path, head, extension, complete)
+            if video_info is None:
+                return False
+            probe['video_info'] = video_info
+            return True
+        
+        temp_path, stored_info = await self.save_upload_file(file, head_validator=check_head)
         
         # Собираем информацию о файле
         file_info = {
             'original_filename': file.filename,
-            'filename': os.path.basename(full_path),
-            'file_size': os.path.getsize(full_path),
+            'file_size': stored_info['file_size'],
             'mime_type': file.content_type or 'video/mp4',
-            'file_path': relative_path
+            'content_hash': stored_info['content_hash'],
+            'video_info': probe.get('video_info')
         }
         
-        return full_path, relative_path, file_info
+        return temp_path, file_info
+    
+    def store_object(self, db: Session, temp_path: str, content_hash: str, file_size: int) -> tuple[str, str]:
+        """
+        Помещает загруженный файл в хранилище по хэшу содержимого и учитывает ссылку на него
+        Запись объекта блокируется (SELECT ... FOR UPDATE) до коммита вызывающего, поэтому
+        параллельный release_object не удалит файл между проверкой и увеличением счетчика.
+        Если файла объекта уже нет, он восстанавливается из загрузки.
+        Временный файл удаляется. Возвращает: (full_path, relative_path)
+        """
+        try:
+            stored_object = db.query(StoredObject).filter(
+                StoredObject.content_hash == content_hash
+            ).with_for_update().first()
+            
+            deduplicated = stored_object is not None and self.backend.exists(stored_object.file_path)
+            relative_path = stored_object.file_path if deduplicated else storage_layout.object_path(content_hash)
+            full_path = self.get_full_path(relative_path)
+            
+            # Локальная копия нужна для обработки видео
+            if not os.path.exists(full_path):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(temp_path, full_path)
+            
+            if deduplicated:
+                stored_object.ref_count += 1
+                logger.info(f"Duplicate upload of {content_hash}, reusing {relative_path}")
+                return full_path, relative_path
+            
+            self.backend.publish(relative_path)
+            logger.info(f"File saved: {relative_path} ({file_size} bytes)")
+            
+            if stored_object is not None:
+                # Файл объекта пропал: запись указывает на восстановленный файл
+                stored_object.file_path = relative_path
+                stored_object.file_size = file_size
+                stored_object.ref_count += 1
+            else:
+                self.acquire_object(db, content_hash, relative_path, file_size)
+            return full_path, relative_path
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def acquire_object(self, db: Session, content_hash: str, relative_path: str, file_size: int) -> StoredObject:
+        """Увеличивает счетчик ссылок на сохраненный объект (создает запись при необходимости)"""
+        stored_object = db.query(StoredObject).filter(
+            StoredObject.content_hash == content_hash
+        ).with_for_update().first()
+        
+        if stored_object:
+            stored_object.ref_count += 1
+            return stored_object
+        
+        try:
+            with db.begin_nested():
+                stored_object = StoredObject(
+                    content_hash=content_hash,
+                    file_path=relative_path,
+                    file_size=file_size,
+                    ref_count=1
+                )
+                db.add(stored_object)
+        except IntegrityError:
+            # Объект успели создать параллельно
+            stored_object = db.query(StoredObject).filter(
+                StoredObject.content_hash == content_hash
+            ).with_for_update().first()
+            stored_object.ref_count += 1
+        
+        return stored_object
+    
+    def release_object(self, db: Session, content_hash: str) -> bool:
+        """
+        Уменьшает счетчик ссылок на объект и удаляет файл, если ссылок не осталось
+        Возвращает True, если файл был удален
+        """
+        stored_object = db.query(StoredObject).filter(
+            StoredObject.content_hash == content_hash
+        ).with_for_update().first()
+        
+        if not stored_object:
+            return False
+        
+        stored_object.ref_count -= 1
+        if stored_object.ref_count > 0:
+            return False
+        
+        self.delete_file(stored_object.file_path)
+        db.delete(stored_object)
+        return True
     
     def delete_file(self, file_path: str) -> bool:
         """Удаляет файл"""
         try:
-            if os.path.isabs(file_path):
-                full_path = file_path
-            else:
-                full_path = os.path.join(self.storage_path, file_path)
+            relative_path = self.get_relative_path(file_path)
             
-            if os.path.exists(full_path):
-                os.remove(full_path)
-                logger.info(f"File deleted: {full_path}")
+            if self.backend.delete(relative_path):
+                logger.info(f"File deleted: {relative_path}")
                 return True
             else:
-                logger.warning(f"File not found for deletion: {full_path}")
+                logger.warning(f"File not found for deletion: {relative_path}")
                 return False
                 
         except Exception as e:
@@ -185,7 +325,10 @@ class FileHandler:
             return ""
         
         # Убираем начальный слэш если есть
-        clean_path = file_path.lstrip('/')
+        clean_path = self.get_relative_path(file_path).lstrip('/')
+        
+        if self.backend.is_remote:
+            return self.backend.presigned_url(clean_path, settings.stream_url_ttl_seconds)
         
         if base_url:
             return f"{base_url.rstrip('/')}/files/{clean_path}"
@@ -196,30 +339,60 @@ class FileHandler:
         """Преобразует относительный путь в полный"""
         return os.path.join(self.storage_path, relative_path.lstrip('/'))
     
+    def get_relative_path(self, full_path: str) -> str:
+        """Преобразует полный путь в относительный (от корня хранилища)"""
+        if not os.path.isabs(full_path):
+            return full_path
+        return os.path.relpath(full_path, self.storage_path)
+    
+    def get_rendition_path(self, video_id: int, quality: str, codec: str = DEFAULT_CODEC) -> str:
+        """Полный путь к версии видео указанного качества и кодека"""
+        return self.get_full_path(storage_layout.rendition_path(video_id, quality, codec))
+    
+    def get_keyframe_index_path(self, video_id: int, quality: str, codec: str = DEFAULT_CODEC) -> str:
+        """Полный путь к индексу ключевых кадров версии видео"""
+        return self.get_full_path(storage_layout.video_asset_path(
+            'videos', video_id, f"video_{video_id}_{rendition_name(quality, codec)}.kfi"
+        ))
+    
+    def get_thumbnail_path(self, video_id: int, filename: str) -> str:
+        """Полный путь к миниатюре или превью видео"""
+        return self.get_full_path(storage_layout.thumbnail_path(video_id, filename))
+    
     def file_exists(self, file_path: str) -> bool:
         """Проверяет существование файла"""
-        if os.path.isabs(file_path):
-            return os.path.exists(file_path)
-        else:
-            full_path = os.path.join(self.storage_path, file_path)
-            return os.path.exists(full_path)
+        return self.backend.exists(self.get_relative_path(file_path))
     
     def get_file_size(self, file_path: str) -> int:
         """Возвращает размер файла в байтах"""
         try:
-            if os.path.isabs(file_path):
-                full_path = file_path
-            else:
-                full_path = os.path.join(self.storage_path, file_path)
+            relative_path = self.get_relative_path(file_path)
             
-            if os.path.exists(full_path):
-                return os.path.getsize(full_path)
+            if self.backend.exists(relative_path):
+                return self.backend.size(relative_path)
             else:
                 return 0
                 
         except Exception:
             return 0
     
+    def fetch_file(self, file_path: str) -> str:
+        """Возвращает путь к локальной копии файла (скачивает из хранилища при необходимости)"""
+        return self.backend.fetch(self.get_relative_path(file_path))
+    
+    def publish_file(self, file_path: str):
+        """Публикует локальный файл в хранилище"""
+        relative_path = self.get_relative_path(file_path)
+        self.backend.publish(relative_path)
+        
+        if self.backend.is_remote and not settings.s3_keep_local_copies:
+            self.backend.evict_local(relative_path)
+    
+    def release_local_copy(self, file_path: str):
+        """Удаляет локальную копию файла, если он хранится в удаленном хранилище"""
+        if self.backend.is_remote and not settings.s3_keep_local_copies:
+            self.backend.evict_local(self.get_relative_path(file_path))
+    
     async def cleanup_temp_files(self, max_age_hours: int = 24):
         """Очищает временные файлы старше указанного времени"""
         import time
@@ -239,6 +412,15 @@ class FileHandler:
                     if file_age > max_age_seconds:
                         os.remove(file_path)
                         logger.info(f"Deleted old temp file: {filename}")
+            
+            # Сегменты прерванных кодирований (сохраняются для возобновления)
+            segments_dir = os.path.join(temp_dir, 'segments')
+            if os.path.isdir(segments_dir):
+                for dirname in os.listdir(segments_dir):
+                    dir_path = os.path.join(segments_dir, dirname)
+                    if os.path.isdir(dir_path) and current_time - os.path.getmtime(dir_path) > max_age_seconds:
+                        shutil.rmtree(dir_path, ignore_errors=True)
+                        logger.info(f"Deleted stale segments: {dirname}")
                         
         except Exception as e:
             logger.error(f"Error cleaning up temp files: {str(e)}")
@@ -0,0 +1,96 @@
+import os
+import math
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from ..core.config import settings
+from .disk_cache import DiskLRUCache
+from .file_handler import file_handler
+from .keyframe_index import KeyframeIndex
+from .video_processor import video_processor
+
+# Подпись URL, общая для всех плейлистов и сегментов HLS одного видео
+HLS_RENDITION = "hls"
+
+
+def plan_segments(index: KeyframeIndex, target_seconds: float) -> List[Tuple[float, Optional[float]]]:
+    """
+    Разбивает версию видео на сегменты по ключевым кадрам
+    Каждый сегмент начинается с ключевого кадра и длится не меньше target_seconds
+    (кроме последнего). Возвращает пары (начало, конец); конец последнего - None.
+    """
+    boundaries = []
+    for time_value in index.times:
+        if not boundaries or time_value - boundaries[-1] >= target_seconds:
+            boundaries.append(time_value)
+
+    return [
+        (start, boundaries[number + 1] if number + 1 < len(boundaries) else None)
+        for number, start in enumerate(boundaries)
+    ]
+
+
+def build_media_playlist(segments: List[Tuple[float, Optional[float]]], duration: float, query: str = "") -> str:
+    """Плейлист версии видео (VOD) со ссылками на сегменты segment_N.ts"""
+    durations = [(end if end is not None else max(duration, start)) - start for start, end in segments]
+    target_duration = max([math.ceil(value) for value in durations] + [1])
+
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target_duration}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for number, segment_duration in enumerate(durations):
+        lines.append(f"#EXTINF:{segment_duration:.3f},")
+        lines.append(f"segment_{number}.ts{query}")
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def build_master_playlist(variants: List[Dict[str, Any]], query: str = "") -> str:
+    """Мастер-плейлист: версии видео (quality, bitrate в kbps, width, height) по возрастанию битрейта"""
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for variant in sorted(variants, key=lambda variant: variant['bitrate']):
+        lines.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={variant['bitrate'] * 1000},"
+            f"RESOLUTION={variant['width']}x{variant['height']}"
+        )
+        lines.append(f"{variant['quality']}/index.m3u8{query}")
+    return "\n".join(lines) + "\n"
+
+
+class HlsSegmentCache(DiskLRUCache):
+    """
+    Дисковый кэш сегментов HLS
+    Сегменты вырезаются из MP4-версий без перекодирования при первом запросе,
+    поэтому отдельная копия каждой версии в виде сегментов не хранится
+    """
+
+    async def get_segment(self, video_id: int, quality: str, number: int, source_path: str,
+                          start: float, end: Optional[float]) -> Tuple[str, int]:
+        """Возвращает путь к сегменту и его размер (создает при необходимости)"""
+        source_size = await asyncio.to_thread(file_handler.backend.size, source_path)
+        # Размер исходника в имени: после пересоздания версии старые сегменты не используются
+        name = f"video_{video_id}_{quality}_{source_size}_{number}.ts"
+
+        async def create(temp_path: str):
+            backend = file_handler.backend
+            # Из удаленного хранилища FFmpeg читает только нужный диапазон по presigned URL
+            if backend.is_remote:
+                input_path = backend.presigned_url(source_path, settings.stream_url_ttl_seconds)
+            else:
+                input_path = backend.local_path(source_path)
+
+            duration = end - start if end is not None else None
+            if not await video_processor.package_segment(input_path, temp_path, start, duration):
+                raise RuntimeError(f"Failed to package segment {number} of video {video_id} {quality}")
+
+        return await self.get_or_create(name, create)
+
+
+# Глобальный экземпляр
+hls_segment_cache = HlsSegmentCache(
+    os.path.join(settings.storage_path, 'cache', 'hls'),
+    settings.hls_cache_max_mb * 1024 * 1024
+)
@@ -0,0 +1,108 @@
+import secrets
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Не больше стольких диапазонов в одном запросе (защита от запросов с тысячами мелких диапазонов)
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    """Ни один из запрошенных диапазонов не попадает в файл (ответ 416)"""
+
+
+def parse_range_header(header: str, file_size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Разбирает заголовок Range (RFC 7233): bytes=0-99, bytes=100-, bytes=-500 и их списки
+    Возвращает отсортированные диапазоны (start, end) включительно, где пересекающиеся
+    и соседние объединены; None, если заголовок некорректен и его нужно игнорировать.
+    RangeNotSatisfiable - если ни один диапазон не попадает в файл.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec.strip():
+        return None
+
+    parts = [part.strip() for part in spec.split(',') if part.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        first, dash, last = part.partition('-')
+        if not dash:
+            return None
+        first, last = first.strip(), last.strip()
+        if any(value and not (value.isascii() and value.isdigit()) for value in (first, last)):
+            return None
+
+        if not first:
+            # Суффиксный диапазон: последние N байт
+            if not last:
+                return None
+            suffix_length = int(last)
+            if suffix_length == 0:
+                continue
+            start, end = max(0, file_size - suffix_length), file_size - 1
+        else:
+            start = int(first)
+            if last and int(last) < start:
+                return None
+            if start >= file_size:
+                continue
+            end = min(int(last), file_size - 1) if last else file_size - 1
+
+        if file_size > 0:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    return coalesce_ranges(ranges)
+
+
+def coalesce_ranges(ranges: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Объединяет пересекающиеся и соседние диапазоны"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class MultipartByteranges:
+    """Тело ответа multipart/byteranges для нескольких диапазонов"""
+
+    def __init__(self, ranges: List[Tuple[int, int]], file_size: int, content_type: str):
+        self.ranges = ranges
+        self.file_size = file_size
+        self.content_type = content_type
+        self.boundary = secrets.token_hex(16)
+
+    @property
+    def media_type(self) -> str:
+        return f"multipart/byteranges; boundary={self.boundary}"
+
+    def _part_header(self, start: int, end: int) -> bytes:
+        return (
+            f"--{self.boundary}\r\n"
+            f"Content-Type: {self.content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{self.file_size}\r\n\r\n"
+        ).encode('ascii')
+
+    def _closing(self) -> bytes:
+        return f"--{self.boundary}--\r\n".encode('ascii')
+
+    @property
+    def content_length(self) -> int:
+        length = len(self._closing())
+        for start, end in self.ranges:
+            # Заголовок части, данные и перевод строки после них
+            length += len(self._part_header(start, end)) + (end - start + 1) + 2
+        return length
+
+    def iter_body(self, iter_range: Callable[[int, int], Iterable[bytes]]) -> Iterator[bytes]:
+        """Отдает части по очереди; данные каждой части читает iter_range(start, end)"""
+        for start, end in self.ranges:
+            yield self._part_header(start, end)
+            yield from iter_range(start, end)
+            yield b"\r\n"
+        yield self._closing()
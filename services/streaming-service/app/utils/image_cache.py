@@ -0,0 +1,71 @@
+import os
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Tuple
+from PIL import Image # type: ignore
+from ..core.config import settings
+from .file_handler import file_handler
+from .disk_cache import DiskLRUCache
+
+logger = logging.getLogger(__name__)
+
+# Формат сохранения уменьшенных изображений по расширению исходного файла
+IMAGE_SAVE_OPTIONS = {
+    'jpg': {'format': 'JPEG', 'quality': 85, 'optimize': True},
+    'jpeg': {'format': 'JPEG', 'quality': 85, 'optimize': True},
+    'webp': {'format': 'WEBP', 'quality': 80},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+
+
+class ImageVariantCache(DiskLRUCache):
+    """
+    Дисковый кэш уменьшенных копий изображений
+    Варианты создаются при первом запросе (в пуле потоков) и вытесняются по LRU,
+    когда общий объем кэша превышает image_cache_max_mb
+    """
+
+    def _variant_name(self, source_path: str, source_size: int, width: int, height: int) -> str:
+        """Имя файла варианта: зависит от пути, размера исходника и целевых размеров"""
+        extension = os.path.splitext(source_path)[1].lower()
+        key = hashlib.sha1(f"{source_path}:{source_size}".encode('utf-8')).hexdigest()
+        return f"{key}_{width}x{height}{extension}"
+
+    def _resize(self, source_path: str, target_path: str, width: int, height: int):
+        """Уменьшает изображение с сохранением пропорций (не увеличивает)"""
+        local_path = file_handler.fetch_file(source_path)
+        extension = os.path.splitext(source_path)[1].lower().lstrip('.')
+        try:
+            with Image.open(local_path) as img:
+                img.thumbnail((width, height), Image.Resampling.LANCZOS)
+                save_options = IMAGE_SAVE_OPTIONS[extension]
+                if save_options['format'] == 'JPEG' and img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                img.save(target_path, **save_options)
+        finally:
+            file_handler.release_local_copy(source_path)
+
+    async def get_variant(self, source_path: str, width: int, height: int) -> Optional[Tuple[str, int]]:
+        """
+        Возвращает путь к уменьшенной копии изображения и ее размер (создает при необходимости)
+        None, если исходного файла нет
+        """
+        backend = file_handler.backend
+        if not await asyncio.to_thread(backend.exists, source_path):
+            return None
+        source_size = await asyncio.to_thread(backend.size, source_path)
+
+        name = self._variant_name(source_path, source_size, width, height)
+
+        async def create(temp_path: str):
+            await asyncio.to_thread(self._resize, source_path, temp_path, width, height)
+
+        return await self.get_or_create(name, create)
+
+
+# Глобальный экземпляр
+image_variant_cache = ImageVariantCache(
+    os.path.join(settings.storage_path, 'cache', 'img'),
+    settings.image_cache_max_mb * 1024 * 1024
+)
@@ -0,0 +1,98 @@
+import sys
+import struct
+import bisect
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Optional, Tuple, Iterable
+from ..core.config import settings
+
+# Формат файла: b'KFI1' + uint32 количество + float64[] времена + int64[] смещения (little-endian)
+KEYFRAME_INDEX_MAGIC = b'KFI1'
+_HEADER = struct.Struct('<4sI')
+
+
+class KeyframeIndex:
+    """Индекс ключевых кадров: время (секунды) -> смещение в файле (байты)"""
+
+    def __init__(self, times: array, offsets: array):
+        self.times = times
+        self.offsets = offsets
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple[float, int]]) -> "KeyframeIndex":
+        """Создает индекс из пар (время, смещение), сортируя по времени"""
+        times = array('d')
+        offsets = array('q')
+        for time_value, offset in sorted(pairs):
+            times.append(time_value)
+            offsets.append(offset)
+        return cls(times, offsets)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def to_bytes(self) -> bytes:
+        times = array('d', self.times)
+        offsets = array('q', self.offsets)
+        if sys.byteorder != 'little':
+            times.byteswap()
+            offsets.byteswap()
+        return _HEADER.pack(KEYFRAME_INDEX_MAGIC, len(times)) + times.tobytes() + offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "KeyframeIndex":
+        magic, count = _HEADER.unpack_from(data)
+        if magic != KEYFRAME_INDEX_MAGIC:
+            raise ValueError("Invalid keyframe index")
+
+        times = array('d')
+        offsets = array('q')
+        times_start = _HEADER.size
+        offsets_start = times_start + count * times.itemsize
+        times.frombytes(data[times_start:offsets_start])
+        offsets.frombytes(data[offsets_start:offsets_start + count * offsets.itemsize])
+        if sys.byteorder != 'little':
+            times.byteswap()
+            offsets.byteswap()
+        return cls(times, offsets)
+
+    def lookup(self, timestamp: float) -> Optional[Tuple[float, int]]:
+        """Ближайший ключевой кадр не позже timestamp: (время, смещение)"""
+        if not self.times:
+            return None
+        position = bisect.bisect_right(self.times, timestamp) - 1
+        position = max(0, position)
+        return self.times[position], self.offsets[position]
+
+
+class KeyframeIndexCache:
+    """LRU-кэш загруженных индексов ключевых кадров"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, str], KeyframeIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, video_id: int, rendition: str) -> Optional[KeyframeIndex]:
+        with self._lock:
+            index = self._entries.get((video_id, rendition))
+            if index is not None:
+                self._entries.move_to_end((video_id, rendition))
+            return index
+
+    def set(self, video_id: int, rendition: str, index: KeyframeIndex):
+        with self._lock:
+            self._entries[(video_id, rendition)] = index
+            self._entries.move_to_end((video_id, rendition))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, video_id: int):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == video_id]:
+                del self._entries[key]
+
+
+# Глобальный экземпляр
+keyframe_index_cache = KeyframeIndexCache(settings.keyframe_index_cache_size)
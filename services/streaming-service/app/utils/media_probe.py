@@ -0,0 +1,177 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from fastapi import HTTPException, status
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Контейнеры, допустимые для расширения файла
+EXTENSION_CONTAINERS = {
+    'mp4': {'mp4', 'mov'},
+    'mov': {'mov', 'mp4'},
+    'mkv': {'matroska', 'webm'},
+    'webm': {'webm', 'matroska'},
+    'avi': {'avi'},
+    'wmv': {'asf'},
+    'flv': {'flv'},
+}
+
+# Размер заголовка, по которому определяется контейнер
+SNIFF_BYTES = 4096
+
+# Поля информации о видео (сохраняются в video_metadata вместе с probe_key)
+VIDEO_INFO_FIELDS = (
+    'duration', 'width', 'height', 'bitrate', 'fps', 'codec', 'audio_codec',
+    'file_format', 'file_size', 'creation_time', 'probe_key'
+)
+
+
+def sniff_container(head: bytes) -> Optional[str]:
+    """Определяет контейнер видео по сигнатуре в начале файла"""
+    if len(head) >= 12 and head[4:8] == b'ftyp':
+        return 'mov' if head[8:12] == b'qt  ' else 'mp4'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        # EBML: DocType отличает WebM от Matroska
+        return 'webm' if b'webm' in head[:64] else 'matroska'
+    if len(head) >= 12 and head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'avi'
+    if head.startswith(b'\x30\x26\xb2\x75\x8e\x66\xcf\x11'):
+        return 'asf'
+    if head.startswith(b'FLV\x01'):
+        return 'flv'
+    # QuickTime без ftyp: файл начинается сразу с атома moov/mdat/wide
+    if len(head) >= 8 and head[4:8] in (b'moov', b'mdat', b'wide', b'free'):
+        return 'mov'
+    return None
+
+
+def _get_fps(video_stream: Dict) -> float:
+    """Извлекает FPS из потока видео"""
+    fps_str = video_stream.get('r_frame_rate', '0/1')
+    try:
+        num, den = map(int, fps_str.split('/'))
+        return round(num / den, 2) if den != 0 else 0.0
+    except:
+        return 0.0
+
+
+def parse_probe(probe: Dict[str, Any]) -> Dict[str, Any]:
+    """Преобразует результат ffprobe в информацию о видео"""
+    video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
+    audio_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
+
+    if not video_stream:
+        raise ValueError("No video stream found")
+
+    return {
+        'duration': float(probe['format'].get('duration', 0)),
+        'width': int(video_stream.get('width', 0)),
+        'height': int(video_stream.get('height', 0)),
+        'bitrate': int(probe['format'].get('bit_rate', 0)) // 1000,  # Convert to kbps
+        'fps': _get_fps(video_stream),
+        'codec': video_stream.get('codec_name'),
+        'audio_codec': audio_stream.get('codec_name') if audio_stream else None,
+        'file_format': probe['format'].get('format_name'),
+        'file_size': int(probe['format'].get('size', 0)),
+        'creation_time': probe['format'].get('tags', {}).get('creation_time')
+    }
+
+
+async def run_ffprobe(file_path: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Запускает ffprobe без блокировки event loop; None, если файл не удалось разобрать"""
+    process = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error',
+        '-print_format', 'json',
+        '-show_format', '-show_streams',
+        file_path,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        logger.warning(f"ffprobe timed out for {file_path}")
+        return None
+
+    if process.returncode != 0:
+        logger.debug(f"ffprobe failed for {file_path}: {stderr.decode('utf-8', errors='ignore')}")
+        return None
+    return json.loads(stdout)
+
+
+def probe_cache_key(file_path: str, content_hash: Optional[str] = None) -> str:
+    """Ключ кэша результатов ffprobe: хэш содержимого или путь + размер + время изменения"""
+    if content_hash:
+        return f"sha256:{content_hash}"
+    stat = os.stat(file_path)
+    return f"path:{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ProbeCache:
+    """LRU-кэш информации о видео (результатов ffprobe)"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            video_info = self._entries.get(key)
+            if video_info is not None:
+                self._entries.move_to_end(key)
+            return dict(video_info) if video_info is not None else None
+
+    def set(self, key: str, video_info: Dict[str, Any]):
+        with self._lock:
+            self._entries[key] = dict(video_info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+async def validate_video_upload(temp_path: str, head: bytes, extension: str, complete: bool) -> Optional[Dict[str, Any]]:
+    """
+    Проверяет начало загружаемого видео: сигнатуру контейнера и разбор ffprobe
+    Вызывается, когда получены первые upload_probe_bytes (или весь файл, если он меньше).
+    Возвращает информацию о видео; None, если по неполному файлу проверка невозможна
+    (например, MP4 с индексом moov в конце) и ее нужно повторить по завершении загрузки.
+    """
+    container = sniff_container(head)
+    if container is None or container not in EXTENSION_CONTAINERS.get(extension, {container}):
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=f"File content does not match a supported '{extension}' video"
+        )
+
+    probe = await run_ffprobe(temp_path, settings.upload_probe_timeout_seconds)
+    if probe is None:
+        if complete:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="File is not a valid video"
+            )
+        return None
+
+    try:
+        video_info = parse_probe(probe)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="No video stream found"
+        )
+
+    video_info['container'] = container
+    video_info['probe_complete'] = complete
+    return video_info
+
+
+# Глобальный экземпляр
+probe_cache = ProbeCache(settings.probe_cache_size)
@@ -0,0 +1,61 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+from ..core.config import settings
+
+
+class CachedPath(NamedTuple):
+    """Отдаваемый файл: путь в хранилище, фактическая версия (None - оригинал) и тип содержимого"""
+    path: str
+    rendition: Optional[str]
+    media_type: str
+
+
+class VideoPathCache:
+    """LRU-кэш путей к файлам видео (video_id, rendition) -> отдаваемый файл"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: int = 300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[CachedPath, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, video_id: int, rendition: str) -> Optional[CachedPath]:
+        """Возвращает запись из кэша или None"""
+        key = (video_id, rendition)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            cached, expires_at = entry
+            if time.monotonic() > expires_at:
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return cached
+
+    def set(self, video_id: int, rendition: str, cached: CachedPath, ttl_seconds: Optional[int] = None):
+        """Сохраняет запись в кэш (ttl_seconds - для записей, которые скоро устареют)"""
+        key = (video_id, rendition)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (cached, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, video_id: int):
+        """Удаляет из кэша все записи для видео"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == video_id]:
+                del self._entries[key]
+
+
+# Глобальный экземпляр
+video_path_cache = VideoPathCache(
+    max_entries=settings.stream_path_cache_size,
+    ttl_seconds=settings.stream_path_cache_ttl_seconds
+)
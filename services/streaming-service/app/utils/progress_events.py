@@ -0,0 +1,150 @@
+import json
+import time
+import select
+import asyncio
+import threading
+import logging
+from typing import Dict, Any, Optional, Set
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Канал Postgres для событий обработки видео
+PROGRESS_CHANNEL = "video_progress"
+
+# Статусы, после которых событий по видео больше не будет
+TERMINAL_STATUSES = ('completed', 'failed')
+
+
+class ProgressSubscription:
+    """Подписка на события обработки: конкретные видео или все видео пользователя"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, video_ids: Optional[Set[int]] = None,
+                 uploaded_by: Optional[str] = None, max_queued: int = 1000):
+        self.loop = loop
+        self.video_ids = video_ids
+        self.uploaded_by = uploaded_by
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=max_queued)
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.video_ids is not None:
+            return event['video_id'] in self.video_ids
+        return event.get('uploaded_by') == self.uploaded_by
+
+    def deliver(self, event: Dict[str, Any]):
+        """Кладет событие в очередь (вызывается в потоке event loop)"""
+        if self.queue.full():
+            # Медленный клиент: старое событие о прогрессе менее важно, чем новое
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class ProgressEventBus:
+    """
+    Шина событий о статусе и прогрессе обработки видео
+    В режиме memory события доставляются подписчикам этого процесса,
+    в режиме postgres - публикуются через NOTIFY и принимаются слушателем LISTEN,
+    поэтому обработчики в других процессах тоже видны подписчикам.
+    """
+
+    def __init__(self, backend: str = "memory"):
+        self.backend = backend
+        self._subscriptions: Set[ProgressSubscription] = set()
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def subscribe(self, video_ids: Optional[Set[int]] = None,
+                  uploaded_by: Optional[str] = None) -> ProgressSubscription:
+        subscription = ProgressSubscription(asyncio.get_running_loop(), video_ids, uploaded_by)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ProgressSubscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def dispatch(self, event: Dict[str, Any]):
+        """Доставляет событие подписчикам (потокобезопасно)"""
+        with self._lock:
+            subscriptions = [subscription for subscription in self._subscriptions if subscription.matches(event)]
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+    def publish(self, db: Session, video_id: int, status: str, progress: float,
+                uploaded_by: Optional[str] = None, error: Optional[str] = None):
+        """Публикует событие об изменении статуса обработки видео"""
+        event = {
+            'video_id': video_id,
+            'status': status,
+            'progress': progress,
+            'error_message': error,
+            'uploaded_by': uploaded_by,
+            'timestamp': time.time()
+        }
+
+        if self.backend == "postgres":
+            try:
+                db.execute(
+                    text("SELECT pg_notify(:channel, :payload)"),
+                    {'channel': PROGRESS_CHANNEL, 'payload': json.dumps(event)}
+                )
+                db.commit()
+                return
+            except Exception as e:
+                logger.error(f"Failed to publish progress event for video {video_id}: {str(e)}")
+                db.rollback()
+
+        self.dispatch(event)
+
+    def start(self):
+        """Запускает слушателя LISTEN (только для режима postgres)"""
+        if self.backend != "postgres" or self._listener is not None:
+            return
+        self._stopping.clear()
+        self._listener = threading.Thread(target=self._listen, name="progress-listener", daemon=True)
+        self._listener.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._listener = None
+
+    def _listen(self):
+        """Принимает уведомления Postgres и доставляет их подписчикам (с переподключением)"""
+        import psycopg2  # type: ignore
+        from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT  # type: ignore
+
+        while not self._stopping.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(settings.database_url)
+                connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with connection.cursor() as cursor:
+                    cursor.execute(f"LISTEN {PROGRESS_CHANNEL}")
+
+                while not self._stopping.is_set():
+                    if select.select([connection], [], [], 5.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        self.dispatch(json.loads(notify.payload))
+            except Exception as e:
+                logger.error(f"Progress listener error: {str(e)}")
+                self._stopping.wait(5.0)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+
+def format_sse(event: Dict[str, Any], event_type: str = "status") -> str:
+    """Форматирует событие для Server-Sent Events"""
+    payload = {key: value for key, value in event.items() if key != 'uploaded_by'}
+    return f"event: {event_type}\ndata: {json.dumps(payload)}\n\n"
+
+
+# Глобальный экземпляр
+progress_event_bus = ProgressEventBus(settings.progress_events_backend)
@@ -0,0 +1,143 @@
+import time
+import asyncio
+import threading
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.video import VideoFile, VideoQuality
+from .file_handler import file_handler
+from .path_cache import video_path_cache
+from .keyframe_index import keyframe_index_cache
+from .storage_layout import DEFAULT_CODEC
+from .video_processor import video_processor
+
+logger = logging.getLogger(__name__)
+
+
+class RenditionAccessTracker:
+    """
+    Статистика обращений к версиям видео
+    Обращения копятся в памяти и периодически записываются в VideoQuality одним проходом,
+    чтобы range-запросы плеера не приводили к записи в базу на каждый запрос.
+    В режиме jit по этой статистике удаляются версии, которые давно не смотрели.
+    """
+
+    def __init__(self):
+        self._hits: Dict[Tuple[int, str], int] = {}  # (video_id, путь к файлу) -> число обращений
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._last_eviction = time.monotonic()
+
+    def record(self, video_id: int, file_path: str):
+        """Учитывает обращение к файлу версии видео"""
+        key = (video_id, file_path)
+        with self._lock:
+            self._hits[key] = self._hits.get(key, 0) + 1
+
+    def flush(self, db: Session) -> int:
+        """Записывает накопленные обращения в VideoQuality; возвращает число версий"""
+        with self._lock:
+            hits, self._hits = self._hits, {}
+        if not hits:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        for (video_id, file_path), count in hits.items():
+            db.query(VideoQuality).filter(
+                VideoQuality.original_video_id == video_id,
+                VideoQuality.file_path == file_path
+            ).update({
+                VideoQuality.access_count: VideoQuality.access_count + count,
+                VideoQuality.last_accessed_at: now
+            }, synchronize_session=False)
+        db.commit()
+        return len(hits)
+
+    def evict_cold_renditions(self, db: Session) -> List[str]:
+        """
+        Удаляет версии H.264, к которым не обращались rendition_eviction_days
+        Базовая ступень остается всегда; удаленные ступени будут созданы заново при запросе.
+        Версии в дополнительных кодеках при запросе не создаются, поэтому не удаляются
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(days=settings.rendition_eviction_days)
+        candidates = db.query(VideoQuality, VideoFile.video_metadata).join(
+            VideoFile, VideoFile.id == VideoQuality.original_video_id
+        ).filter(
+            VideoQuality.is_ready == True,
+            VideoQuality.codec == DEFAULT_CODEC,
+            func.coalesce(VideoQuality.last_accessed_at, VideoQuality.created_at) < cutoff
+        ).all()
+
+        evicted = []
+        for rendition, metadata in candidates:
+            ladder = (metadata or {}).get('encoding_ladder')
+            # Без сохраненной лестницы версию нельзя создать заново
+            if not ladder or rendition.quality not in ladder:
+                continue
+            if rendition.quality == video_processor.base_quality(ladder):
+                continue
+
+            video_id = rendition.original_video_id
+            index_path = file_handler.get_relative_path(
+                file_handler.get_keyframe_index_path(video_id, rendition.quality)
+            )
+            for file_path in (rendition.file_path, index_path):
+                if file_handler.file_exists(file_path):
+                    file_handler.delete_file(file_path)
+
+            db.delete(rendition)
+            video_path_cache.invalidate(video_id)
+            keyframe_index_cache.invalidate(video_id)
+            evicted.append(rendition.file_path)
+
+        db.commit()
+        if evicted:
+            logger.info(f"Evicted {len(evicted)} cold renditions")
+        return evicted
+
+    def _maintain(self, evict: bool = True):
+        """Запись статистики и (в режиме jit) периодическое удаление невостребованных версий"""
+        from ..core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            self.flush(db)
+
+            if (
+                evict
+                and settings.rendition_mode == 'jit'
+                and settings.rendition_eviction_days > 0
+                and time.monotonic() - self._last_eviction >= settings.rendition_eviction_interval_seconds
+            ):
+                self._last_eviction = time.monotonic()
+                self.evict_cold_renditions(db)
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Rendition access maintenance failed: {str(e)}")
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.rendition_access_flush_seconds)
+            await asyncio.to_thread(self._maintain)
+
+    def start(self):
+        """Запускает периодическую запись статистики (на старте приложения)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает фоновую задачу и записывает накопленные обращения"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await asyncio.to_thread(self._maintain, False)
+
+
+# Глобальный экземпляр
+rendition_access_tracker = RenditionAccessTracker()
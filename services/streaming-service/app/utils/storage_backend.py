@@ -0,0 +1,265 @@
+import os
+import time
+import threading
+import logging
+from collections import OrderedDict
+from typing import Iterator, Optional
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend:
+    """
+    Интерфейс хранилища файлов
+    Ключ файла - путь относительно корня хранилища (как в file_path).
+    storage_path на каждом узле используется как рабочая директория: обработка видео
+    идет с локальными файлами, которые затем публикуются в хранилище.
+    """
+
+    name = "base"
+    is_remote = False
+
+    def __init__(self, local_root: str):
+        self.local_root = local_root
+
+    def local_path(self, key: str) -> str:
+        """Путь к локальной копии файла"""
+        return os.path.join(self.local_root, key.lstrip('/'))
+
+    def publish(self, key: str):
+        """Публикует локальный файл в хранилище"""
+        raise NotImplementedError
+
+    def fetch(self, key: str) -> str:
+        """Обеспечивает наличие локальной копии файла и возвращает путь к ней"""
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, key: str) -> int:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """Читает диапазон байт [start, end] файла"""
+        raise NotImplementedError
+
+    def presigned_url(self, key: str, expires_in: int) -> Optional[str]:
+        """Временный URL для прямого доступа к файлу (если поддерживается)"""
+        return None
+
+    def evict_local(self, key: str):
+        """Удаляет локальную копию файла (для удаленных хранилищ)"""
+        pass
+
+
+class LocalStorageBackend(StorageBackend):
+    """Хранилище на локальном диске (storage_path)"""
+
+    name = "local"
+
+    def publish(self, key: str):
+        # Файл уже находится в хранилище
+        pass
+
+    def fetch(self, key: str) -> str:
+        return self.local_path(key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.local_path(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.local_path(key))
+
+    def delete(self, key: str) -> bool:
+        full_path = self.local_path(key)
+        if os.path.exists(full_path):
+            os.remove(full_path)
+            return True
+        return False
+
+    def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        with open(self.local_path(key), 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    S3-совместимое хранилище (AWS S3, MinIO)
+    Загрузка - multipart частями по s3_multipart_part_size_mb, чтение - ranged GET.
+    Публикуется уже полностью принятый локальный файл: загрузки не передаются
+    в хранилище по мере получения тела запроса.
+    """
+
+    name = "s3"
+    is_remote = True
+
+    def __init__(self, local_root: str):
+        super().__init__(local_root)
+
+        import boto3  # type: ignore
+        from botocore.config import Config  # type: ignore
+
+        self.client = boto3.client(
+            's3',
+            endpoint_url=settings.s3_endpoint_url or None,
+            aws_access_key_id=settings.s3_access_key or None,
+            aws_secret_access_key=settings.s3_secret_key or None,
+            region_name=settings.s3_region,
+            config=Config(signature_version='s3v4', s3={'addressing_style': 'path'})
+        )
+        self.bucket = settings.s3_bucket
+        self.prefix = settings.s3_prefix.strip('/')
+        self.part_size = settings.s3_multipart_part_size_mb * 1024 * 1024
+
+        # Кэш HEAD-запросов для существующих объектов: ключ -> (размер, время)
+        self._head_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._head_cache_ttl = settings.stream_path_cache_ttl_seconds
+        self._lock = threading.Lock()
+
+    def _object_key(self, key: str) -> str:
+        key = key.lstrip('/').replace(os.sep, '/')
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._head_cache.pop(key, None)
+
+    def _head(self, key: str) -> Optional[int]:
+        """Возвращает размер объекта или None, если объекта нет"""
+        from botocore.exceptions import ClientError  # type: ignore
+
+        with self._lock:
+            cached = self._head_cache.get(key)
+            if cached and time.monotonic() - cached[1] < self._head_cache_ttl:
+                return cached[0]
+
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            size = int(response['ContentLength'])
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                size = None
+            else:
+                raise
+
+        # Отсутствие объекта не кэшируется: его может только что загрузить другой узел
+        if size is None:
+            return None
+
+        with self._lock:
+            self._head_cache[key] = (size, time.monotonic())
+            self._head_cache.move_to_end(key)
+            while len(self._head_cache) > settings.stream_path_cache_size:
+                self._head_cache.popitem(last=False)
+        return size
+
+    def publish(self, key: str):
+        local_path = self.local_path(key)
+        object_key = self._object_key(key)
+        file_size = os.path.getsize(local_path)
+
+        if file_size <= self.part_size:
+            with open(local_path, 'rb') as f:
+                self.client.put_object(Bucket=self.bucket, Key=object_key, Body=f)
+        else:
+            upload = self.client.create_multipart_upload(Bucket=self.bucket, Key=object_key)
+            upload_id = upload['UploadId']
+            parts = []
+            try:
+                with open(local_path, 'rb') as f:
+                    part_number = 1
+                    while True:
+                        data = f.read(self.part_size)
+                        if not data:
+                            break
+                        response = self.client.upload_part(
+                            Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                            PartNumber=part_number, Body=data
+                        )
+                        parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+                        part_number += 1
+
+                self.client.complete_multipart_upload(
+                    Bucket=self.bucket, Key=object_key, UploadId=upload_id,
+                    MultipartUpload={'Parts': parts}
+                )
+            except Exception:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=object_key, UploadId=upload_id)
+                raise
+
+        self._forget(key)
+        logger.info(f"Published {key} to s3://{self.bucket}/{object_key} ({file_size} bytes)")
+
+    def fetch(self, key: str) -> str:
+        local_path = self.local_path(key)
+        if os.path.exists(local_path):
+            return local_path
+
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        temp_path = f"{local_path}.download"
+        response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        try:
+            with open(temp_path, 'wb') as f:
+                for chunk in response['Body'].iter_chunks(self.part_size):
+                    f.write(chunk)
+            os.replace(temp_path, local_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        return local_path
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def size(self, key: str) -> int:
+        size = self._head(key)
+        if size is None:
+            raise FileNotFoundError(key)
+        return size
+
+    def delete(self, key: str) -> bool:
+        existed = self.exists(key)
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        self._forget(key)
+        self.evict_local(key)
+        return existed
+
+    def iter_range(self, key: str, start: int, end: int, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self._object_key(key), Range=f"bytes={start}-{end}"
+        )
+        yield from response['Body'].iter_chunks(chunk_size)
+
+    def presigned_url(self, key: str, expires_in: int) -> Optional[str]:
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self._object_key(key)},
+            ExpiresIn=expires_in
+        )
+
+    def evict_local(self, key: str):
+        local_path = self.local_path(key)
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+
+def get_storage_backend(name: str, local_root: str) -> StorageBackend:
+    """Создает хранилище по имени"""
+    if name == "local":
+        return LocalStorageBackend(local_root)
+    if name == "s3":
+        return S3StorageBackend(local_root)
+    raise ValueError(f"Unknown storage backend: {name}")
@@ -0,0 +1,260 @@
+import os
+import re
+import time
+import logging
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from sqlalchemy import or_, func
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.video import VideoFile, VideoQuality
+from .file_handler import file_handler
+from .storage_layout import is_partial_path
+
+logger = logging.getLogger(__name__)
+
+# Производные файлы видео: video_{id}_{suffix}
+VIDEO_ASSET_PATTERN = re.compile(r'^video_(\d+)_')
+
+
+class StorageReconciler:
+    """
+    Сверка файлов хранилища с записями VideoFile и VideoQuality
+    Находит (и при необходимости удаляет) файлы, на которые нет ссылок в базе
+    """
+
+    # Директории, которые сверяются с базой (temp очищается cleanup_temp_files),
+    # в алфавитном порядке, чтобы курсор обхода был монотонным
+    categories = ('thumbnails', 'uploads', 'videos')
+
+    def __init__(self, batch_size: int = 500):
+        self.storage_path = settings.storage_path
+        self.batch_size = batch_size
+
+    def _walk(self, directory: str, start_after: Optional[str]) -> Iterator[Tuple[str, os.DirEntry]]:
+        """
+        Рекурсивно обходит директорию в детерминированном порядке
+        Возвращает пары (относительный путь, DirEntry), пропуская пути до start_after включительно
+        """
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+
+        for entry in entries:
+            relative_path = os.path.relpath(entry.path, self.storage_path)
+            if entry.is_dir(follow_symlinks=False):
+                # Пропускаем поддиректории, которые целиком обработаны
+                if start_after and not start_after.startswith(relative_path + os.sep) and relative_path < start_after:
+                    continue
+                yield from self._walk(entry.path, start_after)
+            elif entry.is_file(follow_symlinks=False):
+                if start_after and relative_path <= start_after:
+                    continue
+                yield relative_path, entry
+
+    def iter_batches(self, start_after: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Обходит хранилище пачками по batch_size файлов"""
+        batch = []
+        for category in self.categories:
+            for relative_path, entry in self._walk(os.path.join(self.storage_path, category), start_after):
+                stat = entry.stat(follow_symlinks=False)
+                batch.append({
+                    'path': relative_path,
+                    'full_path': entry.path,
+                    'name': entry.name,
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime
+                })
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def _classify_batch(self, db: Session, batch: List[Dict[str, Any]]) -> Dict[str, Optional[int]]:
+        """
+        Определяет для каждого файла пачки, на какое видео он ссылается
+        Возвращает {относительный путь: movie_id} для используемых файлов
+        """
+        # Пути в базе могут быть относительными или (в старых записях) абсолютными
+        lookup_paths = [item['path'] for item in batch] + [item['full_path'] for item in batch]
+        path_owner: Dict[str, int] = {}
+
+        video_rows = db.query(
+            VideoFile.id, VideoFile.file_path, VideoFile.thumbnail_path, VideoFile.preview_path
+        ).filter(
+            or_(
+                VideoFile.file_path.in_(lookup_paths),
+                VideoFile.thumbnail_path.in_(lookup_paths),
+                VideoFile.preview_path.in_(lookup_paths)
+            )
+        ).all()
+        for row in video_rows:
+            for path in (row.file_path, row.thumbnail_path, row.preview_path):
+                if path:
+                    path_owner[file_handler.get_relative_path(path)] = row.id
+
+        rendition_rows = db.query(
+            VideoQuality.original_video_id, VideoQuality.file_path
+        ).filter(VideoQuality.file_path.in_(lookup_paths)).all()
+        for row in rendition_rows:
+            path_owner[file_handler.get_relative_path(row.file_path)] = row.original_video_id
+
+        # Производные файлы без явной ссылки сверяем по id видео из имени файла
+        asset_video_ids = {}
+        for item in batch:
+            # Недописанные файлы прерванной обработки не принадлежат видео
+            if is_partial_path(item['name']):
+                continue
+            match = VIDEO_ASSET_PATTERN.match(item['name'])
+            if match and item['path'] not in path_owner:
+                asset_video_ids[item['path']] = int(match.group(1))
+
+        video_ids = set(path_owner.values()) | set(asset_video_ids.values())
+        videos = {}
+        if video_ids:
+            videos = {
+                row.id: row
+                for row in db.query(
+                    VideoFile.id, VideoFile.movie_id, VideoFile.processing_status
+                ).filter(VideoFile.id.in_(video_ids)).all()
+            }
+
+        # Видео, для которых версии уже учитываются в VideoQuality
+        tracked_video_ids = set()
+        if asset_video_ids:
+            tracked_video_ids = {
+                row.original_video_id
+                for row in db.query(VideoQuality.original_video_id).filter(
+                    VideoQuality.original_video_id.in_(set(asset_video_ids.values()))
+                ).distinct().all()
+            }
+
+        referenced: Dict[str, Optional[int]] = {}
+        for path, video_id in path_owner.items():
+            video = videos.get(video_id)
+            referenced[path] = video.movie_id if video else None
+
+        for path, video_id in asset_video_ids.items():
+            video = videos.get(video_id)
+            if not video:
+                continue
+            # Файлы существующего видео принадлежат ему при любом статусе: после ошибки
+            # обработка возобновляется с готовых версий и их индексов. Исключение - версии
+            # обработанного видео, которых нет в VideoQuality (кроме созданных до этого учета)
+            is_rendition = path.endswith('.mp4') and path.startswith('videos' + os.sep)
+            if video.processing_status == 'completed' and is_rendition and video_id in tracked_video_ids:
+                continue
+            referenced[path] = video.movie_id
+
+        return referenced
+
+    def reconcile(
+        self,
+        db: Session,
+        dry_run: bool = True,
+        min_age_seconds: int = 3600,
+        max_files: Optional[int] = None,
+        start_after: Optional[str] = None,
+        max_reported: int = 1000
+    ) -> Dict[str, Any]:
+        """
+        Сверяет хранилище с базой данных
+        Файлы без ссылок старше min_age_seconds считаются сиротами и удаляются (если не dry_run).
+        max_files ограничивает объем одного прохода, обход продолжается с next_cursor.
+        """
+        report: Dict[str, Any] = {
+            'dry_run': dry_run,
+            'scanned_files': 0,
+            'scanned_bytes': 0,
+            'orphan_files': 0,
+            'orphan_bytes': 0,
+            'deleted_files': 0,
+            'orphans': [],
+            'usage_by_movie': {},
+            'next_cursor': None
+        }
+        now = time.time()
+
+        last_path = start_after
+
+        for batch in self.iter_batches(start_after):
+            truncated = False
+            if max_files is not None:
+                remaining = max_files - report['scanned_files']
+                if remaining <= 0:
+                    report['next_cursor'] = last_path
+                    break
+                if len(batch) > remaining:
+                    batch = batch[:remaining]
+                    truncated = True
+
+            referenced = self._classify_batch(db, batch)
+
+            for item in batch:
+                report['scanned_files'] += 1
+                report['scanned_bytes'] += item['size']
+
+                if item['path'] in referenced:
+                    movie_id = referenced[item['path']]
+                    if movie_id is not None:
+                        usage = report['usage_by_movie'].setdefault(movie_id, {'files': 0, 'bytes': 0})
+                        usage['files'] += 1
+                        usage['bytes'] += item['size']
+                    continue
+
+                # Недавние файлы могут принадлежать загрузке или обработке в процессе
+                if now - item['mtime'] < min_age_seconds:
+                    continue
+
+                report['orphan_files'] += 1
+                report['orphan_bytes'] += item['size']
+                if len(report['orphans']) < max_reported:
+                    report['orphans'].append({'path': item['path'], 'size': item['size']})
+
+                if not dry_run and file_handler.delete_file(item['path']):
+                    report['deleted_files'] += 1
+
+            last_path = batch[-1]['path']
+            if truncated:
+                report['next_cursor'] = last_path
+                break
+
+        logger.info(
+            f"Storage reconciliation (dry_run={dry_run}): scanned {report['scanned_files']} files, "
+            f"{report['orphan_files']} orphans ({report['orphan_bytes']} bytes), "
+            f"deleted {report['deleted_files']}"
+        )
+        return report
+
+    def usage_by_movie(self, db: Session) -> Dict[int, Dict[str, int]]:
+        """Объем хранилища по фильмам по данным базы (оригиналы и версии видео)"""
+        usage: Dict[int, Dict[str, int]] = {}
+
+        originals = db.query(
+            VideoFile.movie_id, func.count(VideoFile.id), func.coalesce(func.sum(VideoFile.file_size), 0)
+        ).group_by(VideoFile.movie_id).all()
+        for movie_id, count, total_size in originals:
+            usage[movie_id] = {
+                'videos': count,
+                'original_bytes': int(total_size),
+                'rendition_bytes': 0,
+                'renditions': 0
+            }
+
+        renditions = db.query(
+            VideoFile.movie_id, func.count(VideoQuality.id), func.coalesce(func.sum(VideoQuality.file_size), 0)
+        ).join(
+            VideoQuality, VideoQuality.original_video_id == VideoFile.id
+        ).group_by(VideoFile.movie_id).all()
+        for movie_id, count, total_size in renditions:
+            entry = usage.setdefault(movie_id, {'videos': 0, 'original_bytes': 0, 'rendition_bytes': 0, 'renditions': 0})
+            entry['renditions'] = count
+            entry['rendition_bytes'] = int(total_size)
+
+        return usage
+
+
+# Глобальный экземпляр
+storage_reconciler = StorageReconciler()
@@ -0,0 +1,115 @@
+import os
+import hashlib
+from typing import Tuple
+from ..core.config import settings
+
+# Кодек версий видео по умолчанию (файлы без суффикса кодека)
+DEFAULT_CODEC = "h264"
+
+# Метка недописанных файлов: результат пишется во временный файл и переименовывается
+PARTIAL_MARKER = ".part"
+
+
+def rendition_name(quality: str, codec: str = DEFAULT_CODEC) -> str:
+    """Имя версии видео: 720p для H.264, 720p_hevc для остальных кодеков"""
+    return quality if codec == DEFAULT_CODEC else f"{quality}_{codec}"
+
+
+def partial_path(path: str) -> str:
+    """Временный путь для записи файла: video_1_720p.part.mp4 (расширение сохраняется)"""
+    root, extension = os.path.splitext(path)
+    return f"{root}{PARTIAL_MARKER}{extension}"
+
+
+def is_partial_path(path: str) -> bool:
+    """Проверяет, является ли файл недописанным результатом обработки"""
+    root = os.path.splitext(os.path.basename(path))[0]
+    return root.endswith(PARTIAL_MARKER)
+
+
+def parse_rendition(name: str) -> Tuple[str, str]:
+    """Разбирает имя версии видео на качество и кодек: 720p_hevc -> (720p, hevc)"""
+    quality, _, codec = name.partition('_')
+    return quality, codec or DEFAULT_CODEC
+
+
+class StorageLayout:
+    """
+    Раскладка файлов в хранилище
+    Определяет относительные пути (от storage_path) для загруженных файлов,
+    версий видео разного качества и превью
+    """
+
+    name = "base"
+
+    def object_path(self, content_hash: str) -> str:
+        """
+        Путь к загруженному файлу по хэшу содержимого
+        Без расширения: одинаковое содержимое под разными расширениями - один объект
+        """
+        raise NotImplementedError
+
+    def video_asset_path(self, category: str, video_id: int, filename: str) -> str:
+        """Путь к производному файлу видео (videos, thumbnails)"""
+        raise NotImplementedError
+
+    def rendition_path(self, video_id: int, quality: str, codec: str = DEFAULT_CODEC) -> str:
+        """Путь к версии видео указанного качества и кодека"""
+        return self.video_asset_path('videos', video_id, f"video_{video_id}_{rendition_name(quality, codec)}.mp4")
+
+    def thumbnail_path(self, video_id: int, filename: str) -> str:
+        """Путь к миниатюре или превью видео"""
+        return self.video_asset_path('thumbnails', video_id, filename)
+
+
+class FlatLayout(StorageLayout):
+    """Плоская раскладка: все файлы категории в одной директории"""
+
+    name = "flat"
+
+    def object_path(self, content_hash: str) -> str:
+        return os.path.join('uploads', content_hash)
+
+    def video_asset_path(self, category: str, video_id: int, filename: str) -> str:
+        return os.path.join(category, filename)
+
+
+class ShardedLayout(StorageLayout):
+    """
+    Шардированная раскладка: файлы раскладываются по поддиректориям
+    по префиксу хэша (uploads/ab/cd/abcd...)
+    """
+
+    name = "sharded"
+
+    def __init__(self, depth: int = 2, width: int = 2):
+        self.depth = depth
+        self.width = width
+
+    def _shard_dirs(self, key_hash: str) -> list:
+        """Возвращает список поддиректорий для хэша"""
+        return [
+            key_hash[i * self.width:(i + 1) * self.width]
+            for i in range(self.depth)
+        ]
+
+    def object_path(self, content_hash: str) -> str:
+        return os.path.join('uploads', *self._shard_dirs(content_hash), content_hash)
+
+    def video_asset_path(self, category: str, video_id: int, filename: str) -> str:
+        # Все файлы одного видео попадают в один шард
+        key_hash = hashlib.sha1(f"video_{video_id}".encode('utf-8')).hexdigest()
+        return os.path.join(category, *self._shard_dirs(key_hash), filename)
+
+
+def get_storage_layout(name: str) -> StorageLayout:
+    """Создает раскладку хранилища по имени"""
+    if name == "flat":
+        return FlatLayout()
+    if name == "sharded":
+        return ShardedLayout(settings.storage_shard_depth, settings.storage_shard_width)
+    raise ValueError(f"Unknown storage layout: {name}")
+
+
+# Глобальный экземпляр
+storage_layout = get_storage_layout(settings.storage_layout)
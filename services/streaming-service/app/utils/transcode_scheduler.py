@@ -0,0 +1,222 @@
+import os
+import math
+import time
+import asyncio
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from sqlalchemy.orm import Session
+from ..core.config import settings
+from ..models.watch_session import StreamingStats
+
+logger = logging.getLogger(__name__)
+
+# Базовый приоритет по типу задачи (меньше - раньше)
+JOB_BASE_PRIORITY = {
+    'upload': 0.0,
+    'rendition': 50.0,  # Версия по запросу зрителя (пока отдается ближайшая готовая)
+    'reprocess': 100.0,
+    'extra_codecs': 200.0,
+}
+
+# Задачи, которые выполняются с пониженным приоритетом процесса (nice)
+LOW_PRIORITY_KINDS = ('reprocess', 'extra_codecs')
+
+
+def _available_memory_mb() -> Optional[float]:
+    """Доступная память (MemAvailable) в МБ; None, если определить нельзя"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class TranscodeJob:
+    """Задача обработки видео в очереди планировщика"""
+
+    def __init__(self, kind: str, video_id: int, run: Callable[[bool], Awaitable[Any]],
+                 popularity: float, sequence: int):
+        self.kind = kind
+        self.video_id = video_id
+        self.run = run
+        self.popularity = popularity
+        self.sequence = sequence
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+
+    @property
+    def low_priority(self) -> bool:
+        return self.kind in LOW_PRIORITY_KINDS
+
+    def score(self, now: float) -> float:
+        """
+        Эффективный приоритет (меньше - раньше): тип задачи, популярность фильма
+        и время ожидания (старые задачи постепенно поднимаются, чтобы не голодать)
+        """
+        waited = now - self.enqueued_at
+        popularity_boost = min(50.0, 10.0 * math.log10(1.0 + self.popularity))
+        aging = 10.0 * waited / settings.transcode_aging_seconds
+        return JOB_BASE_PRIORITY.get(self.kind, 100.0) - popularity_boost - aging
+
+    def describe(self, now: float) -> Dict[str, Any]:
+        return {
+            'kind': self.kind,
+            'video_id': self.video_id,
+            'popularity': self.popularity,
+            'waiting_seconds': round((self.started_at or now) - self.enqueued_at, 1),
+            'running_seconds': round(now - self.started_at, 1) if self.started_at else None,
+            'priority': round(self.score(now), 2)
+        }
+
+
+class TranscodeScheduler:
+    """
+    Планировщик обработки видео
+    Задачи выбираются по приоритету (популярность фильма, тип задачи, время ожидания).
+    Число одновременных кодирований ограничено числом ядер и доступной памятью;
+    фоновые задачи (повторная обработка, дополнительные кодеки) не занимают
+    зарезервированные слоты и выполняются с пониженным приоритетом процесса.
+    Если все слоты зарезервированы, фоновые задачи не запускаются.
+    """
+
+    def __init__(self):
+        self.max_concurrent = self._compute_capacity()
+        self.low_priority_slots = max(0, self.max_concurrent - settings.transcode_reserved_slots)
+        self._queue: List[TranscodeJob] = []
+        self._running: List[TranscodeJob] = []
+        self._condition: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._sequence = itertools.count()
+
+    def _compute_capacity(self) -> int:
+        """Число одновременных кодирований по ядрам и памяти"""
+        if settings.transcode_max_concurrent > 0:
+            return settings.transcode_max_concurrent
+
+        threads_per_job = settings.transcode_threads_per_job or 4
+        capacity = max(1, _available_cores() // threads_per_job)
+
+        memory_mb = _available_memory_mb()
+        if memory_mb is not None:
+            capacity = min(capacity, max(1, int(memory_mb // settings.transcode_memory_per_job_mb)))
+        return capacity
+
+    def start(self):
+        """Запускает воркеры (на старте приложения)"""
+        if self._workers:
+            return
+        self._condition = asyncio.Condition()
+        self._workers = [
+            asyncio.create_task(self._worker(number)) for number in range(self.max_concurrent)
+        ]
+        logger.info(
+            f"Transcode scheduler started: {self.max_concurrent} workers, "
+            f"{self.low_priority_slots} for low-priority jobs"
+        )
+        if self.low_priority_slots == 0:
+            logger.warning(
+                "All transcode slots are reserved for uploads: re-encoding and extra codecs will not run "
+                "(lower transcode_reserved_slots or raise transcode_max_concurrent)"
+            )
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def _movie_popularity(self, db: Session, movie_id: Optional[int]) -> float:
+        if movie_id is None:
+            return 0.0
+        total_views = db.query(StreamingStats.total_views).filter(
+            StreamingStats.movie_id == movie_id
+        ).scalar()
+        return float(total_views or 0)
+
+    async def submit(self, kind: str, video_id: int, run: Callable[[bool], Awaitable[Any]],
+                     db: Session, movie_id: Optional[int] = None):
+        """
+        Ставит задачу в очередь
+        run(low_priority) - корутина обработки; low_priority передается в кодирование (nice)
+        """
+        if not self._workers:
+            self.start()
+
+        job = TranscodeJob(kind, video_id, run, self._movie_popularity(db, movie_id), next(self._sequence))
+        async with self._condition:
+            self._queue.append(job)
+            self._condition.notify_all()
+
+    def _can_start(self, job: TranscodeJob, low_priority_running: int) -> bool:
+        # Фоновые задачи оставляют свободные слоты для срочных загрузок
+        if job.low_priority and low_priority_running >= self.low_priority_slots:
+            return False
+        if settings.transcode_memory_per_job_mb > 0:
+            memory_mb = _available_memory_mb()
+            if memory_mb is not None and memory_mb < settings.transcode_memory_per_job_mb and self._running:
+                return False
+        return True
+
+    def _next_job(self) -> Optional[TranscodeJob]:
+        """Выбирает задачу с наилучшим приоритетом из тех, которые можно запустить"""
+        now = time.monotonic()
+        low_priority_running = sum(1 for job in self._running if job.low_priority)
+        for job in sorted(self._queue, key=lambda job: (job.score(now), job.sequence)):
+            if self._can_start(job, low_priority_running):
+                return job
+        return None
+
+    async def _worker(self, number: int):
+        while True:
+            async with self._condition:
+                job = self._next_job()
+                while job is None:
+                    try:
+                        # Периодически перепроверяем память и приоритеты
+                        await asyncio.wait_for(self._condition.wait(), timeout=5.0)
+                    except asyncio.TimeoutError:
+                        pass
+                    job = self._next_job()
+                self._queue.remove(job)
+                job.started_at = time.monotonic()
+                self._running.append(job)
+
+            try:
+                await job.run(job.low_priority)
+            except Exception as e:
+                logger.error(f"Transcode job {job.kind} for video {job.video_id} failed: {str(e)}")
+            finally:
+                async with self._condition:
+                    self._running.remove(job)
+                    self._condition.notify_all()
+
+    def is_scheduled(self, video_id: int) -> bool:
+        return any(job.video_id == video_id for job in self._queue + self._running)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Состояние очереди для мониторинга"""
+        now = time.monotonic()
+        return {
+            'max_concurrent': self.max_concurrent,
+            'low_priority_slots': self.low_priority_slots,
+            'running': [job.describe(now) for job in self._running],
+            'queued': [
+                job.describe(now)
+                for job in sorted(self._queue, key=lambda job: (job.score(now), job.sequence))
+            ]
+        }
+
+
+# Глобальный экземпляр
+transcode_scheduler = TranscodeScheduler()
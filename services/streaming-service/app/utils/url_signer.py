@@ -0,0 +1,94 @@
+import base64
+import hashlib
+import hmac
+import time
+from typing import Optional, Dict
+from urllib.parse import urlencode
+from ..core.config import settings
+
+
+class StreamUrlSigner:
+    """Класс для создания и проверки подписанных URL стриминга (HMAC-SHA256)"""
+
+    def __init__(self):
+        secret = settings.stream_url_secret or settings.jwt_secret_key
+        self.secret = secret.encode('utf-8')
+        self.ttl_seconds = settings.stream_url_ttl_seconds
+
+    def user_binding(self, email: str) -> str:
+        """
+        Непрозрачный идентификатор пользователя для подписи URL
+        Email в URL не попадает (логи, кэши CDN, Referer), идентификатор нельзя подобрать без секрета
+        """
+        digest = hmac.new(self.secret, f"user:{email}".encode('utf-8'), hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest[:12]).decode('ascii')
+
+    def matches_user(self, user: Optional[str], email: Optional[str]) -> bool:
+        """Проверяет, что URL выдан этому пользователю (если URL привязан и пользователь известен)"""
+        if not user or not email:
+            return True
+        return hmac.compare_digest(self.user_binding(email), user)
+
+    def _signature(self, video_id: int, rendition: str, expires: int, user: Optional[str]) -> str:
+        """Вычисляет подпись для набора параметров"""
+        message = f"{video_id}:{rendition}:{expires}:{user or ''}".encode('utf-8')
+        digest = hmac.new(self.secret, message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def sign(self, video_id: int, rendition: str, user_email: Optional[str] = None,
+             expires: Optional[int] = None) -> Dict[str, str]:
+        """
+        Подписывает параметры стриминга
+        Возвращает query-параметры для URL: quality, expires, [u], sig
+        """
+        if expires is None:
+            expires = int(time.time()) + self.ttl_seconds
+
+        params = {'quality': rendition, 'expires': str(expires)}
+        user = self.user_binding(user_email) if user_email else None
+        if user:
+            params['u'] = user
+        params['sig'] = self._signature(video_id, rendition, expires, user)
+        return params
+
+    def signed_url(self, base_url: str, video_id: int, rendition: str, user_email: Optional[str] = None) -> str:
+        """Создает подписанный URL для стриминга"""
+        return f"{base_url}?{urlencode(self.sign(video_id, rendition, user_email))}"
+
+    def _scope_signature(self, scope: str, expires: int, user: Optional[str]) -> str:
+        """Подпись доступа к области, не связанной с конкретной версией видео"""
+        message = f"scope:{scope}:{expires}:{user or ''}".encode('utf-8')
+        digest = hmac.new(self.secret, message, hashlib.sha256).digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def sign_scope(self, scope: str, user_email: Optional[str] = None,
+                   ttl_seconds: Optional[int] = None) -> Dict[str, str]:
+        """
+        Подписывает доступ к области (например, подписке на события обработки)
+        Возвращает query-параметры для URL: expires, [u], sig
+        """
+        expires = int(time.time()) + (ttl_seconds or self.ttl_seconds)
+        params = {'expires': str(expires)}
+        user = self.user_binding(user_email) if user_email else None
+        if user:
+            params['u'] = user
+        params['sig'] = self._scope_signature(scope, expires, user)
+        return params
+
+    def verify_scope(self, scope: str, expires: int, sig: str, user: Optional[str] = None) -> bool:
+        """Проверяет подпись и срок действия доступа к области"""
+        if expires < int(time.time()):
+            return False
+        return hmac.compare_digest(self._scope_signature(scope, expires, user), sig)
+
+    def verify(self, video_id: int, rendition: str, expires: int, sig: str,
+               user: Optional[str] = None) -> bool:
+        """Проверяет подпись и срок действия URL"""
+        if expires < int(time.time()):
+            return False
+        expected = self._signature(video_id, rendition, expires, user)
+        return hmac.compare_digest(expected, sig)
+
+
+# Глобальный экземпляр
+url_signer = StreamUrlSigner()
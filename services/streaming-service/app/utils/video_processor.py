@@ -1,13 +1,41 @@
 import os
+import json
+import math
+import uuid
+import hashlib
+import shutil
 import ffmpeg # type: ignore
 import asyncio
-from typing import Dict, Any, Optional, Tuple
-from PIL import Image # type: ignore
+from typing import Dict, Any, List, Optional, Tuple
 from ..core.config import settings
+from .file_handler import file_handler
+from .storage_layout import DEFAULT_CODEC, partial_path
+from .keyframe_index import KeyframeIndex
+from .media_probe import parse_probe, run_ffprobe, probe_cache_key, probe_cache
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Параметры кодирования анимированного превью по форматам
+PREVIEW_FORMATS = {
+    'gif': {'vf': 'scale=320:180:flags=lanczos,fps=10', 'format': 'gif'},
+    'webp': {
+        'vf': 'scale=320:180:flags=lanczos,fps=15', 'vcodec': 'libwebp', 'quality': 60,
+        'loop': 0, 'an': None, 'format': 'webp'
+    },
+    'mp4': {
+        'vf': 'scale=320:180:flags=lanczos,fps=15', 'vcodec': 'libx264', 'preset': 'veryfast', 'crf': 28,
+        'pix_fmt': 'yuv420p', 'an': None, 'movflags': 'faststart', 'format': 'mp4'
+    },
+}
+
+# Параметры кодеков: CRF и битрейт задаются относительно настроек H.264
+CODEC_PROFILES = {
+    'h264': {'vcodec': 'libx264', 'preset': 'medium', 'crf_offset': 0, 'bitrate_factor': 1.0, 'extra': {}},
+    'hevc': {'vcodec': 'libx265', 'preset': 'medium', 'crf_offset': 5, 'bitrate_factor': 0.6, 'extra': {'tag:v': 'hvc1'}},
+    'av1': {'vcodec': 'libsvtav1', 'preset': 8, 'crf_offset': 11, 'bitrate_factor': 0.5, 'extra': {}},
+}
+
 
 class VideoProcessor:
     """Класс для обработки видеофайлов с помощью FFmpeg"""
@@ -16,134 +44,440 @@ class VideoProcessor:
         self.storage_path = settings.storage_path
         self.supported_qualities = settings.supported_qualities_list
         
-    async def get_video_info(self, file_path: str) -> Dict[str, Any]:
-        """Получает информацию о видеофайле"""
+    async def get_video_info(self, file_path: str, content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Получает информацию о видеофайле
+        Результаты кэшируются по хэшу содержимого (или пути, размеру и времени изменения),
+        ffprobe запускается как асинхронный подпроцесс
+        """
         try:
-            probe = ffmpeg.probe(file_path)
-            video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-            audio_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
-            
-            if not video_stream:
-                raise ValueError("No video stream found")
-            
-            info = {
-                'duration': float(probe['format'].get('duration', 0)),
-                'width': int(video_stream.get('width', 0)),
-                'height': int(video_stream.get('height', 0)),
-                'bitrate': int(probe['format'].get('bit_rate', 0)) // 1000,  # Convert to kbps
-                'fps': self._get_fps(video_stream),
-                'codec': video_stream.get('codec_name'),
-                'audio_codec': audio_stream.get('codec_name') if audio_stream else None,
-                'file_format': probe['format'].get('format_name'),
-                'file_size': int(probe['format'].get('size', 0)),
-                'creation_time': probe['format'].get('tags', {}).get('creation_time')
-            }
+            cache_key = probe_cache_key(file_path, content_hash)
+            video_info = probe_cache.get(cache_key)
+            if video_info is not None:
+                return video_info
+            
+            probe = await run_ffprobe(file_path)
+            if probe is None:
+                raise ValueError("ffprobe could not read the file")
             
-            return info
+            video_info = parse_probe(probe)
+            video_info['probe_key'] = cache_key
+            probe_cache.set(cache_key, video_info)
+            return video_info
             
         except Exception as e:
             logger.error(f"Error getting video info for {file_path}: {str(e)}")
             raise
     
-    def _get_fps(self, video_stream: Dict) -> float:
-        """Извлекает FPS из потока видео"""
-        fps_str = video_stream.get('r_frame_rate', '0/1')
+    async def create_thumbnails(self, video_path: str, outputs: Dict[Tuple[int, int], str],
+                                timestamp: float = 10.0) -> Dict[Tuple[int, int], str]:
+        """
+        Создает миниатюры нескольких размеров за один проход FFmpeg
+        Кадр декодируется один раз, масштабируется и кодируется (JPEG/WebP по расширению) для каждого размера.
+        outputs - {(ширина, высота): путь}; возвращает созданные миниатюры в том же виде
+        """
         try:
-            num, den = map(int, fps_str.split('/'))
-            return round(num / den, 2) if den != 0 else 0.0
-        except:
-            return 0.0
+            frames = ffmpeg.input(video_path, ss=timestamp).video.filter_multi_output('split', len(outputs))
+            
+            streams = []
+            for number, ((width, height), output_path) in enumerate(outputs.items()):
+                os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                codec_options = (
+                    {'vcodec': 'libwebp', 'quality': 80}
+                    if output_path.endswith('.webp') else {'vcodec': 'mjpeg', 'q:v': 3}
+                )
+                streams.append(
+                    frames[number]
+                    # Заполняем кадр целиком без искажения пропорций
+                    .filter('scale', width, height, force_original_aspect_ratio='increase', flags='lanczos')
+                    .filter('crop', width, height)
+                    .output(partial_path(output_path), vframes=1, format='image2', **codec_options)
+                )
+            
+            await self._run_ffmpeg(ffmpeg.merge_outputs(*streams))
+            
+            created = {}
+            for size, output_path in outputs.items():
+                temp_path = partial_path(output_path)
+                if os.path.exists(temp_path):
+                    os.replace(temp_path, output_path)
+                    created[size] = output_path
+            return created
+            
+        except Exception as e:
+            logger.error(f"Error creating thumbnails: {str(e)}")
+            for output_path in outputs.values():
+                self._remove_partial(output_path)
+            return {}
     
-    async def create_thumbnail(self, video_path: str, output_path: str, timestamp: float = 10.0) -> bool:
-        """Создает миниатюру видео"""
+    async def create_preview(self, video_path: str, output_path: str, preview_format: str = 'gif',
+                             duration: int = 3) -> bool:
+        """Создает анимированное превью видео (gif, webp или mp4 без звука)"""
         try:
-            # Создаем директорию если не существует
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            temp_path = partial_path(output_path)
             
-            # Создаем скриншот
-            (
-                ffmpeg
-                .input(video_path, ss=timestamp)
-                .output(output_path, vframes=1, format='image2', vcodec='png')
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
+            stream = ffmpeg.output(
+                ffmpeg.input(video_path, ss=30, t=duration),
+                temp_path,
+                **PREVIEW_FORMATS[preview_format]
             )
+            await self._run_ffmpeg(stream)
             
-            # Изменяем размер до нужных размеров
-            if os.path.exists(output_path):
-                await self._resize_image(output_path, settings.thumbnail_width, settings.thumbnail_height)
-                return True
-            
-            return False
+            if not os.path.exists(temp_path):
+                return False
+            os.replace(temp_path, output_path)
+            return True
             
         except Exception as e:
-            logger.error(f"Error creating thumbnail: {str(e)}")
+            logger.error(f"Error creating {preview_format} preview: {str(e)}")
+            self._remove_partial(output_path)
             return False
     
-    async def _resize_image(self, image_path: str, width: int, height: int):
-        """Изменяет размер изображения"""
+    async def create_trickplay(self, video_id: int, video_path: str, duration: float) -> Optional[Dict[str, Any]]:
+        """
+        Создает спрайты превью для перемотки: кадры через trickplay_interval_seconds,
+        собранные в сетку trickplay_columns x trickplay_rows, и WebVTT-индекс с координатами кадров (#xywh)
+        Возвращает описание trickplay и пути к созданным файлам
+        """
+        interval = settings.trickplay_interval_seconds
+        tile_width = settings.trickplay_tile_width
+        tile_height = settings.trickplay_tile_height
+        columns = settings.trickplay_columns
+        rows = settings.trickplay_rows
+        image_format = 'webp' if settings.trickplay_format == 'webp' else 'jpg'
+        
+        if not duration or duration <= 0:
+            return None
+        
+        # Спрайты пишутся во временную директорию и переносятся после успешного завершения
+        work_dir = os.path.join(self.storage_path, 'temp', f"trickplay_{video_id}_{uuid.uuid4().hex}")
+        os.makedirs(work_dir, exist_ok=True)
+        
         try:
-            with Image.open(image_path) as img:
-                img = img.resize((width, height), Image.Resampling.LANCZOS)
-                img.save(image_path, optimize=True, quality=85)
+            codec_options = {'vcodec': 'libwebp', 'quality': 70} if image_format == 'webp' else {'vcodec': 'mjpeg', 'q:v': 5}
+            # Декодируем только ключевые кадры: для превью точность до кадра не нужна
+            stream = ffmpeg.output(
+                ffmpeg.input(video_path, skip_frame='nokey'),
+                os.path.join(work_dir, f"sprite_%03d.{image_format}"),
+                vf=f"fps=1/{interval},scale={tile_width}:{tile_height},tile={columns}x{rows}",
+                format='image2',
+                an=None,
+                **codec_options
+            )
+            await self._run_ffmpeg(stream)
+            
+            sprite_names = sorted(name for name in os.listdir(work_dir) if name.startswith('sprite_'))
+            if not sprite_names:
+                return None
+            
+            sprite_paths = []
+            for sprite_name in sprite_names:
+                sprite_path = file_handler.get_thumbnail_path(video_id, f"video_{video_id}_{sprite_name}")
+                os.makedirs(os.path.dirname(sprite_path), exist_ok=True)
+                shutil.move(os.path.join(work_dir, sprite_name), sprite_path)
+                sprite_paths.append(sprite_path)
+            
+            # WebVTT: ссылки на спрайты относительные (от URL самого индекса)
+            frames_per_sprite = columns * rows
+            frame_count = min(math.ceil(duration / interval), frames_per_sprite * len(sprite_names))
+            lines = ['WEBVTT', '']
+            for frame in range(frame_count):
+                start = frame * interval
+                end = min((frame + 1) * interval, duration)
+                position = frame % frames_per_sprite
+                x = (position % columns) * tile_width
+                y = (position // columns) * tile_height
+                lines.append(f"{self._format_vtt_time(start)} --> {self._format_vtt_time(end)}")
+                lines.append(f"{sprite_names[frame // frames_per_sprite]}#xywh={x},{y},{tile_width},{tile_height}")
+                lines.append('')
+            
+            vtt_path = file_handler.get_thumbnail_path(video_id, f"video_{video_id}_trickplay.vtt")
+            temp_path = partial_path(vtt_path)
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines))
+            os.replace(temp_path, vtt_path)
+            
+            return {
+                'vtt_path': vtt_path,
+                'sprite_paths': sprite_paths,
+                'metadata': {
+                    'interval': interval,
+                    'tile_width': tile_width,
+                    'tile_height': tile_height,
+                    'columns': columns,
+                    'rows': rows,
+                    'format': image_format,
+                    'sprites': sprite_names
+                }
+            }
+            
         except Exception as e:
-            logger.error(f"Error resizing image: {str(e)}")
+            logger.error(f"Error creating trickplay for video {video_id}: {str(e)}")
+            return None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    def _format_vtt_time(self, seconds: float) -> str:
+        """Форматирует время для WebVTT: HH:MM:SS.mmm"""
+        milliseconds = int(round(seconds * 1000))
+        hours, milliseconds = divmod(milliseconds, 3600000)
+        minutes, milliseconds = divmod(milliseconds, 60000)
+        secs, milliseconds = divmod(milliseconds, 1000)
+        return f"{hours:02d}:{minutes:02d}:{secs:02d}.{milliseconds:03d}"
     
-    async def create_preview_gif(self, video_path: str, output_path: str, duration: int = 3) -> bool:
-        """Создает GIF превью видео"""
+    def _remove_partial(self, output_path: str):
+        """Удаляет недописанный временный файл результата"""
+        temp_path = partial_path(output_path)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    
+    async def _run_ffmpeg(self, stream, low_priority: bool = False) -> None:
+        """
+        Запускает FFmpeg подпроцессом, не блокируя event loop
+        При отмене задачи процесс FFmpeg завершается
+        """
+        cmd = 'ffmpeg'
+        if low_priority:
+            # Фоновые задачи не должны отнимать CPU у основной обработки и API
+            cmd = ['nice', '-n', str(settings.low_priority_niceness), 'ffmpeg']
+        
+        process = await asyncio.create_subprocess_exec(
+            *ffmpeg.compile(stream, cmd=cmd, overwrite_output=True),
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
         try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            raise
+        
+        if process.returncode != 0:
+            raise ffmpeg.Error('ffmpeg', stdout, stderr)
+    
+    async def convert_video_quality(self, input_path: str, output_path: str, quality: str,
+                                    quality_settings: Optional[Dict[str, Any]] = None,
+                                    codec: str = DEFAULT_CODEC, low_priority: bool = False,
+                                    duration: Optional[float] = None,
+                                    video_id: Optional[int] = None) -> bool:
+        """
+        Конвертирует видео в указанное качество и кодек
+        Результат пишется во временный файл и переименовывается после успешного завершения.
+        При заданном segment_duration_seconds длинные видео кодируются сегментами параллельно.
+        """
+        temp_path = partial_path(output_path)
+        try:
+            quality_settings = quality_settings or self._get_quality_settings(quality)
+            codec_profile = CODEC_PROFILES.get(codec)
+            if not quality_settings or not codec_profile:
+                return False
+            
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            (
-                ffmpeg
-                .input(video_path, ss=30, t=duration)
-                .output(output_path, vf='scale=320:180:flags=lanczos,fps=10', format='gif')
-                .overwrite_output()
-                .run(capture_stdout=True, capture_stderr=True)
-            )
+            bitrate = int(quality_settings['bitrate'] * codec_profile['bitrate_factor'])
+            output_options = {
+                'vcodec': codec_profile['vcodec'],
+                'acodec': 'aac',
+                'preset': codec_profile['preset'],
+                'crf': quality_settings['crf'] + codec_profile['crf_offset'],
+                'vf': f"scale={quality_settings['width']}:{quality_settings['height']}",
+                'format': 'mp4',
+                'movflags': 'faststart',  # Для веб-стриминга
+                **codec_profile['extra']
+            }
+            if settings.transcode_threads_per_job > 0:
+                output_options['threads'] = settings.transcode_threads_per_job
+            
+            # SVT-AV1 работает в режиме чистого CRF
+            if codec != 'av1':
+                output_options['maxrate'] = f"{bitrate}k"
+                output_options['bufsize'] = f"{bitrate * 2}k"
+            
+            segment_seconds = settings.segment_duration_seconds
+            segments_dir = None
+            if segment_seconds > 0 and duration and duration > segment_seconds * 2:
+                segments_key = f"video_{video_id}_{quality}_{codec}" if video_id is not None else \
+                    os.path.splitext(os.path.basename(output_path))[0]
+                segments_dir = await self._convert_segmented(
+                    input_path, output_path, output_options, duration, low_priority, segments_key
+                )
+            else:
+                # Создаем FFmpeg команду
+                stream = ffmpeg.output(ffmpeg.input(input_path), temp_path, **output_options)
+                
+                # Запускаем конвертацию
+                await self._run_ffmpeg(stream, low_priority=low_priority)
+            
+            if not os.path.exists(temp_path):
+                return False
+            os.replace(temp_path, output_path)
             
-            return os.path.exists(output_path)
+            if segments_dir:
+                shutil.rmtree(segments_dir, ignore_errors=True)
+            return True
             
         except Exception as e:
-            logger.error(f"Error creating preview GIF: {str(e)}")
+            logger.error(f"Error converting video to {quality} ({codec}): {str(e)}")
+            # Удаляем частично записанный файл (готовые сегменты остаются для возобновления)
+            self._remove_partial(output_path)
             return False
     
-    async def convert_video_quality(self, input_path: str, output_path: str, quality: str) -> bool:
-        """Конвертирует видео в указанное качество"""
-        try:
-            quality_settings = self._get_quality_settings(quality)
-            if not quality_settings:
-                return False
-            
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    async def _convert_segmented(self, input_path: str, output_path: str, output_options: Dict[str, Any],
+                                 duration: float, low_priority: bool, segments_key: str) -> str:
+        """
+        Кодирует видеодорожку сегментами по segment_duration_seconds (до segment_parallelism одновременно),
+        склеивает их без перекодирования и добавляет звук, закодированный одним проходом по всему
+        файлу (AAC по сегментам дает паузы и щелчки на стыках).
+        Готовые сегменты сохраняются между попытками, повторная обработка кодирует только недостающие.
+        При ошибке одного сегмента остальные кодирования прерываются.
+        Возвращает директорию сегментов.
+        """
+        segment_seconds = settings.segment_duration_seconds
+        
+        # Сегменты разных видео, кодеков и параметров кодирования не смешиваются
+        options_digest = hashlib.sha1(
+            repr((input_path, sorted(output_options.items()))).encode('utf-8')
+        ).hexdigest()[:12]
+        segments_dir = os.path.join(self.storage_path, 'temp', 'segments', f"{segments_key}_{options_digest}")
+        os.makedirs(segments_dir, exist_ok=True)
+        
+        # Сегменты без звука; faststart нужен только итоговому файлу
+        segment_options = {
+            key: value for key, value in output_options.items()
+            if key not in ('movflags', 'acodec')
+        }
+        segment_options['an'] = None
+        segment_count = math.ceil(duration / segment_seconds)
+        slots = asyncio.Semaphore(max(1, settings.segment_parallelism))
+        
+        async def encode_segment(number: int) -> str:
+            segment_path = os.path.join(segments_dir, f"segment_{number:05d}.mp4")
+            if os.path.exists(segment_path):
+                return segment_path
             
-            # Создаем FFmpeg команду
-            stream = ffmpeg.input(input_path)
+            segment_temp_path = partial_path(segment_path)
+            async with slots:
+                stream = ffmpeg.output(
+                    ffmpeg.input(input_path, ss=number * segment_seconds, t=segment_seconds),
+                    segment_temp_path,
+                    **segment_options
+                )
+                try:
+                    await self._run_ffmpeg(stream, low_priority=low_priority)
+                except BaseException:
+                    if os.path.exists(segment_temp_path):
+                        os.remove(segment_temp_path)
+                    raise
             
-            # Применяем настройки качества
-            stream = ffmpeg.output(
-                stream,
-                output_path,
-                vcodec='libx264',
-                acodec='aac',
-                preset='medium',
-                crf=quality_settings['crf'],
-                vf=f"scale={quality_settings['width']}:{quality_settings['height']}",
-                maxrate=f"{quality_settings['bitrate']}k",
-                bufsize=f"{quality_settings['bitrate'] * 2}k",
-                format='mp4',
-                movflags='faststart'  # Для веб-стриминга
+            os.replace(segment_temp_path, segment_path)
+            return segment_path
+        
+        tasks = [asyncio.create_task(encode_segment(number)) for number in range(segment_count)]
+        try:
+            segment_paths = await asyncio.gather(*tasks)
+        except BaseException:
+            # Первая ошибка (или отмена) останавливает остальные процессы FFmpeg
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        
+        # Склеиваем видео через concat demuxer, звук кодируем из исходного файла
+        list_path = os.path.join(segments_dir, 'segments.txt')
+        with open(list_path, 'w') as f:
+            for segment_path in segment_paths:
+                f.write(f"file '{segment_path}'\n")
+        
+        video_stream = ffmpeg.input(list_path, format='concat', safe=0)['v']
+        audio_stream = ffmpeg.input(input_path)['a?']
+        stream = ffmpeg.output(
+            video_stream,
+            audio_stream,
+            partial_path(output_path),
+            vcodec='copy',
+            acodec=output_options.get('acodec', 'aac'),
+            format='mp4',
+            movflags='faststart'
+        )
+        await self._run_ffmpeg(stream, low_priority=low_priority)
+        
+        return segments_dir
+    
+    async def build_keyframe_index(self, video_path: str, index_path: str) -> bool:
+        """Строит индекс ключевых кадров (время -> смещение в файле) для версии видео"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                'ffprobe', '-v', 'error',
+                '-select_streams', 'v:0',
+                '-show_entries', 'packet=pts_time,dts_time,pos,flags',
+                '-of', 'json',
+                video_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
             )
+            stdout, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(stderr.decode('utf-8', errors='ignore'))
             
-            # Запускаем конвертацию
-            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+            pairs = []
+            for packet in json.loads(stdout).get('packets', []):
+                if 'K' not in packet.get('flags', ''):
+                    continue
+                time_value = packet.get('pts_time', packet.get('dts_time'))
+                position = packet.get('pos')
+                if time_value in (None, 'N/A') or position in (None, 'N/A'):
+                    continue
+                pairs.append((float(time_value), int(position)))
             
-            return os.path.exists(output_path)
+            if not pairs:
+                return False
+            
+            index = KeyframeIndex.from_pairs(pairs)
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            temp_path = partial_path(index_path)
+            with open(temp_path, 'wb') as f:
+                f.write(index.to_bytes())
+            os.replace(temp_path, index_path)
+            
+            return True
             
         except Exception as e:
-            logger.error(f"Error converting video to {quality}: {str(e)}")
+            logger.error(f"Error building keyframe index for {video_path}: {str(e)}")
             return False
     
+    async def package_segment(self, input_path: str, output_path: str, start: float,
+                              duration: Optional[float] = None) -> bool:
+        """
+        Вырезает сегмент HLS (MPEG-TS) из версии видео без перекодирования
+        start должен совпадать с ключевым кадром; duration None - до конца файла.
+        Временные метки сохраняются (copyts), чтобы соседние сегменты шли непрерывно.
+        """
+        try:
+            temp_path = partial_path(output_path)
+            output_options = {'c': 'copy', 'f': 'mpegts', 'muxdelay': 0}
+            if duration is not None:
+                output_options['t'] = duration
+
+            stream = ffmpeg.output(
+                ffmpeg.input(input_path, ss=start),
+                temp_path,
+                **output_options
+            ).global_args('-copyts')
+            await self._run_ffmpeg(stream)
+
+            if not os.path.exists(temp_path):
+                return False
+            os.replace(temp_path, output_path)
+            return True
+
+        except Exception as e:
+            logger.error(f"Error packaging segment of {input_path} at {start}s: {str(e)}")
+            self._remove_partial(output_path)
+            return False
+
     def _get_quality_settings(self, quality: str) -> Optional[Dict[str, Any]]:
         """Возвращает настройки для указанного качества"""
         quality_map = {
@@ -156,8 +490,119 @@ class VideoProcessor:
         
         return quality_map.get(quality)
     
-    async def process_video_async(self, video_id: int, input_path: str, callback=None) -> Dict[str, Any]:
-        """Асинхронная обработка видео с callback для обновления прогресса"""
+    async def analyze_complexity(self, input_path: str, video_info: Dict[str, Any]) -> Optional[float]:
+        """
+        Быстрый анализ сложности контента
+        Кодирует несколько коротких фрагментов в низком разрешении с фиксированным CRF
+        и возвращает средний получившийся битрейт (kbps)
+        """
+        duration = video_info.get('duration') or 0
+        sample_seconds = settings.complexity_sample_seconds
+        sample_count = settings.complexity_sample_count
+        if duration < sample_seconds:
+            return None
+        
+        temp_dir = os.path.join(self.storage_path, 'temp')
+        os.makedirs(temp_dir, exist_ok=True)
+        
+        bitrates = []
+        for i in range(sample_count):
+            # Фрагменты равномерно распределены по длительности
+            position = duration * (i + 1) / (sample_count + 1)
+            position = min(position, duration - sample_seconds)
+            sample_path = os.path.join(temp_dir, f"probe_{uuid.uuid4().hex}.mp4")
+            
+            try:
+                stream = ffmpeg.output(
+                    ffmpeg.input(input_path, ss=position, t=sample_seconds),
+                    sample_path,
+                    vcodec='libx264',
+                    preset='ultrafast',
+                    crf=settings.complexity_probe_crf,
+                    vf=f"scale=-2:{settings.complexity_probe_height}",
+                    an=None,
+                    format='mp4'
+                )
+                await self._run_ffmpeg(stream)
+                
+                if os.path.exists(sample_path):
+                    bitrates.append(os.path.getsize(sample_path) * 8 / 1000 / sample_seconds)
+            except Exception as e:
+                logger.warning(f"Complexity probe at {position:.1f}s failed for {input_path}: {str(e)}")
+            finally:
+                if os.path.exists(sample_path):
+                    os.remove(sample_path)
+        
+        if not bitrates:
+            return None
+        
+        return sum(bitrates) / len(bitrates)
+    
+    def _build_encoding_ladder(self, original_height: int, probe_kbps: Optional[float]) -> Dict[str, Dict[str, Any]]:
+        """
+        Строит лестницу качеств для конкретного видео
+        Битрейт каждой ступени ограничивается оценкой, необходимой для контента
+        (пересчет битрейта пробного кодирования по числу пикселей). CRF не меняется:
+        воспринимаемое качество ступени одинаково для простого и сложного контента.
+        Промежуточная ступень отбрасывается, если следующая по разрешению помещается
+        в ее табличный битрейт
+        """
+        qualities = self._get_applicable_qualities(original_height)
+        ladder = {quality: dict(self._get_quality_settings(quality)) for quality in qualities}
+        
+        if not probe_kbps or not ladder:
+            return ladder
+        
+        probe_pixels = settings.complexity_probe_height * settings.complexity_probe_height * 16 / 9
+        for quality_settings in ladder.values():
+            pixels = quality_settings['width'] * quality_settings['height']
+            needed_kbps = probe_kbps * (pixels / probe_pixels) ** 0.75 * 1.2
+            table_kbps = quality_settings['bitrate']
+            quality_settings['bitrate'] = int(min(table_kbps, max(table_kbps * 0.3, needed_kbps)))
+        
+        # Нижняя ступень нужна для совместимости, верхняя - максимальное качество
+        ordered = list(ladder.items())
+        pruned = [ordered[0]]
+        for index in range(1, len(ordered) - 1):
+            quality, quality_settings = ordered[index]
+            next_bitrate = ordered[index + 1][1]['bitrate']
+            table_bitrate = self._get_quality_settings(quality)['bitrate']
+            gap = next_bitrate / pruned[-1][1]['bitrate']
+            
+            # Клиентам с этой полосой можно отдавать следующее разрешение
+            if next_bitrate <= table_bitrate and gap <= settings.ladder_max_bitrate_gap:
+                continue
+            pruned.append((quality, quality_settings))
+        
+        if len(ordered) > 1:
+            pruned.append(ordered[-1])
+        
+        return dict(pruned)
+    
+    async def build_encoding_ladder(self, input_path: str, video_info: Dict[str, Any]) -> Tuple[Dict[str, Dict[str, Any]], Optional[float]]:
+        """Возвращает (лестница качеств, битрейт пробного кодирования)"""
+        probe_kbps = None
+        if settings.per_title_encoding:
+            probe_kbps = await self.analyze_complexity(input_path, video_info)
+        
+        return self._build_encoding_ladder(video_info.get('height', 0), probe_kbps), probe_kbps
+    
+    async def process_video_async(self, video_id: int, input_path: str, callback=None,
+                                  checkpoint: Optional[Dict[str, Any]] = None,
+                                  output_callback=None,
+                                  video_info: Optional[Dict[str, Any]] = None,
+                                  low_priority: bool = False) -> Dict[str, Any]:
+        """
+        Асинхронная обработка видео с callback для обновления прогресса
+        
+        checkpoint - результаты прошлой попытки: encoding_ladder, complexity_probe_kbps
+        и renditions (quality -> созданная версия); готовые версии не кодируются повторно.
+        output_callback(kind, data) вызывается после выбора лестницы ('ladder')
+        и после каждой созданной версии ('rendition'), чтобы сохранить прогресс.
+        video_info - уже полученная информация о видео (чтобы не запускать ffprobe повторно).
+        low_priority - кодирование с пониженным приоритетом процесса (повторная обработка).
+        """
+        checkpoint = checkpoint or {}
         results = {
             'video_id': video_id,
             'status': 'processing',
@@ -169,25 +614,48 @@ class VideoProcessor:
         
         try:
             # Получаем информацию о видео
-            video_info = await self.get_video_info(input_path)
-            original_height = video_info.get('height', 0)
+            if video_info is None:
+                video_info = await self.get_video_info(input_path)
             
-            # Определяем какие качества нужно создать
-            qualities_to_create = self._get_applicable_qualities(original_height)
-            total_tasks = len(qualities_to_create) + 2  # +2 для thumbnail и preview
+            # Определяем какие качества нужно создать (с учетом сложности контента).
+            # При возобновлении используем лестницу прошлой попытки, чтобы готовые версии совпадали
+            if checkpoint.get('encoding_ladder'):
+                ladder = checkpoint['encoding_ladder']
+                probe_kbps = checkpoint.get('complexity_probe_kbps')
+            else:
+                ladder, probe_kbps = await self.build_encoding_ladder(input_path, video_info)
+                if output_callback:
+                    await output_callback('ladder', {'encoding_ladder': ladder, 'complexity_probe_kbps': probe_kbps})
+            qualities_to_create = self.select_pregenerated_qualities(ladder)
+            results['encoding_ladder'] = ladder
+            results['complexity_probe_kbps'] = probe_kbps
+            completed_renditions = checkpoint.get('renditions', {})
+            total_tasks = len(qualities_to_create) + 3  # +3 для thumbnail, preview и trickplay
             completed_tasks = 0
             
             if callback:
                 await callback(video_id, 'processing', completed_tasks / total_tasks)
             
             # Создаем миниатюру
-            thumbnail_path = os.path.join(
-                self.storage_path, 'thumbnails', f"video_{video_id}_thumb.png"
-            )
+            # Основная миниатюра и дополнительные размеры создаются за один проход
+            thumbnail_ext = 'webp' if settings.thumbnail_format == 'webp' else 'jpg'
+            thumbnail_outputs = {}
+            for width, height in settings.thumbnail_sizes_list:
+                suffix = '' if (width, height) == (settings.thumbnail_width, settings.thumbnail_height) else f"_{width}x{height}"
+                thumbnail_outputs[(width, height)] = file_handler.get_thumbnail_path(
+                    video_id, f"video_{video_id}_thumb{suffix}.{thumbnail_ext}"
+                )
+            
+            if all(os.path.exists(path) for path in thumbnail_outputs.values()):
+                thumbnails = thumbnail_outputs
+            else:
+                thumbnails = await self.create_thumbnails(input_path, thumbnail_outputs)
             
-            if await self.create_thumbnail(input_path, thumbnail_path):
+            results['thumbnails'] = {f"{width}x{height}": path for (width, height), path in thumbnails.items()}
+            primary_size = (settings.thumbnail_width, settings.thumbnail_height)
+            if primary_size in thumbnails:
                 results['thumbnail_created'] = True
-                results['thumbnail_path'] = thumbnail_path
+                results['thumbnail_path'] = thumbnails[primary_size]
             else:
                 results['errors'].append("Failed to create thumbnail")
             
@@ -195,16 +663,34 @@ class VideoProcessor:
             if callback:
                 await callback(video_id, 'processing', completed_tasks / total_tasks)
             
-            # Создаем GIF превью
-            preview_path = os.path.join(
-                self.storage_path, 'thumbnails', f"video_{video_id}_preview.gif"
-            )
+            # Создаем анимированные превью: GIF (запасной вариант) и более компактные форматы
+            results['preview_variants'] = {}
+            for preview_format in ['gif'] + [fmt for fmt in settings.preview_formats_list if fmt != 'gif']:
+                if preview_format not in PREVIEW_FORMATS:
+                    continue
+                preview_path = file_handler.get_thumbnail_path(video_id, f"video_{video_id}_preview.{preview_format}")
+                if os.path.exists(preview_path) or await self.create_preview(
+                    input_path, preview_path, preview_format, settings.preview_duration_seconds
+                ):
+                    results['preview_variants'][preview_format] = preview_path
+                else:
+                    results['errors'].append(f"Failed to create {preview_format} preview")
             
-            if await self.create_preview_gif(input_path, preview_path):
+            if 'gif' in results['preview_variants']:
                 results['preview_created'] = True
-                results['preview_path'] = preview_path
-            else:
-                results['errors'].append("Failed to create preview GIF")
+                results['preview_path'] = results['preview_variants']['gif']
+            
+            completed_tasks += 1
+            if callback:
+                await callback(video_id, 'processing', completed_tasks / total_tasks)
+            
+            # Создаем спрайты для превью при перемотке
+            if settings.trickplay_enabled:
+                trickplay = await self.create_trickplay(video_id, input_path, video_info.get('duration'))
+                if trickplay:
+                    results['trickplay'] = trickplay
+                else:
+                    results['errors'].append("Failed to create trickplay sprites")
             
             completed_tasks += 1
             if callback:
@@ -212,17 +698,24 @@ class VideoProcessor:
             
             # Конвертируем в разные качества
             for quality in qualities_to_create:
-                output_path = os.path.join(
-                    self.storage_path, 'videos', f"video_{video_id}_{quality}.mp4"
-                )
+                quality_settings = ladder[quality]
                 
-                if await self.convert_video_quality(input_path, output_path, quality):
-                    results['qualities_created'].append({
-                        'quality': quality,
-                        'path': output_path,
-                        'file_size': os.path.getsize(output_path) if os.path.exists(output_path) else 0
-                    })
+                # Версия готова с прошлой попытки
+                completed = completed_renditions.get(quality)
+                if completed and completed['height'] == quality_settings['height']:
+                    results['qualities_created'].append(completed)
+                    created = completed
                 else:
+                    created = await self.encode_rendition(
+                        video_id, input_path, quality, quality_settings,
+                        low_priority=low_priority, duration=video_info.get('duration')
+                    )
+                    if created:
+                        results['qualities_created'].append(created)
+                        if output_callback:
+                            await output_callback('rendition', created)
+                
+                if not created:
                     results['errors'].append(f"Failed to create {quality} quality")
                 
                 completed_tasks += 1
@@ -249,6 +742,49 @@ class VideoProcessor:
         
         return results
     
+    def select_pregenerated_qualities(self, ladder: Dict[str, Dict[str, Any]]) -> List[str]:
+        """
+        Ступени лестницы, которые кодируются при загрузке
+        В режиме jit - только базовая ступень, остальные создаются при первом запросе
+        """
+        if settings.rendition_mode != 'jit' or not ladder:
+            return list(ladder)
+        return [self.base_quality(ladder)]
+    
+    def base_quality(self, ladder: Dict[str, Dict[str, Any]]) -> str:
+        """Базовая ступень: jit_base_quality, если она есть в лестнице, иначе самая низкая"""
+        if settings.jit_base_quality in ladder:
+            return settings.jit_base_quality
+        return min(ladder, key=lambda quality: ladder[quality]['height'])
+    
+    async def encode_rendition(self, video_id: int, input_path: str, quality: str,
+                               quality_settings: Dict[str, Any], low_priority: bool = False,
+                               duration: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Кодирует одну ступень лестницы в H.264 и строит для нее индекс ключевых кадров"""
+        output_path = file_handler.get_rendition_path(video_id, quality)
+        if not await self.convert_video_quality(
+            input_path, output_path, quality, quality_settings,
+            low_priority=low_priority, duration=duration, video_id=video_id
+        ):
+            return None
+        
+        created = {
+            'quality': quality,
+            'path': output_path,
+            'file_size': os.path.getsize(output_path) if os.path.exists(output_path) else 0,
+            'width': quality_settings['width'],
+            'height': quality_settings['height'],
+            'bitrate': quality_settings['bitrate']
+        }
+        
+        # Индекс ключевых кадров для перемотки по времени
+        if settings.keyframe_index_enabled:
+            index_path = file_handler.get_keyframe_index_path(video_id, quality)
+            if await self.build_keyframe_index(output_path, index_path):
+                created['keyframe_index_path'] = index_path
+        
+        return created
+    
     def _get_applicable_qualities(self, original_height: int) -> list:
         """Определяет какие качества нужно создать на основе оригинального разрешения"""
         quality_heights = {
@@ -270,6 +806,50 @@ class VideoProcessor:
         
         return sorted(applicable, key=lambda q: quality_heights.get(q, 0))
     
+    async def encode_extra_codecs(self, video_id: int, input_path: str,
+                                  ladder: Dict[str, Dict[str, Any]], low_priority: bool = True) -> Dict[str, Any]:
+        """
+        Кодирует версии видео в дополнительных кодеках (settings.extra_codecs)
+        Выполняется после основной обработки с пониженным приоритетом процесса
+        """
+        results = {'video_id': video_id, 'qualities_created': [], 'errors': []}
+        
+        for codec in settings.extra_codecs_list:
+            if codec not in CODEC_PROFILES or codec == DEFAULT_CODEC:
+                results['errors'].append(f"Unsupported codec: {codec}")
+                continue
+            
+            for quality, quality_settings in ladder.items():
+                if quality_settings['height'] < settings.extra_codec_min_height:
+                    continue
+                
+                output_path = file_handler.get_rendition_path(video_id, quality, codec)
+                if not await self.convert_video_quality(
+                    input_path, output_path, quality, quality_settings, codec=codec,
+                    low_priority=low_priority, video_id=video_id
+                ):
+                    results['errors'].append(f"Failed to create {quality} {codec}")
+                    continue
+                
+                created = {
+                    'quality': quality,
+                    'codec': codec,
+                    'path': output_path,
+                    'file_size': os.path.getsize(output_path),
+                    'width': quality_settings['width'],
+                    'height': quality_settings['height'],
+                    'bitrate': int(quality_settings['bitrate'] * CODEC_PROFILES[codec]['bitrate_factor'])
+                }
+                
+                if settings.keyframe_index_enabled:
+                    index_path = file_handler.get_keyframe_index_path(video_id, quality, codec)
+                    if await self.build_keyframe_index(output_path, index_path):
+                        created['keyframe_index_path'] = index_path
+                
+                results['qualities_created'].append(created)
+        
+        return results
+    
     def get_video_duration_formatted(self, duration_seconds: float) -> str:
         """Форматирует длительность видео в читаемый вид"""
         hours = int(duration_seconds // 3600)
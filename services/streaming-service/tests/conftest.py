@@ -0,0 +1,6 @@
+import os
+import tempfile
+
+# Настройки сервиса читаются при импорте модулей приложения
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+os.environ.setdefault("STORAGE_PATH", tempfile.mkdtemp(prefix="streaming-test-"))
@@ -0,0 +1,56 @@
+import os
+import time
+import asyncio
+from app.utils import disk_cache
+from app.utils.disk_cache import DiskLRUCache
+
+
+def _writer(data: bytes, calls: list, fail_first: bool = False):
+    async def create(temp_path: str):
+        calls.append(temp_path)
+        await asyncio.sleep(0.01)
+        if fail_first and len(calls) == 1:
+            raise RuntimeError("create failed")
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+    return create
+
+
+def test_retry_after_failed_create_uses_own_temp_file(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), 1024)
+    calls = []
+    create = _writer(b"segment", calls, fail_first=True)
+
+    async def scenario():
+        return await asyncio.gather(
+            cache.get_or_create("video_1_720p_0.ts", create),
+            cache.get_or_create("video_1_720p_0.ts", create),
+            cache.get_or_create("video_1_720p_0.ts", create),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    target_path = str(tmp_path / "video_1_720p_0.ts")
+    assert sum(isinstance(result, RuntimeError) for result in results) == 1
+    assert [result for result in results if not isinstance(result, RuntimeError)] == [(target_path, 7)] * 2
+    # Каждая попытка пишет в свой временный файл с расширением исходного имени
+    assert len(set(calls)) == len(calls)
+    assert all(path.endswith(".part.ts") for path in calls)
+    assert os.listdir(tmp_path) == ["video_1_720p_0.ts"]
+
+
+def test_recently_handed_out_files_are_not_evicted(tmp_path, monkeypatch):
+    monkeypatch.setattr(disk_cache, "EVICTION_GRACE_SECONDS", 0.2)
+    cache = DiskLRUCache(str(tmp_path), 10)
+
+    async def put(name: str):
+        return await cache.get_or_create(name, _writer(b"123456", []))
+
+    asyncio.run(put("a.jpg"))
+    asyncio.run(put("b.jpg"))
+    # a.jpg только что выдан - кэш временно больше лимита
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg", "b.jpg"]
+
+    time.sleep(0.25)
+    asyncio.run(put("c.jpg"))
+    assert os.listdir(tmp_path) == ["c.jpg"]
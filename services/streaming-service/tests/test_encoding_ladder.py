@@ -0,0 +1,37 @@
+from app.utils.video_processor import video_processor
+
+
+def test_ladder_without_probe_uses_table_settings():
+    ladder = video_processor._build_encoding_ladder(1080, None)
+    assert list(ladder) == ['480p', '720p', '1080p']
+    assert ladder['720p'] == video_processor._get_quality_settings('720p')
+
+
+def test_ladder_only_up_to_source_height():
+    assert list(video_processor._build_encoding_ladder(720, None)) == ['480p', '720p']
+    assert video_processor._build_encoding_ladder(360, None) == {}
+
+
+def test_simple_content_caps_bitrate_and_keeps_crf():
+    ladder = video_processor._build_encoding_ladder(1080, 150)
+    for quality, quality_settings in ladder.items():
+        table = video_processor._get_quality_settings(quality)
+        assert quality_settings['bitrate'] < table['bitrate']
+        # Не ниже 30% табличного битрейта
+        assert quality_settings['bitrate'] >= int(table['bitrate'] * 0.3)
+        assert quality_settings['crf'] == table['crf']
+
+
+def test_complex_content_keeps_table_ladder():
+    ladder = video_processor._build_encoding_ladder(1080, 3000)
+    assert ladder == {
+        quality: video_processor._get_quality_settings(quality)
+        for quality in ('480p', '720p', '1080p')
+    }
+
+
+def test_intermediate_rung_dropped_when_next_fits_its_bitrate():
+    ladder = video_processor._build_encoding_ladder(1080, 350)
+    # 1080p помещается в табличный битрейт 720p: нижняя и верхняя ступени остаются
+    assert list(ladder) == ['480p', '1080p']
+    assert ladder['1080p']['bitrate'] <= video_processor._get_quality_settings('720p')['bitrate']
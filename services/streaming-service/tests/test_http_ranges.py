@@ -0,0 +1,53 @@
+import pytest
+from app.utils.http_ranges import MAX_RANGES, MultipartByteranges, RangeNotSatisfiable, parse_range_header
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", [(0, 99)]),
+    ("bytes=100-", [(100, 999)]),
+    ("bytes=-500", [(500, 999)]),
+    ("bytes=-5000", [(0, 999)]),
+    ("bytes=900-5000", [(900, 999)]),
+    ("BYTES = 0-0", [(0, 0)]),
+    # Пересекающиеся и соседние диапазоны объединяются и сортируются
+    ("bytes=500-599, 0-99, 50-149, 150-199", [(0, 199), (500, 599)]),
+    # Диапазон за концом файла пропускается, если есть другие
+    ("bytes=0-9, 2000-2100", [(0, 9)]),
+])
+def test_valid_ranges(header, expected):
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "items=0-9",
+    "bytes=",
+    "bytes=10",
+    "bytes=-",
+    "bytes=20-10",
+    "bytes=a-b",
+    "bytes=٠-٩",
+    ",".join(["bytes=0-0"] + ["%d-%d" % (number * 10, number * 10) for number in range(1, MAX_RANGES + 1)]),
+])
+def test_invalid_header_is_ignored(header):
+    assert parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize("header, file_size", [
+    ("bytes=1000-", 1000),
+    ("bytes=-0", 1000),
+    ("bytes=0-", 0),
+])
+def test_unsatisfiable_ranges(header, file_size):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, file_size)
+
+
+def test_multipart_content_length_matches_body():
+    data = bytes(range(256)) * 4
+    ranges = parse_range_header("bytes=0-9,100-199,-10", len(data))
+    body = MultipartByteranges(ranges, len(data), "video/mp4")
+
+    payload = b"".join(body.iter_body(lambda start, end: [data[start:end + 1]]))
+    assert len(payload) == body.content_length
+    assert f"Content-Range: bytes 1014-1023/{len(data)}".encode() in payload
+    assert payload.endswith(f"--{body.boundary}--\r\n".encode())
@@ -0,0 +1,31 @@
+import os
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.main import app
+from app.core.config import settings
+
+
+def _write_image(relative_path: str, size):
+    full_path = os.path.join(settings.storage_path, relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    Image.new('RGB', size, (200, 30, 30)).save(full_path, format='PNG')
+
+
+def test_resized_image_is_revalidated_by_etag():
+    client = TestClient(app)
+    _write_image('thumbnails/video_1_thumb.png', (640, 360))
+
+    response = client.get("/files/img/160x90/thumbnails/video_1_thumb.png")
+    assert response.status_code == 200
+    assert 'immutable' not in response.headers['cache-control']
+    etag = response.headers['etag']
+
+    response = client.get("/files/img/160x90/thumbnails/video_1_thumb.png", headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # Исходник перезаписан по тому же пути - копия и ETag новые
+    _write_image('thumbnails/video_1_thumb.png', (1280, 720))
+    response = client.get("/files/img/160x90/thumbnails/video_1_thumb.png", headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
@@ -0,0 +1,44 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models.video import VideoFile
+from app.scripts import migrate_storage
+from app.utils.storage_layout import ShardedLayout
+
+
+def test_migrated_record_points_to_sharded_thumbnails(monkeypatch):
+    layout = ShardedLayout()
+    monkeypatch.setattr(migrate_storage, "storage_layout", layout)
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    video = VideoFile(
+        id=7, movie_id=1, filename='missing', original_filename='movie.mp4', file_path='uploads/missing',
+        file_size=4, mime_type='video/mp4', uploaded_by='owner@example.com',
+        thumbnail_path='thumbnails/video_7_thumb.jpg', preview_path='thumbnails/video_7_preview.gif',
+        video_metadata={
+            'encoding_ladder': ['720p'],
+            'thumbnails': {
+                '320x180': 'thumbnails/video_7_thumb_320x180.jpg',
+                '640x360': 'thumbnails/video_7_thumb.jpg',
+            }
+        }
+    )
+    db.add(video)
+    db.commit()
+
+    migrate_storage.migrate_video_record(db, video)
+    db.expire_all()
+    video = db.get(VideoFile, 7)
+
+    assert video.thumbnail_path == layout.thumbnail_path(7, 'video_7_thumb.jpg')
+    assert video.preview_path == layout.thumbnail_path(7, 'video_7_preview.gif')
+    assert video.video_metadata == {
+        'encoding_ladder': ['720p'],
+        'thumbnails': {
+            '320x180': layout.thumbnail_path(7, 'video_7_thumb_320x180.jpg'),
+            '640x360': layout.thumbnail_path(7, 'video_7_thumb.jpg'),
+        }
+    }
+    db.close()
@@ -0,0 +1,73 @@
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app.core.config import settings
+from app.core.database import Base, get_db
+from app.models.video import VideoFile
+
+
+def _auth(email: str) -> dict:
+    token = jwt.encode({"sub": email}, settings.jwt_secret_key, algorithm=settings.jwt_algorithm)
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def client():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(bind=engine)
+
+    db = SessionLocal()
+    for video_id, owner in ((1, "owner@example.com"), (2, "other@example.com")):
+        db.add(VideoFile(
+            id=video_id, movie_id=1, filename='original', original_filename='movie.mp4',
+            file_path=f'uploads/original_{video_id}', file_size=4, mime_type='video/mp4',
+            uploaded_by=owner, processing_status='completed', processing_progress=1.0
+        ))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        session = SessionLocal()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_signed_link_opens_stream_without_authorization_header(client):
+    response = client.post("/upload/events/link?video_ids=1,2", headers=_auth("owner@example.com"))
+    assert response.status_code == 200
+    link = response.json()
+    # Чужие видео в ссылку не попадают, email в ссылке нет
+    assert link['video_ids'] == [1]
+    assert "owner" not in link['events_url']
+
+    response = client.get(link['events_url'].removeprefix("/api"))
+    assert response.status_code == 200
+    assert '"video_id": 1' in response.text
+    assert "event: done" in response.text
+
+
+def test_tampered_link_rejected(client):
+    link = client.post("/upload/events/link?video_ids=1", headers=_auth("owner@example.com")).json()
+    url = link['events_url'].removeprefix("/api").replace("video_ids=1", "video_ids=2")
+    assert client.get(url).status_code == 403
+
+
+def test_link_of_another_user_rejected(client):
+    link = client.post("/upload/events/link?video_ids=1", headers=_auth("owner@example.com")).json()
+    url = link['events_url'].removeprefix("/api")
+    assert client.get(url, headers=_auth("other@example.com")).status_code == 403
+
+
+def test_events_require_authentication(client):
+    assert client.get("/upload/events?video_ids=1").status_code == 401
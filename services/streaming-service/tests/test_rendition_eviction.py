@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.models.video import VideoFile, VideoQuality
+from app.utils.rendition_access import rendition_access_tracker
+
+LADDER = {
+    '480p': {'width': 854, 'height': 480, 'bitrate': 1000, 'crf': 23},
+    '720p': {'width': 1280, 'height': 720, 'bitrate': 2500, 'crf': 21},
+}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def test_only_cold_h264_rungs_above_base_are_evicted(db):
+    db.add(VideoFile(
+        id=1, movie_id=1, filename='original', original_filename='movie.mp4', file_path='uploads/original',
+        file_size=4, mime_type='video/mp4', uploaded_by='uploader@example.com',
+        processing_status='completed', video_metadata={'encoding_ladder': LADDER}
+    ))
+    cold = datetime.now(timezone.utc) - timedelta(days=365)
+    for quality, codec in (('480p', 'h264'), ('720p', 'h264'), ('720p', 'hevc')):
+        db.add(VideoQuality(
+            original_video_id=1, quality=quality, codec=codec,
+            resolution_width=LADDER[quality]['width'], resolution_height=LADDER[quality]['height'],
+            bitrate=LADDER[quality]['bitrate'], file_path=f"videos/video_1_{quality}_{codec}.mp4",
+            file_size=4, is_ready=True, last_accessed_at=cold
+        ))
+    db.commit()
+
+    evicted = rendition_access_tracker.evict_cold_renditions(db)
+
+    assert evicted == ['videos/video_1_720p_h264.mp4']
+    remaining = {(rendition.quality, rendition.codec) for rendition in db.query(VideoQuality).all()}
+    assert remaining == {('480p', 'h264'), ('720p', 'hevc')}
@@ -0,0 +1,90 @@
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.database import Base
+from app.core.config import settings
+from app.models.video import VideoFile, VideoQuality
+from app.utils.file_handler import file_handler
+from app.utils.path_cache import video_path_cache
+from app.api.streaming import _resolve_video_path
+
+RESOLUTIONS = {'480p': (854, 480), '1080p': (1920, 1080)}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+def _touch(relative_path: str):
+    full_path = file_handler.get_full_path(relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(b'data')
+    return relative_path
+
+
+def _video(db, video_id: int, qualities) -> VideoFile:
+    video = VideoFile(
+        id=video_id, movie_id=1, filename='original', original_filename='movie.mkv',
+        file_path=_touch(os.path.join('uploads', f"original_{video_id}")), file_size=4,
+        mime_type='video/x-matroska', uploaded_by='uploader@example.com',
+        processing_status='completed', is_processed=True
+    )
+    db.add(video)
+    for quality in qualities:
+        width, height = RESOLUTIONS[quality]
+        db.add(VideoQuality(
+            original_video_id=video_id, quality=quality, codec='h264',
+            resolution_width=width, resolution_height=height, bitrate=1000,
+            file_path=_touch(file_handler.get_relative_path(file_handler.get_rendition_path(video_id, quality))),
+            file_size=4, is_ready=True
+        ))
+    db.commit()
+    video_path_cache.invalidate(video_id)
+    return video
+
+
+def test_missing_rung_served_from_nearest_rendition(db, monkeypatch):
+    monkeypatch.setattr(settings, 'rendition_mode', 'eager')
+    _video(db, 101, ['480p', '1080p'])
+
+    (path, served, media_type), missing = _resolve_video_path(101, '720p', db)
+    assert served == '480p'
+    assert path.endswith('video_101_480p.mp4')
+    assert media_type == 'video/mp4'
+    assert not missing
+
+    # Из кэша возвращается та же фактически отдаваемая версия
+    assert _resolve_video_path(101, '720p', db) == ((path, '480p', 'video/mp4'), False)
+
+
+def test_original_served_only_without_renditions(db, monkeypatch):
+    monkeypatch.setattr(settings, 'rendition_mode', 'eager')
+    video = _video(db, 102, [])
+
+    resolved, missing = _resolve_video_path(102, '720p', db)
+    assert resolved == (video.file_path, None, 'video/x-matroska')
+    assert not missing
+
+    # Тип содержимого оригинала берется из кэша, без запроса к базе
+    assert _resolve_video_path(102, '720p', None) == (resolved, False)
+
+
+def test_jit_fallback_is_cached_and_scheduled_once(db, monkeypatch):
+    monkeypatch.setattr(settings, 'rendition_mode', 'jit')
+    video = _video(db, 103, ['480p'])
+    video.video_metadata = {'encoding_ladder': {'480p': {'height': 480}, '720p': {'height': 720}}}
+    db.commit()
+
+    resolved, missing = _resolve_video_path(103, '720p', db)
+    assert resolved.rendition == '480p'
+    assert missing
+
+    # Повторные запросы отдают замену из кэша и не ставят кодирование в очередь снова
+    assert _resolve_video_path(103, '720p', None) == (resolved, False)
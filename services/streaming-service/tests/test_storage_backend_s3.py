@@ -0,0 +1,110 @@
+"""
+Проверка S3StorageBackend на MinIO (docker compose --profile s3 up minio)
+Тесты пропускаются, если MinIO недоступен; адрес задается MINIO_ENDPOINT
+"""
+import os
+import uuid
+import urllib.request
+import pytest
+from app.core.config import settings
+from app.utils.storage_backend import S3StorageBackend
+
+MINIO_ENDPOINT = os.environ.get("MINIO_ENDPOINT", "http://localhost:9000")
+MINIO_ACCESS_KEY = os.environ.get("MINIO_ACCESS_KEY", "minioadmin")
+MINIO_SECRET_KEY = os.environ.get("MINIO_SECRET_KEY", "minioadmin")
+
+
+@pytest.fixture
+def s3_settings(monkeypatch):
+    boto3 = pytest.importorskip("boto3")
+    from botocore.config import Config
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    client = boto3.client(
+        's3',
+        endpoint_url=MINIO_ENDPOINT,
+        aws_access_key_id=MINIO_ACCESS_KEY,
+        aws_secret_access_key=MINIO_SECRET_KEY,
+        region_name="us-east-1",
+        config=Config(connect_timeout=1, read_timeout=5, retries={'max_attempts': 1})
+    )
+    bucket = f"streaming-test-{uuid.uuid4().hex[:12]}"
+    try:
+        client.create_bucket(Bucket=bucket)
+    except (BotoCoreError, ClientError) as e:
+        pytest.skip(f"MinIO is not reachable at {MINIO_ENDPOINT}: {e}")
+
+    monkeypatch.setattr(settings, 's3_endpoint_url', MINIO_ENDPOINT)
+    monkeypatch.setattr(settings, 's3_access_key', MINIO_ACCESS_KEY)
+    monkeypatch.setattr(settings, 's3_secret_key', MINIO_SECRET_KEY)
+    monkeypatch.setattr(settings, 's3_bucket', bucket)
+    monkeypatch.setattr(settings, 's3_prefix', "media")
+    # Минимальный размер части multipart в S3 - 5 МБ
+    monkeypatch.setattr(settings, 's3_multipart_part_size_mb', 5)
+    yield
+
+    objects = client.list_objects_v2(Bucket=bucket).get('Contents', [])
+    for item in objects:
+        client.delete_object(Bucket=bucket, Key=item['Key'])
+    client.delete_bucket(Bucket=bucket)
+
+
+def _write(backend: S3StorageBackend, key: str, data: bytes):
+    local_path = backend.local_path(key)
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    with open(local_path, 'wb') as f:
+        f.write(data)
+
+
+def test_put_exists_range_and_delete(s3_settings, tmp_path):
+    backend = S3StorageBackend(str(tmp_path))
+    key = os.path.join('videos', 'video_1_720p.mp4')
+    data = os.urandom(64 * 1024)
+
+    assert not backend.exists(key)
+    _write(backend, key, data)
+    backend.publish(key)
+
+    assert backend.exists(key)
+    assert backend.size(key) == len(data)
+    assert b''.join(backend.iter_range(key, 100, 1099)) == data[100:1100]
+
+    assert backend.delete(key)
+    assert not backend.exists(key)
+    assert not os.path.exists(backend.local_path(key))
+
+
+def test_multipart_upload_and_fetch(s3_settings, tmp_path):
+    backend = S3StorageBackend(str(tmp_path / 'writer'))
+    key = os.path.join('uploads', 'ab', 'cd', 'abcd')
+    # Три части: 5 МБ, 5 МБ и остаток
+    data = os.urandom(11 * 1024 * 1024)
+    _write(backend, key, data)
+    backend.publish(key)
+
+    reader = S3StorageBackend(str(tmp_path / 'reader'))
+    assert reader.size(key) == len(data)
+    with open(reader.fetch(key), 'rb') as f:
+        assert f.read() == data
+
+
+def test_presigned_url(s3_settings, tmp_path):
+    backend = S3StorageBackend(str(tmp_path))
+    key = os.path.join('thumbnails', 'video_1_thumb.jpg')
+    _write(backend, key, b'thumbnail')
+    backend.publish(key)
+
+    with urllib.request.urlopen(backend.presigned_url(key, 60), timeout=5) as response:
+        assert response.read() == b'thumbnail'
+
+
+def test_missing_object_not_cached(s3_settings, tmp_path):
+    reader = S3StorageBackend(str(tmp_path / 'reader'))
+    writer = S3StorageBackend(str(tmp_path / 'writer'))
+    key = os.path.join('videos', 'video_2_480p.mp4')
+
+    assert not reader.exists(key)
+    # Объект загружен другим узлом: отсутствие не должно остаться в кэше
+    _write(writer, key, b'rendition')
+    writer.publish(key)
+    assert reader.exists(key)
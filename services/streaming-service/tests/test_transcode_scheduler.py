@@ -0,0 +1,54 @@
+import asyncio
+from app.core.config import settings
+from app.utils.transcode_scheduler import TranscodeScheduler
+
+
+def _scheduler(monkeypatch, max_concurrent: int, reserved: int) -> TranscodeScheduler:
+    monkeypatch.setattr(settings, "transcode_max_concurrent", max_concurrent)
+    monkeypatch.setattr(settings, "transcode_reserved_slots", reserved)
+    monkeypatch.setattr(settings, "transcode_memory_per_job_mb", 0)
+    return TranscodeScheduler()
+
+
+async def _run_jobs(scheduler: TranscodeScheduler, kinds, settle_seconds: float = 0.05):
+    """Ставит задачи в очередь и возвращает порядок их запуска"""
+    started = []
+    release = asyncio.Event()
+
+    def job(kind):
+        async def run(low_priority: bool):
+            started.append(kind)
+            await release.wait()
+        return run
+
+    scheduler.start()
+    try:
+        for number, kind in enumerate(kinds):
+            await scheduler.submit(kind, number, job(kind), db=None)
+        await asyncio.sleep(settle_seconds)
+        running = list(started)
+        release.set()
+        await asyncio.sleep(settle_seconds)
+        return running, started
+    finally:
+        await scheduler.stop()
+
+
+def test_single_slot_is_reserved_for_uploads(monkeypatch):
+    scheduler = _scheduler(monkeypatch, max_concurrent=1, reserved=1)
+    assert scheduler.low_priority_slots == 0
+
+    running, started = asyncio.run(_run_jobs(scheduler, ['extra_codecs', 'reprocess', 'upload']))
+    assert running == ['upload']
+    # Фоновые задачи остаются в очереди
+    assert started == ['upload']
+    assert [job['kind'] for job in scheduler.snapshot()['queued']] == ['reprocess', 'extra_codecs']
+
+
+def test_background_jobs_leave_reserved_slots_free(monkeypatch):
+    scheduler = _scheduler(monkeypatch, max_concurrent=3, reserved=1)
+    assert scheduler.low_priority_slots == 2
+
+    running, started = asyncio.run(_run_jobs(scheduler, ['extra_codecs', 'reprocess', 'extra_codecs', 'upload']))
+    assert sorted(running) == ['extra_codecs', 'reprocess', 'upload']
+    assert sorted(started) == ['extra_codecs', 'extra_codecs', 'reprocess', 'upload']
@@ -0,0 +1,38 @@
+import time
+from app.utils.url_signer import url_signer
+
+
+def test_signed_params_verify():
+    params = url_signer.sign(42, "720p")
+    assert url_signer.verify(42, "720p", int(params['expires']), params['sig'])
+    assert 'u' not in params
+
+
+def test_signature_bound_to_video_and_rendition():
+    params = url_signer.sign(42, "720p")
+    expires = int(params['expires'])
+    assert not url_signer.verify(43, "720p", expires, params['sig'])
+    assert not url_signer.verify(42, "1080p", expires, params['sig'])
+    assert not url_signer.verify(42, "720p", expires + 1, params['sig'])
+
+
+def test_expired_url_rejected():
+    params = url_signer.sign(42, "720p", expires=int(time.time()) - 1)
+    assert not url_signer.verify(42, "720p", int(params['expires']), params['sig'])
+
+
+def test_user_binding_hides_email():
+    params = url_signer.sign(42, "720p", "viewer@example.com")
+    assert "viewer" not in params['u'] and "@" not in params['u']
+    assert url_signer.verify(42, "720p", int(params['expires']), params['sig'], params['u'])
+    # Без привязки к пользователю подпись не подходит
+    assert not url_signer.verify(42, "720p", int(params['expires']), params['sig'])
+
+
+def test_matches_user():
+    user = url_signer.user_binding("viewer@example.com")
+    assert url_signer.matches_user(user, "viewer@example.com")
+    assert not url_signer.matches_user(user, "other@example.com")
+    # Непривязанный URL и анонимный запрос не проверяются
+    assert url_signer.matches_user(None, "other@example.com")
+    assert url_signer.matches_user(user, None)